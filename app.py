@@ -1,46 +1,507 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, Response
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-import sqlite3, os, json, csv, io
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, send_file, abort, Response, g, has_app_context, has_request_context, make_response, jsonify
+from werkzeug.utils import secure_filename, safe_join
+from werkzeug.datastructures import MultiDict
+from markupsafe import Markup, escape
+import sqlite3, os, json, csv, io, re, zlib, gzip, base64, mimetypes, hashlib, heapq, hmac, ipaddress, logging, secrets, threading, time, click
 from datetime import datetime, timezone
+from urllib.request import pathname2url
 from config import Config
+from classifier import KeywordClassifier
+import archive, assets, assignment, blobstore, ingest, maintenance, passwords, rollups, similar, sqltrace, timestamps
+from metrics import Registry
+from fragcache import FragmentCache
+from pubsub import Broker, format_sse
+from writebehind import WriteBehindQueue, STATEMENTS as EVENT_STATEMENTS
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-def db():
-    con = sqlite3.connect(Config.DATABASE_URL)
+# Prometheus metrics for /metrics. Each worker process keeps its own values.
+registry = Registry()
+REQUEST_SECONDS = registry.histogram('helpdesk_http_request_duration_seconds', 'Request latency by endpoint.', ('endpoint', 'method'))
+REQUESTS = registry.counter('helpdesk_http_requests_total', 'Requests by endpoint and status.', ('endpoint', 'method', 'status'))
+SQL_STATEMENTS = registry.counter('helpdesk_sql_statements_total', 'SQL statements executed, by endpoint (background: outside requests).', ('endpoint',))
+SQL_SECONDS = registry.counter('helpdesk_sql_seconds_total', 'Time spent executing and fetching SQL, by endpoint.', ('endpoint',))
+SQL_PER_REQUEST = registry.histogram('helpdesk_sql_statements_per_request', 'SQL statements per request; high counts point at N+1 patterns.',
+                                     ('endpoint',), buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+SQL_SLOW = registry.counter('helpdesk_sql_slow_statements_total', 'Statements slower than SLOW_QUERY_MS.', ('endpoint',))
+LOCK_WAIT_SECONDS = registry.histogram('helpdesk_sqlite_lock_wait_seconds', 'Duration of statements that opened a write transaction, i.e. waited for the write lock.',
+                                       buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0))
+LOCK_ERRORS = registry.counter('helpdesk_sqlite_busy_errors_total', 'Statements that gave up with "database is locked" after the busy timeout.')
+UPLOAD_BYTES = registry.counter('helpdesk_upload_bytes_total', 'Bytes of attachments uploaded.')
+UPLOADS = registry.counter('helpdesk_uploads_total', 'Attachments uploaded.')
+
+slow_log = logging.getLogger('helpdesk.slowsql')
+if app.config['SLOW_QUERY_LOG']:
+    _handler = logging.FileHandler(app.config['SLOW_QUERY_LOG'], encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_log.addHandler(_handler)
+    slow_log.setLevel(logging.INFO)
+
+def current_endpoint():
+    return (request.endpoint or 'unknown') if has_request_context() else 'background'
+
+class SQLObserver(sqltrace.Observer):
+    """Feeds statement timings into the metrics, the slow-query log and the
+    current request's totals (reported in its Server-Timing header)."""
+    slow_seconds = app.config['SLOW_QUERY_MS'] / 1000
+
+    def statement(self, sql, seconds):
+        endpoint = current_endpoint()
+        SQL_STATEMENTS.inc(endpoint=endpoint)
+        SQL_SECONDS.inc(seconds, endpoint=endpoint)
+        if has_request_context() and 'sql_count' in g:
+            g.sql_count += 1
+            g.sql_seconds += seconds
+            if seconds > g.sql_slowest[0]:
+                g.sql_slowest = (seconds, sql)
+
+    def fetch(self, sql, seconds, total):
+        SQL_SECONDS.inc(seconds, endpoint=current_endpoint())
+        if has_request_context() and 'sql_count' in g:
+            g.sql_seconds += seconds
+            if total > g.sql_slowest[0]:
+                g.sql_slowest = (total, sql)
+
+    def lock_wait(self, seconds):
+        LOCK_WAIT_SECONDS.observe(seconds)
+
+    def busy(self, sql):
+        LOCK_ERRORS.inc()
+
+    def slow(self, sql, seconds, plan):
+        endpoint = current_endpoint()
+        SQL_SLOW.inc(endpoint=endpoint)
+        message = f"{seconds * 1000:.1f}ms [{endpoint}] {' '.join(sql.split())}"
+        if plan:
+            message += ''.join(f"\n    {line}" for line in plan)
+        slow_log.warning(message)
+
+sql_observer = SQLObserver()
+
+def connect(readonly=False):
+    """Open a new connection with the configured pragmas applied.
+
+    A readonly connection (mode=ro) can never take the write lock, so under
+    WAL it reads concurrently with writers.
+    """
+    database = app.config['DATABASE_URL']
+    if readonly:
+        database = f"file:{pathname2url(database)}?mode=ro"
+    # uri=True only changes names starting with 'file:', and lets ATTACH take mode=ro URIs.
+    con = sqlite3.connect(database, uri=True, timeout=app.config['SQLITE_BUSY_TIMEOUT'] / 1000,
+                          factory=sqltrace.InstrumentedConnection)
     con.row_factory = sqlite3.Row
     con.execute("PRAGMA foreign_keys = ON")
+    con.execute(f"PRAGMA busy_timeout = {int(app.config['SQLITE_BUSY_TIMEOUT'])}")
+    if not readonly:
+        # Before journal_mode, which writes the header of a new database file.
+        con.execute(f"PRAGMA auto_vacuum = {app.config['SQLITE_AUTO_VACUUM']}")
+        con.execute(f"PRAGMA journal_mode = {app.config['SQLITE_JOURNAL_MODE']}")
+    con.execute(f"PRAGMA synchronous = {app.config['SQLITE_SYNCHRONOUS']}")
+    con.execute(f"PRAGMA cache_size = {int(app.config['SQLITE_CACHE_SIZE'])}")
+    con.execute(f"PRAGMA mmap_size = {int(app.config['SQLITE_MMAP_SIZE'])}")
+    con.observer = sql_observer  # after the pragmas, so they are not counted against the request
     return con
 
-with open('keyword_tags.json', 'r', encoding='utf-8') as f:
-    KEYWORDS = json.load(f)
+def db():
+    """Return the connection for the current request, opening it on first use.
+
+    GET and HEAD requests get a read-only connection: page views never write.
+    """
+    if 'db' not in g:
+        g.db = connect(readonly=has_request_context() and request.method in ('GET', 'HEAD'))
+    return g.db
+
+def attach_archive(con):
+    """Make archived tickets readable on con as archive.*. False if nothing has been archived yet."""
+    return archive.attach(con, app.config['ARCHIVE_DATABASE_URL'], readonly=True)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.sql_count, g.sql_seconds, g.sql_slowest = 0, 0.0, (0.0, None)
+
+@app.after_request
+def record_request(response):
+    """Per-request metrics, and a Server-Timing header with the SQL totals."""
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method)
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    SQL_PER_REQUEST.observe(g.sql_count, endpoint=endpoint)
+    slowest, slowest_sql = g.sql_slowest
+    response.headers['Server-Timing'] = (f'db;dur={g.sql_seconds * 1000:.2f};desc="{g.sql_count} queries", '
+                                         f'db-slowest;dur={slowest * 1000:.2f}, app;dur={elapsed * 1000:.2f}')
+    if slowest_sql and slow_log.isEnabledFor(logging.DEBUG):
+        slow_log.debug(f"{request.method} {endpoint} {response.status_code} {elapsed * 1000:.1f}ms: "
+                       f"{g.sql_count} queries in {g.sql_seconds * 1000:.1f}ms, slowest {slowest * 1000:.1f}ms: "
+                       f"{' '.join(slowest_sql.split())}")
+    return response
+
+@app.teardown_appcontext
+def close_db(exc):
+    con = g.pop('db', None)
+    if con is not None:
+        if exc is not None:
+            con.rollback()
+        con.close()
+    pending = g.pop('pending_events', None)
+    if pending and exc is None:
+        events.put_many(pending)
+    published = g.pop('pending_publish', None)
+    if published and exc is None:
+        for channel, event, data in published:
+            broker.publish(channel, event, data)
+
+# Recomputes every row of the counters table from the base tables.
+COUNTER_SOURCES = """
+    SELECT 'status', status, COUNT(*) FROM tickets GROUP BY status
+    UNION ALL SELECT 'category', coalesce(category, ''), COUNT(*) FROM tickets GROUP BY coalesce(category, '')
+    UNION ALL SELECT 'users', 'total', COUNT(*) FROM users
+    UNION ALL SELECT 'kb_articles', 'total', COUNT(*) FROM kb_articles
+    UNION ALL SELECT 'unread', user_id, COUNT(*) FROM notifications WHERE is_read = 0 GROUP BY user_id
+"""
+
+def rebuild_counters(con):
+    # 'archived' is kept by the archive job and cannot be recounted from the main database.
+    con.execute("DELETE FROM counters WHERE scope != 'archived'")
+    con.execute("INSERT INTO counters (scope, key, value) " + COUNTER_SOURCES)
+
+# Columns added after a table was first released. CREATE TABLE IF NOT EXISTS
+# leaves existing tables alone, so these are added to them before schema.sql
+# runs (its indexes and triggers may refer to them).
+COLUMN_MIGRATIONS = [
+    ('attachments', 'sha256', 'TEXT REFERENCES blobs(sha256)'),
+]
+
+def migrate_columns(con):
+    for table, column, decl in COLUMN_MIGRATIONS:
+        existing = [row['name'] for row in con.execute(f"PRAGMA table_info({table})")]
+        if existing and column not in existing:
+            con.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    con.commit()
+
+# Columns that lost their NOT NULL after release. Dropping NOT NULL changes
+# nothing on disk, so the stored table definition is edited in place, as
+# https://www.sqlite.org/lang_altertable.html#otheralter describes, instead
+# of rebuilding the table.
+NULLABLE_MIGRATIONS = [
+    ('activity_log', 'user_id'),  # NULL: done by the system, e.g. auto-assignment
+]
+
+def migrate_nullable(con):
+    for table, column in NULLABLE_MIGRATIONS:
+        if not any(row['name'] == column and row['notnull'] for row in con.execute(f"PRAGMA table_info({table})")):
+            continue
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            sql = con.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+            version = con.execute("PRAGMA schema_version").fetchone()[0]
+            con.execute("PRAGMA writable_schema = ON")
+            con.execute("UPDATE sqlite_master SET sql = ? WHERE type = 'table' AND name = ?",
+                        (re.sub(rf'\b({column}\s+\w+)\s+NOT\s+NULL', r'\1', sql, count=1, flags=re.IGNORECASE), table))
+            # Makes every connection reread the schema.
+            con.execute(f"PRAGMA schema_version = {version + 1}")
+            con.execute("PRAGMA writable_schema = OFF")
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+
+def init_db():
+    """Apply schema.sql. Every statement in it is idempotent, so this also migrates older databases."""
+    con = connect()
+    migrate_columns(con)
+    migrate_nullable(con)
+    timestamps.migrate(con, batch_size=app.config['TIMESTAMP_MIGRATION_BATCH'],
+                       progress=lambda table: app.logger.info('Converted %s.created_at to Unix time', table))
+    with open(os.path.join(app.root_path, 'schema.sql'), 'r', encoding='utf-8') as f:
+        schema = f.read()
+    stale = timestamps.stale_triggers(con)
+    if stale:
+        # Recreated by schema.sql in the same transaction, so no write goes untracked.
+        schema = ('BEGIN IMMEDIATE;\n' + ''.join(f'DROP TRIGGER IF EXISTS {name};\n' for name in stale)
+                  + schema + '\nCOMMIT;')
+    con.executescript(schema)
+    archived = archive.attach(con, app.config['ARCHIVE_DATABASE_URL'])  # converts an older archive, too
+    if not con.execute("SELECT 1 FROM counters LIMIT 1").fetchone():
+        with con:
+            rebuild_counters(con)
+    if not con.execute("SELECT 1 FROM rollup_daily LIMIT 1").fetchone() and con.execute("SELECT 1 FROM tickets LIMIT 1").fetchone():
+        with con:
+            rollups.rebuild(con, archived=archived)
+    con.close()
+
+def get_counters(scope):
+    """Return {key: value} for one counters scope."""
+    rows = db().execute("SELECT key, value FROM counters WHERE scope = ?", (scope,)).fetchall()
+    return {row['key']: row['value'] for row in rows}
+
+def get_counter(scope, key):
+    row = db().execute("SELECT value FROM counters WHERE scope = ? AND key = ?", (scope, str(key))).fetchone()
+    return row['value'] if row else 0
+
+def ticket_stats():
+    """Per-status ticket counts plus their total. Archived tickets count as closed."""
+    stats = {'total': 0, 'open': 0, 'in_progress': 0, 'closed': 0}
+    for s, count in get_counters('status').items():
+        if s in stats:
+            stats[s] = count
+        stats['total'] += count
+    archived = sum(get_counters('archived').values())
+    stats['closed'] += archived
+    stats['total'] += archived
+    return stats
+
+init_db()
+
+# Read receipts waiting in the write-behind queue: {user_id: {ticket_id: (count, max_id)}}.
+# They are subtracted from the unread counter until the writer has applied them.
+pending_reads = {}
+pending_reads_lock = threading.Lock()
+
+def applied_reads(batch):
+    with pending_reads_lock:
+        for kind, row in batch:
+            if kind == 'read':
+                user_id, ticket_id, max_id = row
+                tickets = pending_reads.get(user_id, {})
+                if tickets.get(ticket_id, (0, 0))[1] <= max_id:
+                    tickets.pop(ticket_id, None)
+                if not tickets:
+                    pending_reads.pop(user_id, None)
+
+events = WriteBehindQueue(connect, app.config['EVENT_FLUSH_INTERVAL'], app.config['EVENT_BATCH_SIZE'],
+                          on_flush=applied_reads)
+
+broker = Broker(app.config['SSE_MAX_STREAMS'])
+
+registry.gauge('helpdesk_sse_streams', 'Open /events streams in this process.', callback=lambda: broker.stream_count)
+registry.gauge('helpdesk_event_backlog', 'Activity/notification rows waiting for the write-behind writer.', callback=lambda: events.backlog)
+
+def publish(channel, event, data):
+    """Push an event to /events subscribers once the current request has committed."""
+    if has_app_context():
+        g.setdefault('pending_publish', []).append((channel, event, data))
+    else:
+        broker.publish(channel, event, data)
+
+def unread_count(user_id):
+    """Unread notifications for a user, net of read receipts not yet written."""
+    with pending_reads_lock:
+        pending = sum(count for count, _ in pending_reads.get(user_id, {}).values())
+    return max(0, get_counter('unread', user_id) - pending)
+
+def mark_ticket_read(user_id, ticket_id):
+    """Mark the user's notifications for a ticket read without writing on this request.
+
+    The receipt goes to the write-behind queue and is applied with the next
+    batch; unread_count() reflects it straight away.
+    """
+    with pending_reads_lock:
+        if ticket_id in pending_reads.get(user_id, {}):
+            return False
+    row = db().execute("SELECT COUNT(*) AS n, MAX(id) AS max_id FROM notifications WHERE user_id = ? AND ticket_id = ? AND is_read = 0",
+                       (user_id, ticket_id)).fetchone()
+    if not row['n']:
+        return False
+    receipt = (user_id, ticket_id, row['max_id'])
+    if app.config['EVENT_QUEUE_SYNC']:
+        con = connect()
+        with con:
+            con.execute(EVENT_STATEMENTS['read'], receipt)
+        con.close()
+        return True
+    with pending_reads_lock:
+        pending_reads.setdefault(user_id, {})[ticket_id] = (row['n'], row['max_id'])
+    events.put('read', receipt)
+    return True
+
+def emit(kind, row, inline=False):
+    """Record an activity/notification row.
+
+    In synchronous mode, or with inline, the row is written on the request
+    connection and commits with it. Otherwise it is held until the request
+    finishes without error (so it never lands ahead of the ticket it refers
+    to) and then handed to the write-behind queue.
+    """
+    if inline or app.config['EVENT_QUEUE_SYNC']:
+        db().execute(EVENT_STATEMENTS[kind], row)
+    elif has_app_context():
+        g.setdefault('pending_events', []).append((kind, row))
+    else:
+        events.put(kind, row)
+
+def emit_many(kind, rows):
+    """emit() for many rows of one kind; synchronous mode writes them with one executemany."""
+    if app.config['EVENT_QUEUE_SYNC']:
+        db().executemany(EVENT_STATEMENTS[kind], rows)
+    elif has_app_context():
+        g.setdefault('pending_events', []).extend((kind, row) for row in rows)
+    else:
+        events.put_many([(kind, row) for row in rows])
+
+classifier = KeywordClassifier(os.path.join(app.root_path, 'keyword_tags.json'))
 
 def guess_category(text):
-    text_l = text.lower()
-    best, score = None, 0
-    for cat, words in KEYWORDS.items():
-        s = sum(1 for w in words if w in text_l)
-        if s > score:
-            score, best = s, cat
-    return best if best else 'General'
+    return classifier.classify(text)
+
+# In-memory agent loads for auto-assignment, read from the database once at startup.
+assigner = assignment.AgentLoad(app.config['AUTO_ASSIGN_RESYNC'])
+if app.config['AUTO_ASSIGN']:
+    _con = connect(readonly=True)
+    assigner.load(_con)
+    _con.close()
+
+# Similar KB articles and open tickets for /ticket/suggest, indexed in memory at startup.
+def article_document(aid, title, content, category):
+    summary = ' '.join((content or '').split())
+    return ('kb', aid), title, f"{category or ''} {content or ''}", {
+        'title': title, 'category': category, 'summary': summary[:160] + ('…' if len(summary) > 160 else '')}
+
+def ticket_document(tid, title, description, status, owner):
+    return ('ticket', tid), title, description, {'title': title, 'status': status, 'owner': owner}
+
+def similar_documents():
+    con = connect(readonly=True)
+    try:
+        for r in con.execute("SELECT id, title, content, category FROM kb_articles"):
+            yield article_document(*r)
+        for r in con.execute("SELECT id, title, description, status, user_id FROM tickets WHERE status IN ('open', 'in_progress')"):
+            yield ticket_document(*r)
+    finally:
+        con.close()
+
+suggestions = similar.SimilarityIndex(similar_documents, app.config['SIMILAR_RESYNC'])
+suggestions.reload()
+
+fragments = FragmentCache(app.config['FRAGMENT_CACHE_CHARS'])
+registry.counter('helpdesk_fragment_cache_hits_total', 'Rendered-fragment cache hits.', callback=lambda: fragments.hits)
+registry.counter('helpdesk_fragment_cache_misses_total', 'Rendered-fragment cache misses.', callback=lambda: fragments.misses)
+
+def get_version(entity, entity_id):
+    """Return the versions row (version, updated_at) for an entity, or None."""
+    return db().execute("SELECT version, updated_at FROM versions WHERE entity = ? AND id = ?",
+                        (entity, entity_id)).fetchone()
+
+def time_bucket():
+    """Changes every FRAGMENT_TTL seconds, so relative times in cached output are refreshed."""
+    return int(time.time() // app.config['FRAGMENT_TTL'])
+
+def render_fragment(template, key, load):
+    """Render a partial template, reusing the cached copy rendered for the same key.
+
+    load() returns the template context and only runs on a cache miss. A key of
+    None renders without caching.
+    """
+    if key is None:
+        return Markup(render_template(template, **load()))
+    return Markup(fragments.get_or_render((template, time_bucket()) + key,
+                                          lambda: render_template(template, **load())))
+
+def page_etag(*parts):
+    """ETag for a page built from parts, plus what base.html varies on (viewer, role, unread badge)."""
+    user_id = session.get('user_id')
+    raw = repr(parts + (user_id, session.get('role'), unread_count(user_id), time_bucket()))
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+def cacheable_etag(stamp, *parts):
+    """page_etag() for a versioned page, or None when it must not be revalidated.
+
+    A pending flash message is shown only once, so that response gets no validator.
+    """
+    if stamp is None or '_flashes' in session:
+        return None
+    return page_etag(*parts, stamp['version'])
+
+def revalidated(response, etag, stamp):
+    """Attach validators; no-cache makes the browser check them on every view."""
+    response.set_etag(etag, weak=True)
+    response.last_modified = datetime.fromtimestamp(stamp['updated_at'], timezone.utc)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# -------------------- Static Assets --------------------
+# Built by build_assets.py; read once, so restart after a build.
+asset_manifest = assets.load_manifest(app.config['ASSET_FOLDER'])
+with open(os.path.join(app.root_path, 'frontend', 'theme.json'), encoding='utf-8') as f:
+    app.jinja_env.globals['tailwind_theme'] = json.load(f)
+asset_lock = assets.load_lock()
+app.jinja_env.globals['tailwind_play_cdn'] = assets.TAILWIND_PLAY_CDN
+app.jinja_env.globals['tailwind_play_integrity'] = assets.integrity(asset_lock, assets.TAILWIND_PLAY_CDN)
+app.jinja_env.globals['asset_cdn_fallback'] = app.config['ASSET_CDN_FALLBACK']
+unbuilt_assets = [name for name in ['css/tailwind.css', *assets.CDN] if name not in asset_manifest]
+if unbuilt_assets and not app.config['ASSET_CDN_FALLBACK']:
+    app.logger.warning('Assets not built and ASSET_CDN_FALLBACK is off; pages will lack them until build_assets.py runs: %s',
+                       ', '.join(unbuilt_assets))
+elif unbuilt_assets and None in (asset_lock.get(url) for url in [assets.TAILWIND_PLAY_CDN, *assets.CDN.values()]):
+    app.logger.warning('Loading unbuilt assets from the CDN without integrity checks: '
+                       'record their hashes with `build_assets.py --lock`.')
+
+@app.template_global()
+def static_url(filename):
+    """URL of a static file: its fingerprinted build if there is one, else the file itself
+    (or its pinned CDN copy, with ASSET_CDN_FALLBACK)."""
+    if filename in asset_manifest:
+        return url_for('static_asset', filename=asset_manifest[filename])
+    if app.config['ASSET_CDN_FALLBACK'] and filename in assets.CDN:
+        return assets.CDN[filename]
+    return url_for('static', filename=filename)
+
+@app.template_global()
+def static_integrity(filename):
+    """integrity and crossorigin attributes for a script static_url() sends to its CDN copy, when its hash is recorded."""
+    if filename in asset_manifest or not app.config['ASSET_CDN_FALLBACK'] or filename not in assets.CDN:
+        return ''
+    sri = assets.integrity(asset_lock, assets.CDN[filename])
+    return Markup(f' integrity="{sri}" crossorigin="anonymous"') if sri else ''
+
+@app.template_global()
+def asset_built(filename):
+    return filename in asset_manifest
+
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    """Serve a built asset, precompressed when the client accepts br or gzip.
+
+    The name carries a content hash, so the response never changes and may
+    be cached for a year without revalidation.
+    """
+    folder = app.config['ASSET_FOLDER']
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    encoding, suffix = assets.negotiate(request.accept_encodings, path)
+    response = send_from_directory(folder, filename + suffix, mimetype=mimetypes.guess_type(filename)[0])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 # -------------------- Jinja Filters --------------------
+def request_now():
+    """Unix time of the current request, read once so every time on a page is relative to the same moment."""
+    if not has_app_context():
+        return int(time.time())
+    if 'now' not in g:
+        g.now = int(time.time())
+    return g.now
+
 @app.template_filter('timeago')
-def timeago_filter(dt_str):
-    """Convert a datetime string to a relative 'time ago' string."""
-    if not dt_str:
+def timeago_filter(stamp):
+    """Convert a Unix timestamp to a relative 'time ago' string."""
+    if stamp is None or stamp == '':
         return ''
-    try:
-        dt = datetime.strptime(str(dt_str)[:19], '%Y-%m-%d %H:%M:%S')
-    except ValueError:
-        return str(dt_str)
-    now = datetime.now()
-    diff = now - dt
-    seconds = int(diff.total_seconds())
+    if not isinstance(stamp, int):
+        return str(stamp)
+    seconds = request_now() - stamp
     if seconds < 60:
         return 'just now'
     minutes = seconds // 60
@@ -61,33 +522,135 @@ def timeago_filter(dt_str):
     years = days // 365
     return f'{years}y ago'
 
+@app.template_filter('date')
+def date_filter(stamp):
+    """Format a Unix timestamp as its UTC date, YYYY-MM-DD."""
+    return time.strftime('%Y-%m-%d', time.gmtime(stamp)) if isinstance(stamp, int) else ''
+
+@app.template_filter('duration')
+def duration_filter(seconds):
+    """Format a number of seconds as '45s', '12m', '3h 20m' or '2d 4h'."""
+    if seconds is None:
+        return '—'
+    seconds = int(seconds)
+    if seconds < 60:
+        return f'{seconds}s'
+    minutes = seconds // 60
+    if minutes < 60:
+        return f'{minutes}m'
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f'{hours}h {minutes}m' if minutes else f'{hours}h'
+    days, hours = divmod(hours, 24)
+    return f'{days}d {hours}h' if hours else f'{days}d'
+
+# Sentinels passed to FTS5 snippet()/highlight(); swapped for <mark> after escaping.
+HL_START, HL_END = '\x02', '\x03'
+
+@app.template_filter('highlight')
+def highlight_filter(text):
+    """Escape an FTS5 snippet and turn its match sentinels into <mark> tags."""
+    if not text:
+        return ''
+    html = str(escape(text))
+    return Markup(html.replace(HL_START, '<mark>').replace(HL_END, '</mark>'))
+
+def fts_query(q):
+    """Turn free text into a safe FTS5 query: every word quoted, prefix-matched and ANDed."""
+    terms = re.findall(r'\w+', q)
+    return ' '.join('"{}"*'.format(t) for t in terms)
+
+def ticket_search_condition(q, prefix=''):
+    """SQL condition matching tickets whose title, description or comments contain q.
+
+    The trigram index needs at least three characters; shorter queries fall back
+    to a title scan.
+    """
+    if len(q) < 3:
+        return f"{prefix}title LIKE ?", f"%{q}%"
+    phrase = '"{}"'.format(q.replace('"', '""'))
+    return f"{prefix}id IN (SELECT rowid FROM tickets_fts WHERE tickets_fts MATCH ?)", phrase
+
+def parse_date(value):
+    """Return value if it is a YYYY-MM-DD date, else ''."""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return ''
+    return value
+
+def day_start(value, days=0):
+    """Unix time of midnight UTC at the start of YYYY-MM-DD date value, plus days."""
+    return int(datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp()) + days * 86400
+
+def ticket_filters(args, prefix='', viewer=None):
+    """Build WHERE conditions for the ticket list filters shared by the dashboard, export and API.
+
+    Returns (conditions, params, current_filters). prefix qualifies column names
+    when the tickets table is aliased in a join. viewer is the (user id, role)
+    the list is for, by default the logged-in user. Students only ever see
+    their own tickets.
+    """
+    user_id, role = viewer or (session.get('user_id'), session.get('role'))
+    q = args.get('q', '').strip()
+    status = args.get('status', '').strip()
+    category = args.get('category', '').strip()
+    mine = args.get('mine') == '1' and role in ('agent', 'admin')
+    assignee = args.get('assignee', type=int)
+    date_from = parse_date(args.get('from', '').strip())
+    date_to = parse_date(args.get('to', '').strip())
+
+    conditions, params = [], []
+    if role == 'student':
+        conditions.append(f"{prefix}user_id = ?")
+        params.append(user_id)
+    if mine:
+        conditions.append(f"{prefix}assigned_to = ?")
+        params.append(user_id)
+    elif assignee is not None:
+        conditions.append(f"{prefix}assigned_to = ?")
+        params.append(assignee)
+    if q:
+        condition, param = ticket_search_condition(q, prefix)
+        conditions.append(condition)
+        params.append(param)
+    if status:
+        conditions.append(f"{prefix}status = ?")
+        params.append(status)
+    if category:
+        conditions.append(f"{prefix}category = ?")
+        params.append(category)
+    if date_from:
+        conditions.append(f"{prefix}created_at >= ?")
+        params.append(day_start(date_from))
+    if date_to:
+        conditions.append(f"{prefix}created_at < ?")
+        params.append(day_start(date_to, days=1))
+    current_filters = {'q': q, 'status': status, 'category': category, 'mine': '1' if mine else '',
+                       'assignee': '' if assignee is None else str(assignee), 'from': date_from, 'to': date_to}
+    return conditions, params, current_filters
+
 # -------------------- Context Processor --------------------
 @app.context_processor
 def inject_notifications():
     """Make unread notification count available in all templates."""
     if 'user_id' in session:
-        con = db()
-        cur = con.cursor()
-        cur.execute("SELECT COUNT(*) as c FROM notifications WHERE user_id = ? AND is_read = 0", (session['user_id'],))
-        count = cur.fetchone()['c']
-        return {'unread_count': count}
+        return {'unread_count': unread_count(session['user_id'])}
     return {'unread_count': 0}
 
 def notify(user_id, ticket_id, message):
-    """Create a notification for a user."""
-    con = db()
-    cur = con.cursor()
-    cur.execute("INSERT INTO notifications (user_id, ticket_id, message) VALUES (?, ?, ?)",
-                (user_id, ticket_id, message))
-    con.commit()
+    """Create a notification for a user.
+
+    The acting user's own notifications are written with the request, so the
+    page it redirects to already has them and marks them read.
+    """
+    emit('notification', (user_id, ticket_id, message),
+         inline=has_request_context() and user_id == session.get('user_id'))
+    publish(f'user:{user_id}', 'notification', {'ticket_id': ticket_id, 'message': message})
 
 def log_activity(ticket_id, user_id, action, detail=None):
     """Log an activity on a ticket."""
-    con = db()
-    cur = con.cursor()
-    cur.execute("INSERT INTO activity_log (ticket_id, user_id, action, detail) VALUES (?, ?, ?, ?)",
-                (ticket_id, user_id, action, detail))
-    con.commit()
+    emit('activity', (ticket_id, user_id, action, detail))
 
 # -------------------- Error Handlers --------------------
 @app.errorhandler(404)
@@ -103,21 +666,25 @@ def internal_server_error(e):
 def landing():
     if 'user_id' in session:
         return redirect(url_for('dashboard'))
-    con = db()
-    cur = con.cursor()
-    cur.execute("SELECT COUNT(*) as c FROM tickets WHERE status = 'closed'")
-    total_tickets = cur.fetchone()['c']
-    cur.execute("SELECT COUNT(*) as c FROM users")
-    total_users = cur.fetchone()['c']
-    cur.execute("SELECT COUNT(*) as c FROM kb_articles")
-    kb_articles = cur.fetchone()['c']
     return render_template('landing.html', landing_stats={
-        'total_tickets': total_tickets,
-        'total_users': total_users,
-        'kb_articles': kb_articles,
+        'total_tickets': ticket_stats()['closed'],
+        'total_users': get_counter('users', 'total'),
+        'kb_articles': get_counter('kb_articles', 'total'),
     })
 
 # -------------------- Auth --------------------
+hasher = passwords.PasswordHasher(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                                  app.config['PASSWORD_HASH_QUEUE'])
+registry.gauge('helpdesk_password_hashes_in_flight', 'Password hashes running or waiting for the pool.', callback=lambda: hasher.in_flight)
+registry.counter('helpdesk_password_hashes_rejected_total', 'Logins/registrations shed with 429 because the hash queue was full.',
+                 callback=lambda: hasher.rejected)
+
+def hashing_overloaded(template):
+    """The 429 answer when the password hash pool is saturated."""
+    flash('The server is busy signing other people in. Please try again in a few seconds.', 'warning')
+    retry = app.config['PASSWORD_HASH_RETRY_AFTER']
+    return render_template(template), 429, {'Retry-After': str(retry)}
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if 'user_id' in session:
@@ -129,7 +696,18 @@ def login():
         cur = con.cursor()
         cur.execute("SELECT id, username, password_hash, role FROM users WHERE username = ?", (username,))
         row = cur.fetchone()
-        if row and check_password_hash(row['password_hash'], password):
+        try:
+            valid = row is not None and hasher.check(row['password_hash'], password)
+        except passwords.Overloaded:
+            return hashing_overloaded('login.html')
+        if valid:
+            if hasher.needs_rehash(row['password_hash']):
+                # Upgrade to the configured parameters while we have the plain password.
+                try:
+                    cur.execute("UPDATE users SET password_hash = ? WHERE id = ?", (hasher.hash(password), row['id']))
+                    con.commit()
+                except passwords.Overloaded:
+                    pass  # try again next login
             session['user_id'] = row['id']
             session['username'] = row['username']
             session['role'] = row['role']
@@ -162,8 +740,12 @@ def register():
         if cur.fetchone():
             flash('Username already taken.', 'error')
             return render_template('register.html')
+        try:
+            password_hash = hasher.hash(password)
+        except passwords.Overloaded:
+            return hashing_overloaded('register.html')
         cur.execute("INSERT INTO users (username, email, password_hash, role) VALUES (?, ?, ?, 'student')",
-                    (username, email or None, generate_password_hash(password)))
+                    (username, email or None, password_hash))
         con.commit()
         flash('Account created! Please sign in.', 'success')
         return redirect(url_for('login'))
@@ -179,46 +761,49 @@ def logout():
 def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    q = request.args.get('q', '').strip()
-    status = request.args.get('status', '').strip()
-    category = request.args.get('category', '').strip()
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    page_size = app.config['TICKETS_PER_PAGE']
     con = db()
     cur = con.cursor()
 
     sql = "SELECT id, title, status, category, priority, created_at FROM tickets"
-    conditions, params = [], []
-    if session.get('role') == 'student':
-        conditions.append("user_id = ?")
-        params.append(session['user_id'])
-    if q:
-        conditions.append("title LIKE ?")
-        params.append(f"%{q}%")
-    if status:
-        conditions.append("status = ?")
-        params.append(status)
-    if category:
-        conditions.append("category = ?")
-        params.append(category)
+    conditions, params, current_filters = ticket_filters(request.args)
+    # Keyset pagination: the page boundary is an id, so every page is an index
+    # range scan of the same length no matter how deep it is.
+    backwards = before_id is not None and after_id is None
+    if backwards:
+        conditions.append("id > ?")
+        params.append(before_id)
+    elif after_id is not None:
+        conditions.append("id < ?")
+        params.append(after_id)
     if conditions:
         sql += " WHERE " + " AND ".join(conditions)
-    sql += " ORDER BY id DESC LIMIT 100"
+    sql += " ORDER BY id {} LIMIT ?".format('ASC' if backwards else 'DESC')
+    params.append(page_size + 1)
     cur.execute(sql, tuple(params))
     tickets = cur.fetchall()
+    more = len(tickets) > page_size
+    tickets = tickets[:page_size]
+    if backwards:
+        tickets.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = after_id is not None, more
+    link_args = {k: v for k, v in current_filters.items() if v}
+    page = {
+        'prev_url': url_for('dashboard', before_id=tickets[0]['id'], **link_args) if tickets and has_prev else None,
+        'next_url': url_for('dashboard', after_id=tickets[-1]['id'], **link_args) if tickets and has_next else None,
+    }
 
-    cur.execute("SELECT DISTINCT category FROM tickets WHERE category IS NOT NULL ORDER BY category")
-    categories = [row[0] for row in cur.fetchall()]
-
-    stats = {'total': 0, 'open': 0, 'in_progress': 0, 'closed': 0}
-    cur.execute("SELECT status, COUNT(*) as count FROM tickets GROUP BY status")
-    for row in cur.fetchall():
-        s = row['status']
-        if s in stats:
-            stats[s] = row['count']
-        stats['total'] += row['count']
+    categories = sorted(k for k, v in get_counters('category').items() if k and v > 0)
+    stats = ticket_stats()
 
     return render_template('dashboard.html', tickets=tickets, role=session.get('role'),
-                           categories=categories, stats=stats,
-                           current_filters={'q': q, 'status': status, 'category': category})
+                           categories=categories, stats=stats, page=page,
+                           export_url=url_for('export_csv', **link_args),
+                           current_filters=current_filters)
 
 # -------------------- Tickets --------------------
 @app.route('/ticket/new', methods=['GET', 'POST'])
@@ -232,48 +817,137 @@ def ticket_new():
         cat = guess_category(title + " " + desc)
         con = db()
         cur = con.cursor()
-        cur.execute("INSERT INTO tickets (user_id, title, description, category, priority) VALUES (?, ?, ?, ?, ?)",
-                    (session['user_id'], title, desc, cat, priority))
-        new_ticket_id = cur.lastrowid
-        if 'attachment' in request.files:
-            file = request.files['attachment']
-            if file and file.filename != '':
-                original_filename = secure_filename(file.filename)
-                stored_filename = f"{new_ticket_id}_{original_filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], stored_filename))
-                cur.execute("INSERT INTO attachments (ticket_id, original_filename, stored_filename) VALUES (?, ?, ?)",
-                            (new_ticket_id, original_filename, stored_filename))
-        con.commit()
-        log_activity(new_ticket_id, session['user_id'], 'created', f'Ticket created with priority {priority}')
+        assignee = assigner.pick(con, cat, priority) if app.config['AUTO_ASSIGN'] else None
+        try:
+            cur.execute("INSERT INTO tickets (user_id, title, description, category, priority, assigned_to) VALUES (?, ?, ?, ?, ?, ?)",
+                        (session['user_id'], title, desc, cat, priority, assignee))
+            new_ticket_id = cur.lastrowid
+            if 'attachment' in request.files:
+                file = request.files['attachment']
+                if file and file.filename != '':
+                    original_filename = secure_filename(file.filename)
+                    stored_filename = f"{new_ticket_id}_{original_filename}"
+                    sha256, size = blobstore.store_stream(app.config['UPLOAD_FOLDER'], file.stream)
+                    UPLOAD_BYTES.inc(size)
+                    UPLOADS.inc()
+                    cur.execute("INSERT INTO blobs (sha256, size) VALUES (?, ?) ON CONFLICT (sha256) DO NOTHING", (sha256, size))
+                    cur.execute("INSERT INTO attachments (ticket_id, original_filename, stored_filename, sha256) VALUES (?, ?, ?, ?)",
+                                (new_ticket_id, original_filename, stored_filename, sha256))
+            log_activity(new_ticket_id, session['user_id'], 'created', f'Ticket created with priority {priority}')
+            if assignee:
+                # Made by the system, not by the submitter (user_id NULL).
+                log_activity(new_ticket_id, None, 'assigned', rollups.ASSIGNED_DETAIL.format(assignee))
+                notify(session['user_id'], new_ticket_id, f'Your ticket #{new_ticket_id} has been assigned to an agent.')
+            con.commit()
+        except BaseException:
+            # The ticket is rolled back with the request, so the agent never got it.
+            if assignee:
+                assigner.change((assignee, 'open', priority), (None, 'open', priority))
+            raise
+        suggestions.add(*ticket_document(new_ticket_id, title, desc, 'open', session['user_id']))
         flash('Ticket created successfully!', 'success')
         return redirect(url_for('ticket_view', ticket_id=new_ticket_id))
     return render_template('ticket_new.html')
 
+@app.route('/ticket/suggest')
+def ticket_suggest():
+    """KB articles and open tickets similar to ?q= (the draft's title and description), as JSON.
+
+    Tickets scoring at least SIMILAR_DUPLICATE_SCORE are flagged as likely duplicates.
+    Students only see their own tickets, as on the dashboard.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Login required.'}), 401
+    keep = None
+    if session.get('role') == 'student':
+        viewer = session['user_id']
+        keep = lambda kind, _, info: kind == 'kb' or info['owner'] == viewer
+    found = suggestions.query(request.args.get('q', '')[:2000], app.config['SIMILAR_RESULTS'], app.config['SIMILAR_MIN_SCORE'], keep)
+    duplicate = app.config['SIMILAR_DUPLICATE_SCORE']
+    response = jsonify({
+        'articles': [dict(info, id=aid, score=round(score, 3), url=url_for('kb', q=info['title']))
+                     for score, aid, info in found.get('kb', [])],
+        'tickets': [dict(title=info['title'], status=info['status'], id=tid, score=round(score, 3), duplicate=score >= duplicate,
+                         url=url_for('ticket_view', ticket_id=tid))
+                    for score, tid, info in found.get('ticket', [])],
+    })
+    response.headers['Cache-Control'] = 'private, max-age=30'
+    return response
+
 @app.route('/ticket/<int:ticket_id>')
 def ticket_view(ticket_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     con = db()
     cur = con.cursor()
-    cur.execute("SELECT id, title, status, category, priority, description, created_at, assigned_to, user_id FROM tickets WHERE id = ?", (ticket_id,))
-    ticket = cur.fetchone()
+    # Mark notifications as read for this ticket
+    if unread_count(session['user_id']) and mark_ticket_read(session['user_id'], ticket_id):
+        publish(f"user:{session['user_id']}", 'unread', {'count': unread_count(session['user_id'])})
+    # Repeat views of an unchanged ticket stop here with a 304.
+    stamp = get_version('ticket', ticket_id)
+    etag = cacheable_etag(stamp, 'ticket', ticket_id)
+    if etag and request.if_none_match.contains_weak(etag):
+        return revalidated(Response(status=304), etag, stamp)
+    ticket_sql = "SELECT id, title, status, category, priority, description, created_at, assigned_to, user_id FROM {}.tickets WHERE id = ?"
+    src = 'main'
+    ticket = cur.execute(ticket_sql.format(src), (ticket_id,)).fetchone()
+    if not ticket and attach_archive(con):
+        src = 'archive'
+        ticket = cur.execute(ticket_sql.format(src), (ticket_id,)).fetchone()
     if not ticket:
         flash('Ticket not found.', 'error')
         return redirect(url_for('dashboard'))
-    cur.execute("SELECT c.content, u.username, c.created_at FROM comments c JOIN users u ON c.user_id = u.id WHERE c.ticket_id = ? ORDER BY c.id ASC", (ticket_id,))
-    comments = cur.fetchall()
-    cur.execute("SELECT id, original_filename, stored_filename FROM attachments WHERE ticket_id = ?", (ticket_id,))
+    cur.execute(f"SELECT id, original_filename, stored_filename FROM {src}.attachments WHERE ticket_id = ?", (ticket_id,))
     attachments = cur.fetchall()
-    cur.execute("SELECT a.action, a.detail, a.created_at, u.username FROM activity_log a JOIN users u ON a.user_id = u.id WHERE a.ticket_id = ? ORDER BY a.id ASC", (ticket_id,))
-    activities = cur.fetchall()
-    # Mark notifications as read for this ticket
-    cur.execute("UPDATE notifications SET is_read = 1 WHERE user_id = ? AND ticket_id = ?", (session['user_id'], ticket_id))
-    con.commit()
-    return render_template('ticket_view.html', ticket=ticket, comments=comments, attachments=attachments, activities=activities, role=session.get('role'))
+    key = ('ticket', ticket_id, stamp['version']) if stamp else None
+    comments_html = render_fragment('_ticket_comments.html', key, lambda: {'comments': con.execute(
+        f"SELECT c.content, u.username, c.created_at FROM {src}.comments c JOIN users u ON c.user_id = u.id WHERE c.ticket_id = ? ORDER BY c.id ASC",
+        (ticket_id,)).fetchall()})
+    activity_html = render_fragment('_ticket_activity.html', key, lambda: {'activities': con.execute(
+        f"SELECT a.action, a.detail, a.created_at, u.username FROM {src}.activity_log a LEFT JOIN users u ON a.user_id = u.id WHERE a.ticket_id = ? ORDER BY a.id ASC",
+        (ticket_id,)).fetchall()})
+    response = make_response(render_template('ticket_view.html', ticket=ticket, attachments=attachments, role=session.get('role'),
+                                             comments_html=comments_html, activity_html=activity_html, archived=src == 'archive'))
+    return revalidated(response, etag, stamp) if etag else response
 
 @app.route('/uploads/<path:filename>')
 def download_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Serve an attachment by its download name.
+
+    Blobs never change, so the content hash is a strong ETag and responses
+    are cacheable forever. send_file handles If-None-Match and Range. With
+    ATTACHMENT_SENDFILE set, the front proxy serves the bytes instead.
+    """
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    con = db()
+    row = con.execute("SELECT original_filename, sha256 FROM attachments WHERE stored_filename = ?", (filename,)).fetchone()
+    if not row and attach_archive(con):
+        row = con.execute("SELECT original_filename, sha256 FROM archive.attachments WHERE stored_filename = ?", (filename,)).fetchone()
+    if not row:
+        abort(404)
+    if row['sha256'] is None:
+        # Uploaded before content addressing; see `flask migrate-attachments`.
+        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+
+    sha256 = row['sha256']
+    mode = app.config['ATTACHMENT_SENDFILE']
+    if mode in ('x-accel', 'x-sendfile'):
+        if request.if_none_match.contains(sha256):
+            response = Response(status=304)
+        else:
+            response = Response(mimetype=mimetypes.guess_type(row['original_filename'])[0] or 'application/octet-stream')
+            response.headers['Content-Disposition'] = f"inline; filename=\"{row['original_filename']}\""
+            if mode == 'x-accel':
+                response.headers['X-Accel-Redirect'] = app.config['ATTACHMENT_ACCEL_PREFIX'] + blobstore.blob_relpath(sha256)
+            else:
+                response.headers['X-Sendfile'] = blobstore.blob_path(app.config['UPLOAD_FOLDER'], sha256)
+        response.set_etag(sha256)
+    else:
+        response = send_file(blobstore.blob_path(app.config['UPLOAD_FOLDER'], sha256),
+                             download_name=row['original_filename'], conditional=True, etag=sha256)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
 
 @app.route('/ticket/<int:ticket_id>/update', methods=['POST'])
 def ticket_update(ticket_id):
@@ -286,18 +960,21 @@ def ticket_update(ticket_id):
     con = db()
     cur = con.cursor()
     # Get ticket owner for notification
-    cur.execute("SELECT user_id, status as old_status FROM tickets WHERE id = ?", (ticket_id,))
+    cur.execute("SELECT user_id, status as old_status, priority, assigned_to FROM tickets WHERE id = ?", (ticket_id,))
     ticket_row = cur.fetchone()
-    ticket_owner = ticket_row['user_id'] if ticket_row else None
+    if not ticket_row:
+        flash('Ticket not found or archived; it can no longer be changed.', 'warning')
+        return redirect(url_for('ticket_view', ticket_id=ticket_id))
+    ticket_owner = ticket_row['user_id']
 
     if assign:
         cur.execute("UPDATE tickets SET assigned_to = ? WHERE id = ?", (assign, ticket_id))
-        log_activity(ticket_id, session['user_id'], 'assigned', f'Assigned to user #{assign}')
+        log_activity(ticket_id, session['user_id'], 'assigned', rollups.ASSIGNED_DETAIL.format(assign))
         if ticket_owner and ticket_owner != session['user_id']:
             notify(ticket_owner, ticket_id, f'Your ticket #{ticket_id} has been assigned to an agent.')
     if status:
         cur.execute("UPDATE tickets SET status = ? WHERE id = ?", (status, ticket_id))
-        log_activity(ticket_id, session['user_id'], 'status_change', f'Status changed to {status}')
+        log_activity(ticket_id, session['user_id'], 'status_change', rollups.STATUS_DETAIL.format(status))
         if ticket_owner and ticket_owner != session['user_id']:
             status_label = status.replace('_', ' ').title()
             notify(ticket_owner, ticket_id, f'Your ticket #{ticket_id} status changed to {status_label}.')
@@ -305,9 +982,170 @@ def ticket_update(ticket_id):
         cur.execute("UPDATE tickets SET priority = ? WHERE id = ?", (priority, ticket_id))
         log_activity(ticket_id, session['user_id'], 'priority_change', f'Priority changed to {priority}')
     con.commit()
+    if assign or status or priority:
+        cur.execute("SELECT title, description, status, priority, assigned_to FROM tickets WHERE id = ?", (ticket_id,))
+        new = cur.fetchone()
+        assigner.change((ticket_row['assigned_to'], ticket_row['old_status'], ticket_row['priority']),
+                        (new['assigned_to'], new['status'], new['priority']))
+        if new['status'] != ticket_row['old_status']:
+            if new['status'] in assignment.ACTIVE:
+                suggestions.add(*ticket_document(ticket_id, new['title'], new['description'], new['status'], ticket_owner))
+            else:
+                suggestions.remove(('ticket', ticket_id))
+        publish(f'ticket:{ticket_id}', 'ticket', {k: new[k] for k in ('status', 'priority', 'assigned_to')})
     flash('Ticket updated successfully.', 'success')
     return redirect(url_for('ticket_view', ticket_id=ticket_id))
 
+TICKET_STATUSES = ('open', 'in_progress', 'closed')
+TICKET_PRIORITIES = ('Low', 'Medium', 'High')
+
+def bulk_update(con, targets, changes):
+    """Apply changes ({'assigned_to'|'status'|'priority': value}) to the target ticket rows.
+
+    One UPDATE per field covers every ticket whose value differs; activity and
+    notification rows go out in one batch per kind, with the same text as
+    ticket_update. The caller commits. Returns {ticket id: [changed fields]}.
+    """
+    actor = session['user_id']
+    changed = {t['id']: [] for t in targets}
+    activity, notifications = [], []
+    for column, action, detail in (('assigned_to', 'assigned', rollups.ASSIGNED_DETAIL),
+                                   ('status', 'status_change', rollups.STATUS_DETAIL),
+                                   ('priority', 'priority_change', 'Priority changed to {}')):
+        if column not in changes:
+            continue
+        value = changes[column]
+        rows = [t for t in targets if t[column] != value]
+        if not rows:
+            continue
+        ids = [t['id'] for t in rows]
+        con.execute(f"UPDATE tickets SET {column} = ? WHERE id IN ({','.join('?' * len(ids))})", [value] + ids)
+        for t in rows:
+            tid, owner = t['id'], t['user_id']
+            changed[tid].append(column)
+            activity.append((tid, actor, action, detail.format(value)))
+            if owner and owner != actor:
+                if column == 'assigned_to':
+                    notifications.append((owner, tid, f'Your ticket #{tid} has been assigned to an agent.'))
+                elif column == 'status':
+                    notifications.append((owner, tid, f"Your ticket #{tid} status changed to {value.replace('_', ' ').title()}."))
+    emit_many('activity', activity)
+    emit_many('notification', notifications)
+    for owner, tid, message in notifications:
+        publish(f'user:{owner}', 'notification', {'ticket_id': tid, 'message': message})
+    return changed
+
+@app.route('/tickets/bulk', methods=['POST'])
+def tickets_bulk():
+    """Change the status, priority and/or assignee of many tickets in one transaction.
+
+    The dashboard form posts ticket ids as `ids`, or all_matching=1 with its
+    filters to act on every matching ticket, and set_status, set_priority and
+    set_assignee; it gets a flash message back. A JSON body
+    {"ids": [...] or "filter": {...}, "set": {"status": ..., "priority": ..., "assignee": ...}}
+    gets {"updated", "unchanged", "not_found", "results": [{"id", "result", "changed"}]}.
+    At most BULK_UPDATE_MAX tickets are changed per request.
+    """
+    as_json = request.is_json
+    if as_json:
+        body = request.get_json(silent=True)
+        body = body if isinstance(body, dict) else {}
+        ids, filters, values = body.get('ids'), body.get('filter'), body.get('set')
+        filters = MultiDict(filters) if isinstance(filters, dict) else None
+        values = values if isinstance(values, dict) else {}
+    else:
+        ids = request.form.getlist('ids')
+        filters = request.form if request.form.get('all_matching') == '1' else None
+        values = {k: request.form.get(f'set_{k}') for k in ('status', 'priority', 'assignee')}
+    next_url = request.form.get('next', '')
+    if not next_url.startswith('/') or next_url.startswith('//'):
+        next_url = url_for('dashboard')
+
+    def fail(message, code):
+        if as_json:
+            return jsonify({'error': message}), code
+        flash(message, 'error')
+        return redirect(next_url)
+
+    if session.get('role') not in ('agent', 'admin'):
+        return fail('Only agents and admins can update tickets.', 403)
+    limit = app.config['BULK_UPDATE_MAX']
+    changes = {}
+    status, priority, assignee = (values.get(k) for k in ('status', 'priority', 'assignee'))
+    if status:
+        if status not in TICKET_STATUSES:
+            return fail(f'Unknown status: {status}.', 400)
+        changes['status'] = status
+    if priority:
+        if priority not in TICKET_PRIORITIES:
+            return fail(f'Unknown priority: {priority}.', 400)
+        changes['priority'] = priority
+    con = db()
+    if assignee not in (None, ''):
+        agent = str(assignee).strip()
+        agent = int(agent) if agent.isdigit() else None
+        if agent is None or not con.execute("SELECT 1 FROM users WHERE id = ? AND role IN ('agent', 'admin')", (agent,)).fetchone():
+            return fail(f'User #{assignee} is not an agent or admin.', 400)
+        changes['assigned_to'] = agent
+    if not changes:
+        return fail('Choose a status, priority or assignee to apply.', 400)
+    if filters is None:
+        try:
+            ids = list(dict.fromkeys(int(i) for i in ids or ()))
+        except (TypeError, ValueError):
+            return fail('Ticket ids must be integers.', 400)
+        if not ids:
+            return fail('Select at least one ticket.', 400)
+        if len(ids) > limit:
+            return fail(f'At most {limit} tickets can be changed at once.', 400)
+
+    columns = "id, user_id, title, description, status, priority, assigned_to"
+    # Read and write under one write lock, so the tickets are changed as they were read.
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if filters is None:
+            targets = con.execute(f"SELECT {columns} FROM tickets WHERE id IN ({','.join('?' * len(ids))})", ids).fetchall()
+        else:
+            conditions, params, _ = ticket_filters(filters)
+            sql = f"SELECT {columns} FROM tickets"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            targets = con.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit + 1]).fetchall()
+            if len(targets) > limit:
+                con.rollback()
+                return fail(f'More than {limit} tickets match; narrow the filter.', 400)
+            ids = [t['id'] for t in targets]
+        changed = bulk_update(con, targets, changes)
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+
+    for old in targets:
+        fields = changed[old['id']]
+        if not fields:
+            continue
+        new = dict(old, **{k: changes[k] for k in fields})
+        assigner.change((old['assigned_to'], old['status'], old['priority']),
+                        (new['assigned_to'], new['status'], new['priority']))
+        if new['status'] != old['status']:
+            if new['status'] in assignment.ACTIVE:
+                suggestions.add(*ticket_document(old['id'], old['title'], old['description'], new['status'], old['user_id']))
+            else:
+                suggestions.remove(('ticket', old['id']))
+        publish(f"ticket:{old['id']}", 'ticket', {k: new[k] for k in ('status', 'priority', 'assigned_to')})
+
+    results = [{'id': tid, 'result': ('updated' if changed[tid] else 'unchanged') if tid in changed else 'not_found',
+                'changed': changed.get(tid, [])} for tid in ids]
+    summary = {key: sum(r['result'] == key for r in results) for key in ('updated', 'unchanged', 'not_found')}
+    if as_json:
+        return jsonify(dict(summary, results=results))
+    message = f"{summary['updated']} ticket(s) updated, {summary['unchanged']} already up to date"
+    if summary['not_found']:
+        message += f", {summary['not_found']} not found or archived"
+    flash(message + '.', 'success' if summary['updated'] else 'warning')
+    return redirect(next_url)
+
 @app.route('/ticket/<int:ticket_id>/comment', methods=['POST'])
 def comment_add(ticket_id):
     if 'user_id' not in session:
@@ -316,14 +1154,18 @@ def comment_add(ticket_id):
     if content:
         con = db()
         cur = con.cursor()
+        cur.execute("SELECT user_id FROM tickets WHERE id = ?", (ticket_id,))
+        row = cur.fetchone()
+        if not row:
+            flash('Ticket not found or archived; it can no longer be changed.', 'warning')
+            return redirect(url_for('ticket_view', ticket_id=ticket_id))
         cur.execute("INSERT INTO comments (ticket_id, user_id, content) VALUES (?, ?, ?)", (ticket_id, session['user_id'], content))
         log_activity(ticket_id, session['user_id'], 'comment', 'Added a comment')
         # Notify ticket owner if commenter is not the owner
-        cur.execute("SELECT user_id FROM tickets WHERE id = ?", (ticket_id,))
-        row = cur.fetchone()
-        if row and row['user_id'] != session['user_id']:
+        if row['user_id'] != session['user_id']:
             notify(row['user_id'], ticket_id, f'{session.get("username", "Someone")} commented on ticket #{ticket_id}.')
         con.commit()
+        publish(f'ticket:{ticket_id}', 'comment', {'username': session.get('username'), 'content': content})
         flash('Comment added.', 'success')
     return redirect(url_for('ticket_view', ticket_id=ticket_id))
 
@@ -336,6 +1178,12 @@ def notifications():
     cur = con.cursor()
     cur.execute("SELECT id, ticket_id, message, is_read, created_at FROM notifications WHERE user_id = ? ORDER BY id DESC LIMIT 50", (session['user_id'],))
     notifs = cur.fetchall()
+    with pending_reads_lock:
+        pending = dict(pending_reads.get(session['user_id'], {}))
+    if pending:
+        # Show read receipts that have not been written yet.
+        notifs = [dict(n, is_read=1) if n['ticket_id'] in pending and n['id'] <= pending[n['ticket_id']][1] else n
+                  for n in notifs]
     return render_template('notifications.html', notifications=notifs)
 
 @app.route('/notifications/read', methods=['POST'])
@@ -346,24 +1194,98 @@ def mark_all_read():
     cur = con.cursor()
     cur.execute("UPDATE notifications SET is_read = 1 WHERE user_id = ?", (session['user_id'],))
     con.commit()
+    with pending_reads_lock:
+        pending_reads.pop(session['user_id'], None)
+    publish(f"user:{session['user_id']}", 'unread', {'count': 0})
     flash('All notifications marked as read.', 'success')
     return redirect(url_for('notifications'))
 
+@app.route('/events')
+def event_stream():
+    """Server-Sent Events: unread-count changes for the user, plus comments and
+    status changes for ?ticket=<id> when a ticket page is open."""
+    if 'user_id' not in session:
+        return Response(status=401)
+    channels = [f"user:{session['user_id']}"]
+    ticket_id = request.args.get('ticket', type=int)
+    if ticket_id:
+        channels.append(f'ticket:{ticket_id}')
+    unread = unread_count(session['user_id'])
+    heartbeat, retry = app.config['SSE_HEARTBEAT'], app.config['SSE_RETRY_MS']
+    sub = broker.subscribe(channels, request.headers.get('Last-Event-ID', type=int))
+    if sub is None:
+        return Response('Too many open event streams.', status=503, headers={'Retry-After': '30'})
+
+    def stream():
+        try:
+            # Current state first (without an id, so it never moves Last-Event-ID).
+            yield f"retry: {retry}\nevent: unread\ndata: {json.dumps({'count': unread})}\n\n"
+            while True:
+                item = sub.get(timeout=heartbeat)
+                yield format_sse(*item) if item else ': heartbeat\n\n'
+        finally:
+            broker.unsubscribe(sub)
+
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # The generator's finally only runs once the body is iterated; a HEAD
+    # request or a client gone before the first chunk never gets that far.
+    response.call_on_close(lambda: broker.unsubscribe(sub))
+    return response
+
+def is_loopback(addr):
+    try:
+        return ipaddress.ip_address(addr or '').is_loopback
+    except ValueError:
+        return False
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text format. Requires 'Authorization: Bearer <METRICS_TOKEN>' when that is set;
+    without it, only requests from the loopback address are served."""
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        if not is_loopback(request.remote_addr):
+            abort(404)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
 # -------------------- Knowledge Base --------------------
 @app.route('/kb')
 def kb():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     q = request.args.get('q', '').strip()
-    con = db()
-    cur = con.cursor()
-    if q:
-        like = f"%{q}%"
-        cur.execute("SELECT id, title, category, created_at FROM kb_articles WHERE title LIKE ? OR content LIKE ? ORDER BY id DESC", (like, like))
-    else:
-        cur.execute("SELECT id, title, category, created_at FROM kb_articles ORDER BY id DESC")
-    rows = cur.fetchall()
-    return render_template('kb_list.html', articles=rows, q=q)
+    can_edit = session.get('role') in ('agent', 'admin')
+    stamp = get_version('kb_list', 0)
+    etag = cacheable_etag(stamp, 'kb', q)
+    if etag and request.if_none_match.contains_weak(etag):
+        return revalidated(Response(status=304), etag, stamp)
+
+    def load():
+        cur = db().cursor()
+        match = fts_query(q)
+        if match:
+            # bm25 weights: title matches count most, then category, then body text.
+            cur.execute("""SELECT a.id, a.title, a.category, a.created_at,
+                                  highlight(kb_fts, 0, ?, ?) AS title_hl,
+                                  snippet(kb_fts, 1, ?, ?, '…', 24) AS snippet
+                           FROM kb_fts JOIN kb_articles a ON a.id = kb_fts.rowid
+                           WHERE kb_fts MATCH ?
+                           ORDER BY bm25(kb_fts, 10.0, 1.0, 4.0)""",
+                        (HL_START, HL_END, HL_START, HL_END, match))
+            rows = cur.fetchall()
+        elif q:
+            rows = []  # nothing searchable in the query, e.g. only punctuation
+        else:
+            cur.execute("SELECT id, title, category, created_at, NULL AS title_hl, NULL AS snippet FROM kb_articles ORDER BY id DESC")
+            rows = cur.fetchall()
+        return {'articles': rows, 'can_edit': can_edit}
+
+    key = ('kb', q, can_edit, stamp['version']) if stamp else None
+    response = make_response(render_template('kb_list.html', articles_html=render_fragment('_kb_articles.html', key, load), q=q))
+    return revalidated(response, etag, stamp) if etag else response
 
 @app.route('/kb/new', methods=['GET', 'POST'])
 def kb_new():
@@ -378,6 +1300,7 @@ def kb_new():
         cur = con.cursor()
         cur.execute("INSERT INTO kb_articles (title, content, category) VALUES (?, ?, ?)", (title, content, category))
         con.commit()
+        suggestions.add(*article_document(cur.lastrowid, title, content, category))
         flash('Article created!', 'success')
         return redirect(url_for('kb'))
     return render_template('kb_new.html')
@@ -395,68 +1318,368 @@ def kb_edit(aid):
         category = request.form.get('category', 'General')
         cur.execute("UPDATE kb_articles SET title = ?, content = ?, category = ? WHERE id = ?", (title, content, category, aid))
         con.commit()
+        suggestions.add(*article_document(aid, title, content, category))
         flash('Article updated!', 'success')
         return redirect(url_for('kb'))
+    stamp = get_version('kb', aid)
+    etag = cacheable_etag(stamp, 'kb_edit', aid)
+    if etag and request.if_none_match.contains_weak(etag):
+        return revalidated(Response(status=304), etag, stamp)
     cur.execute("SELECT id, title, content, category FROM kb_articles WHERE id = ?", (aid,))
     art = cur.fetchone()
     if not art:
         flash('Article not found.', 'error')
         return redirect(url_for('kb'))
-    return render_template('kb_edit.html', art=art)
+    response = make_response(render_template('kb_edit.html', art=art))
+    return revalidated(response, etag, stamp) if etag else response
 
 # -------------------- Reports --------------------
 @app.route('/reports')
 def reports():
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    con = db()
-    cur = con.cursor()
-
-    cur.execute("SELECT status, COUNT(*) as count FROM tickets GROUP BY status")
-    by_status = cur.fetchall()
-
-    cur.execute("SELECT category, COUNT(*) as count FROM tickets GROUP BY category")
-    by_category = cur.fetchall()
-
-    metrics = {'total': 0, 'open': 0, 'in_progress': 0, 'closed': 0}
-    for row in by_status:
-        s = row['status']
-        c = row['count']
-        if s in metrics:
-            metrics[s] = c
-        metrics['total'] += c
+    # Archived tickets are closed ones that moved to the archive database.
+    archived = get_counters('archived')
+    statuses, categories = get_counters('status'), get_counters('category')
+    statuses['closed'] = statuses.get('closed', 0) + sum(archived.values())
+    for k, v in archived.items():
+        categories[k] = categories.get(k, 0) + v
+    by_status = [{'status': k, 'count': v} for k, v in sorted(statuses.items()) if v > 0]
+    by_category = [{'category': k or None, 'count': v} for k, v in sorted(categories.items()) if v > 0]
+    metrics = ticket_stats()
 
     status_chart_data = [{'value': row['count'], 'name': row['status']} for row in by_status]
     category_chart_labels = [row['category'] for row in by_category]
     category_chart_values = [row['count'] for row in by_category]
 
+    # Trends over a date range, read from the daily rollup tables.
+    con = db()
+    start, end = rollups.parse_range(request.args)
+    group = 'week' if request.args.get('group') == 'week' else 'day'
+    category = request.args.get('category') or None
+    trend = rollups.trend(con, start, end, group, category)
+    latency = rollups.latency(con, start, end)
+    first_response, close = latency.get('first_response', {}), latency.get('close', {})
+    range_categories = [dict(row, first_response=first_response.get(row['category']), close=close.get(row['category']))
+                        for row in rollups.by_category(con, start, end)]
+    # Once a range is picked, the export buttons export the tickets created in it.
+    export_range = {'from': start.isoformat(), 'to': end.isoformat()} if request.args.get('from') or request.args.get('to') else {}
+
     return render_template('reports.html',
                            by_status=by_status, by_category=by_category, metrics=metrics,
                            status_chart_data=json.dumps(status_chart_data),
                            category_chart_labels=json.dumps(category_chart_labels),
-                           category_chart_values=json.dumps(category_chart_values))
+                           category_chart_values=json.dumps(category_chart_values),
+                           range_start=start, range_end=end, group=group, category=category, export_range=export_range,
+                           categories=[row['category'] for row in by_category if row['category']],
+                           trend_chart=json.dumps({'labels': [p for p, _, _ in trend],
+                                                   'opened': [o for _, o, _ in trend],
+                                                   'closed': [c for _, _, c in trend]}),
+                           range_totals={'opened': sum(o for _, o, _ in trend), 'closed': sum(c for _, _, c in trend)},
+                           latency_all={'first_response': first_response.get(None), 'close': close.get(None)},
+                           range_categories=range_categories,
+                           workload=rollups.agent_workload(con, start, end))
+
+EXPORT_COLUMNS = [('id', 'Ticket ID'), ('title', 'Title'), ('status', 'Status'), ('priority', 'Priority'),
+                  ('category', 'Category'), ('created_at', 'Created At'), ('submitter', 'Submitted By')]
+# {db} is the schema the ticket comes from: main, or archive for archived tickets.
+EXPORT_EXTRAS = {
+    'comments': ('comment_count', 'Comments',
+                 "(SELECT COUNT(*) FROM {db}.comments c WHERE c.ticket_id = t.id)"),
+    'first_response': ('first_response_secs', 'First Response (s)',
+                       "(SELECT MIN(c.created_at) - t.created_at"
+                       " FROM {db}.comments c WHERE c.ticket_id = t.id AND c.user_id != t.user_id)"),
+}
 
 @app.route('/reports/export')
 def export_csv():
+    """Stream tickets as CSV or JSONL, optionally gzipped.
+
+    Takes the dashboard filters plus assignee and a from/to date range.
+    ?format=jsonl switches the output, ?gzip=1 compresses on the fly and
+    ?include=comments,first_response adds the comment count and the seconds
+    until the first reply from someone other than the submitter.
+
+    Archived tickets are included, merged into the same id order. Text search
+    (?q=) only covers tickets that are not archived.
+    """
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    con = db()
-    cur = con.cursor()
-    cur.execute("SELECT t.id, t.title, t.status, t.priority, t.category, t.created_at, u.username as submitter FROM tickets t JOIN users u ON t.user_id = u.id ORDER BY t.id DESC")
-    rows = cur.fetchall()
+    fmt = 'jsonl' if request.args.get('format') == 'jsonl' else 'csv'
+    gzipped = request.args.get('gzip') == '1'
+    extras = [EXPORT_EXTRAS[name] for name in request.args.get('include', '').split(',') if name in EXPORT_EXTRAS]
+    conditions, params, _ = ticket_filters(request.args, prefix='t.')
+    columns = EXPORT_COLUMNS + [(key, label) for key, label, _ in extras]
+
+    def query(schema):
+        sql = ("SELECT t.id, t.title, t.status, t.priority, t.category,"
+               " datetime(t.created_at, 'unixepoch') AS created_at, u.username AS submitter"
+               + ''.join(f", {expr.format(db=schema)} AS {key}" for key, _, expr in extras)
+               + f" FROM {schema}.tickets t JOIN users u ON t.user_id = u.id")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return sql + " ORDER BY t.id DESC"
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Ticket ID', 'Title', 'Status', 'Priority', 'Category', 'Created At', 'Submitted By'])
-    for r in rows:
-        writer.writerow([r['id'], r['title'], r['status'], r['priority'], r['category'], r['created_at'], r['submitter']])
+    def fetch(cur):
+        while True:
+            rows = cur.fetchmany(app.config['EXPORT_CHUNK_ROWS'])
+            if not rows:
+                return
+            yield from rows
 
+    def generate_text():
+        # A dedicated connection: the response body is produced after the
+        # request (and its connection) has already been torn down.
+        con = connect(readonly=True)
+        try:
+            rows = fetch(con.execute(query('main'), params))
+            if attach_archive(con):
+                # Both cursors are already in id order; merge them lazily.
+                rows = heapq.merge(rows, fetch(con.execute(query('archive'), params)), key=lambda r: -r['id'])
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            if fmt == 'csv':
+                writer.writerow([label for _, label in columns])
+            for n, r in enumerate(rows, 1):
+                if fmt == 'csv':
+                    writer.writerow([r[key] for key, _ in columns])
+                else:
+                    buf.write(json.dumps({key: r[key] for key, _ in columns}, ensure_ascii=False))
+                    buf.write('\n')
+                if n % app.config['EXPORT_CHUNK_ROWS'] == 0:
+                    yield buf.getvalue().encode('utf-8')
+                    buf.seek(0)
+                    buf.truncate()
+            if buf.tell():
+                yield buf.getvalue().encode('utf-8')
+        finally:
+            con.close()
+
+    def generate_gzip():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip container
+        for chunk in generate_text():
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    filename = 'tickets_report.' + fmt
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if gzipped:
+        filename += '.gz'
+        mimetype = 'application/gzip'
     return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': 'attachment; filename=tickets_report.csv'}
+        generate_gzip() if gzipped else generate_text(),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
+# -------------------- JSON API --------------------
+# Read-only /api/v1 for other campus systems. Requests carry
+# 'Authorization: Bearer <token>' (see `flask create-api-token`) and see what
+# the token's user sees on the dashboard. Timestamps are ISO 8601 UTC.
+
+API_TICKET_FIELDS = {
+    'id': 't.id', 'title': 't.title', 'description': 't.description', 'status': 't.status', 'priority': 't.priority',
+    'category': 't.category', 'created_at': 't.created_at', 'user_id': 't.user_id', 'assigned_to': 't.assigned_to',
+    'submitter': '(SELECT username FROM users WHERE id = t.user_id)',
+}
+API_TICKET_LIST_FIELDS = ('id', 'title', 'status', 'priority', 'category', 'created_at', 'assigned_to')
+API_KB_FIELDS = {'id': 'a.id', 'title': 'a.title', 'category': 'a.category', 'content': 'a.content', 'created_at': 'a.created_at'}
+API_KB_LIST_FIELDS = ('id', 'title', 'category', 'created_at')
+API_EMBEDS = ('comments', 'activity')
+
+def api_user():
+    """The user (id, username, role) whose API token the request carries, or None."""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    digest = hashlib.sha256(header[len('Bearer '):].strip().encode()).hexdigest()
+    return db().execute("SELECT u.id, u.username, u.role FROM api_tokens k JOIN users u ON u.id = k.user_id WHERE k.token_sha256 = ?",
+                        (digest,)).fetchone()
+
+def api_error(message, status):
+    response = jsonify({'error': message})
+    response.status_code = status
+    if status == 401:
+        response.headers['WWW-Authenticate'] = 'Bearer'
+    return response
+
+def api_fields(allowed, default):
+    """Field names from ?fields= (default when absent), id first. Raises ValueError naming unknown fields."""
+    names = [n.strip() for n in request.args.get('fields', '').split(',') if n.strip()] or list(default)
+    unknown = [n for n in names if n not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(allowed)}.")
+    return ['id'] + [n for n in dict.fromkeys(names) if n != 'id']
+
+def api_select(allowed, fields):
+    return ', '.join(f"{allowed[name]} AS {name}" for name in fields)
+
+def api_limit():
+    limit = request.args.get('limit', app.config['API_PAGE_SIZE'], type=int)
+    return max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+
+def api_time(value):
+    """A Unix timestamp as ISO 8601 UTC."""
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(value)) if isinstance(value, int) else value
+
+def api_row(row, fields):
+    return {name: api_time(row[name]) if name == 'created_at' else row[name] for name in fields}
+
+def encode_cursor(**position):
+    """An opaque page cursor for position, e.g. before=<id>."""
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(value):
+    """The position in a cursor from encode_cursor(), {} without one, or None if it is not valid."""
+    if not value:
+        return {}
+    try:
+        position = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(position, dict) or not all(isinstance(v, int) and v >= 0 for v in position.values()):
+        return None
+    return position
+
+def api_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+def api_not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def api_response(payload, etag=None):
+    """JSON response with a weak ETag: etag, or a hash of the body when the data has no version stamp.
+
+    Answers a matching If-None-Match with 304. Bodies of API_GZIP_MIN_BYTES or
+    more are gzipped for clients that accept it; a weak ETag stays valid
+    whichever encoding was sent.
+    """
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = etag or hashlib.sha1(body).hexdigest()[:20]
+    if request.if_none_match.contains_weak(etag):
+        return api_not_modified(etag)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    if len(body) >= app.config['API_GZIP_MIN_BYTES'] and request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, 6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@app.route('/api/v1/tickets')
+def api_tickets():
+    """Tickets newest first. Takes the dashboard filters (q, status, category, mine, assignee, from, to),
+    ?fields=, ?limit= and ?cursor= (next_cursor of the previous page). Archived tickets are only
+    available by id.
+    """
+    user = api_user()
+    if user is None:
+        return api_error('A valid API token is required.', 401)
+    try:
+        fields = api_fields(API_TICKET_FIELDS, API_TICKET_LIST_FIELDS)
+    except ValueError as e:
+        return api_error(str(e), 400)
+    position = decode_cursor(request.args.get('cursor'))
+    if position is None or set(position) - {'before'}:
+        return api_error('Invalid cursor.', 400)
+    limit = api_limit()
+    conditions, params, _ = ticket_filters(request.args, prefix='t.', viewer=(user['id'], user['role']))
+    if 'before' in position:
+        conditions.append("t.id < ?")
+        params.append(position['before'])
+    sql = f"SELECT {api_select(API_TICKET_FIELDS, fields)} FROM tickets t"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    rows = db().execute(sql + " ORDER BY t.id DESC LIMIT ?", params + [limit + 1]).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return api_response({'data': [api_row(r, fields) for r in rows],
+                         'next_cursor': encode_cursor(before=rows[-1]['id']) if more else None})
+
+@app.route('/api/v1/tickets/<int:ticket_id>')
+def api_ticket(ticket_id):
+    """One ticket, archived or not, with ?fields= and ?embed=comments,activity."""
+    user = api_user()
+    if user is None:
+        return api_error('A valid API token is required.', 401)
+    try:
+        fields = api_fields(API_TICKET_FIELDS, API_TICKET_FIELDS)
+    except ValueError as e:
+        return api_error(str(e), 400)
+    embed = [e for e in dict.fromkeys(request.args.get('embed', '').split(',')) if e]
+    if set(embed) - set(API_EMBEDS):
+        return api_error(f"Unknown embed. Available: {', '.join(API_EMBEDS)}.", 400)
+    con = db()
+    sql = f"SELECT {api_select(API_TICKET_FIELDS, fields)}, t.user_id AS owner_id FROM {{}}.tickets t WHERE t.id = ?"
+    src = 'main'
+    row = con.execute(sql.format(src), (ticket_id,)).fetchone()
+    if not row and attach_archive(con):
+        src = 'archive'
+        row = con.execute(sql.format(src), (ticket_id,)).fetchone()
+    if not row or (user['role'] == 'student' and row['owner_id'] != user['id']):
+        return api_error('Ticket not found.', 404)
+    stamp = get_version('ticket', ticket_id)
+    etag = api_etag('ticket', ticket_id, stamp['version'], fields, embed) if stamp else None
+    if etag and request.if_none_match.contains_weak(etag):
+        return api_not_modified(etag)
+    data = api_row(row, fields)
+    if 'comments' in embed:
+        data['comments'] = [dict(r, created_at=api_time(r['created_at'])) for r in con.execute(
+            f"""SELECT c.id, c.user_id, u.username, c.content, c.created_at FROM {src}.comments c JOIN users u ON u.id = c.user_id
+                WHERE c.ticket_id = ? ORDER BY c.id""", (ticket_id,))]
+    if 'activity' in embed:
+        data['activity'] = [dict(r, created_at=api_time(r['created_at'])) for r in con.execute(
+            f"""SELECT a.action, a.detail, a.user_id, u.username, a.created_at FROM {src}.activity_log a LEFT JOIN users u ON u.id = a.user_id
+                WHERE a.ticket_id = ? ORDER BY a.id""", (ticket_id,))]
+    data['archived'] = src == 'archive'
+    return api_response(data, etag)
+
+@app.route('/api/v1/kb')
+def api_kb():
+    """Knowledge-base articles newest first, or best match first with ?q=. ?fields= (content for the text),
+    ?limit= and ?cursor=.
+    """
+    user = api_user()
+    if user is None:
+        return api_error('A valid API token is required.', 401)
+    try:
+        fields = api_fields(API_KB_FIELDS, API_KB_LIST_FIELDS)
+    except ValueError as e:
+        return api_error(str(e), 400)
+    q = request.args.get('q', '').strip()
+    position = decode_cursor(request.args.get('cursor'))
+    if position is None or set(position) - {'offset' if q else 'before'}:
+        return api_error('Invalid cursor.', 400)
+    limit = api_limit()
+    stamp = get_version('kb_list', 0)
+    etag = api_etag('kb', stamp['version'], q, fields, limit, sorted(position.items())) if stamp else None
+    if etag and request.if_none_match.contains_weak(etag):
+        return api_not_modified(etag)
+    select = api_select(API_KB_FIELDS, fields)
+    if q:
+        match, offset = fts_query(q), position.get('offset', 0)
+        rows = db().execute(f"""SELECT {select} FROM kb_fts JOIN kb_articles a ON a.id = kb_fts.rowid WHERE kb_fts MATCH ?
+                                ORDER BY bm25(kb_fts, 10.0, 1.0, 4.0) LIMIT ? OFFSET ?""",
+                            (match, limit + 1, offset)).fetchall() if match else []
+    else:
+        sql, params = f"SELECT {select} FROM kb_articles a", []
+        if 'before' in position:
+            sql, params = sql + " WHERE a.id < ?", [position['before']]
+        rows = db().execute(sql + " ORDER BY a.id DESC LIMIT ?", params + [limit + 1]).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if more:
+        next_cursor = encode_cursor(offset=offset + limit) if q else encode_cursor(before=rows[-1]['id'])
+    return api_response({'data': [api_row(r, fields) for r in rows], 'next_cursor': next_cursor}, etag)
+
 # -------------------- User Management --------------------
 @app.route('/admin/users', methods=['GET', 'POST'])
 def manage_users():
@@ -470,7 +1693,14 @@ def manage_users():
     if request.method == 'POST':
         user_id = request.form.get('user_id')
         new_role = request.form.get('role')
-        if user_id and new_role:
+        if user_id and request.form.get('action') == 'skills':
+            skills = [c for c in request.form.getlist('skills') if c in classifier.categories]
+            cur.execute("DELETE FROM agent_skills WHERE user_id = ?", (user_id,))
+            cur.executemany("INSERT INTO agent_skills (user_id, category) VALUES (?, ?)", [(user_id, c) for c in skills])
+            con.commit()
+            assigner.invalidate()
+            flash('Skills updated.', 'success')
+        elif user_id and new_role:
             if int(user_id) == session.get('user_id') and new_role != 'admin':
                 cur.execute("SELECT COUNT(*) as count FROM users WHERE role = 'admin'")
                 admin_count = cur.fetchone()['count']
@@ -479,12 +1709,331 @@ def manage_users():
                     return redirect(url_for('manage_users'))
             cur.execute("UPDATE users SET role = ? WHERE id = ?", (new_role, user_id))
             con.commit()
+            assigner.invalidate()
             flash('User role updated.', 'success')
         return redirect(url_for('manage_users'))
 
     cur.execute("SELECT id, username, email, role, created_at FROM users ORDER BY id")
     users = cur.fetchall()
-    return render_template('user_management.html', users=users)
+    skills = {}
+    for row in cur.execute("SELECT user_id, category FROM agent_skills"):
+        skills.setdefault(row['user_id'], set()).add(row['category'])
+    return render_template('user_management.html', users=users, skills=skills, categories=classifier.categories,
+                           loads=assigner.loads())
+
+@app.route('/admin/tickets/import', methods=['POST'])
+def import_tickets():
+    """Bulk-import tickets from a JSONL request body (or an uploaded 'file').
+
+    Responds with the import stats and the first rejected lines ('errors'). Records
+    without a user are filed under the importing admin.
+    """
+    if session.get('role') != 'admin':
+        return jsonify({'error': 'Admin access required.'}), 403
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    errors = []
+
+    def dead_letter(offset, reason, line):
+        if len(errors) < 100:
+            errors.append({'offset': offset, 'error': reason, 'line': line[:500]})
+
+    def imported(rows):
+        for tid, user_id, title, description in rows:
+            suggestions.add(*ticket_document(tid, title, description, 'open', user_id))
+
+    stats = ingest.ingest(db(), stream, classifier.classify_many, session['user_id'],
+                          batch_size=app.config['INGEST_BATCH_SIZE'], dead_letter=dead_letter,
+                          assigner=assigner if app.config['AUTO_ASSIGN'] else None, imported=imported)
+    return jsonify({**stats.as_dict(), 'errors': errors})
+
+# -------------------- Database Maintenance --------------------
+def maintenance_task(con, task):
+    """Run one maintenance task (see maintenance.py) on con and describe the outcome in one line."""
+    path = app.config['DATABASE_URL']
+    if task == 'check':
+        problems = maintenance.quick_check(con)
+        if problems:
+            app.logger.error('quick_check found problems in %s: %s', path, '; '.join(problems))
+        s = maintenance.stats(con, path)
+        return (f"{'; '.join(problems) or 'ok'}: {s['page_count']} pages of {s['page_size']} bytes, {s['freelist_count']} free, "
+                f"auto_vacuum {s['auto_vacuum']}, database {s['db_bytes']} bytes, WAL {s['wal_bytes']} bytes")
+    if task == 'optimize':
+        maintenance.optimize(con, app.config['ANALYSIS_LIMIT'])
+        return f"statistics refreshed ({con.execute('SELECT COUNT(*) FROM sqlite_stat1').fetchone()[0]} sqlite_stat1 rows)"
+    if task == 'vacuum':
+        freed = maintenance.incremental_vacuum(con, app.config['VACUUM_MAX_PAGES'], app.config['VACUUM_STEP_PAGES'],
+                                               app.config['MAINTENANCE_PAUSE'])
+        s = maintenance.stats(con, path)
+        if s['auto_vacuum'] != 'incremental':
+            return f"skipped: auto_vacuum is {s['auto_vacuum']} ({s['freelist_count']} free pages); see --enable-incremental-vacuum"
+        return f"{freed} pages released, {s['freelist_count']} still free"
+    if task == 'checkpoint':
+        busy, wal_pages, done = maintenance.checkpoint(con, path, app.config['WAL_TRUNCATE_MB'] * 1024 * 1024)
+        return f"{done} of {wal_pages} WAL pages checkpointed{' (busy)' if busy else ''}"
+    if task == 'backup':
+        copies = [(path, 'main')]
+        if attach_archive(con):
+            copies.append((app.config['ARCHIVE_DATABASE_URL'], 'archive'))
+        written = [maintenance.backup(con, app.config['BACKUP_FOLDER'], os.path.splitext(os.path.basename(source))[0],
+                                      app.config['BACKUP_KEEP'], app.config['BACKUP_STEP_PAGES'], app.config['MAINTENANCE_PAUSE'],
+                                      schema=schema)
+                   for source, schema in copies]
+        return 'wrote ' + ', '.join(written)
+    raise ValueError(f'Unknown maintenance task: {task}')
+
+maintenance_scheduler = maintenance.Scheduler(connect, maintenance_task, {
+    'check': app.config['MAINTENANCE_CHECK_INTERVAL'],
+    'optimize': app.config['MAINTENANCE_OPTIMIZE_INTERVAL'],
+    'vacuum': app.config['MAINTENANCE_VACUUM_INTERVAL'],
+    'checkpoint': app.config['MAINTENANCE_CHECKPOINT_INTERVAL'],
+    'backup': app.config['MAINTENANCE_BACKUP_INTERVAL'],
+})
+
+@app.before_request
+def start_maintenance():
+    # Started by the first request, so each worker process starts its own after forking.
+    if app.config['MAINTENANCE_THREAD']:
+        maintenance_scheduler.ensure_started()
+
+registry.gauge('helpdesk_db_bytes', 'Size of the main database file.', callback=lambda: maintenance.file_size(app.config['DATABASE_URL']))
+registry.gauge('helpdesk_wal_bytes', 'Size of the main database WAL file.', callback=lambda: maintenance.file_size(app.config['DATABASE_URL'] + '-wal'))
+
+# -------------------- CLI --------------------
+@app.cli.command('recategorize')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--dry-run', is_flag=True, help='Report changes without writing them.')
+def recategorize_command(batch_size, dry_run):
+    """Re-run the keyword classifier over all tickets and update changed categories."""
+    con = connect()
+    last_id, scanned, changed = 0, 0, 0
+    while True:
+        rows = con.execute("SELECT id, title, description, category FROM tickets WHERE id > ? ORDER BY id LIMIT ?",
+                           (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        cats = classifier.classify_many(f"{r['title']} {r['description'] or ''}" for r in rows)
+        updates = [(cat, r['id']) for r, cat in zip(rows, cats) if cat != r['category']]
+        if updates and not dry_run:
+            with con:
+                con.executemany("UPDATE tickets SET category = ? WHERE id = ?", updates)
+        scanned += len(rows)
+        changed += len(updates)
+    con.close()
+    click.echo(f"{scanned} tickets scanned, {changed} {'would change' if dry_run else 'recategorized'}.")
+
+@app.cli.command('ingest-tickets')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', default='admin', show_default=True, help='Submitter for records that name no user.')
+@click.option('--batch-size', default=None, type=int, help='Tickets per transaction (default: INGEST_BATCH_SIZE).')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and read from the start of the file.')
+def ingest_tickets_command(path, username, batch_size, restart):
+    """Import tickets from a JSONL file, resuming from PATH.checkpoint.
+
+    Rejected lines go to PATH.rejected.jsonl. Running web workers start
+    suggesting the new tickets at their next SIMILAR_RESYNC reload.
+    """
+    con = connect()
+    row = con.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    if not row:
+        raise click.BadParameter(f'no such user: {username}', param_hint='--user')
+    checkpoint = ingest.FileCheckpoint(path + '.checkpoint')
+    dead_letter = ingest.DeadLetterFile(path + '.rejected.jsonl')
+    start = 0 if restart else checkpoint.load()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        if start:
+            click.echo(f"Resuming at byte {start}.")
+        try:
+            stats = ingest.ingest(con, f, classifier.classify_many, row['id'],
+                                  batch_size=batch_size or app.config['INGEST_BATCH_SIZE'],
+                                  checkpoint=checkpoint, dead_letter=dead_letter,
+                                  assigner=assigner if app.config['AUTO_ASSIGN'] else None)
+        finally:
+            dead_letter.close()
+            con.close()
+    click.echo(f"{stats.inserted} tickets imported, {stats.rejected} rejected in {stats.elapsed:.2f}s "
+               f"({stats.rows_per_sec:.0f} rows/sec).")
+    if stats.rejected:
+        click.echo(f"Rejected lines: {dead_letter.path}")
+
+@app.cli.command('check-counters')
+@click.option('--repair', is_flag=True, help='Rebuild the counters table if it has drifted.')
+def check_counters_command(repair):
+    """Compare trigger-maintained counters against real COUNT(*)s."""
+    con = connect()
+    stored = {(r[0], r[1]): r[2] for r in con.execute("SELECT scope, key, value FROM counters WHERE scope != 'archived'")}
+    actual = {(r[0], str(r[1])): r[2] for r in con.execute(COUNTER_SOURCES)}
+    drift = [(k, stored.get(k, 0), actual.get(k, 0)) for k in sorted(set(stored) | set(actual))
+             if stored.get(k, 0) != actual.get(k, 0)]
+    for (scope, key), have, want in drift:
+        click.echo(f"{scope}/{key}: stored {have}, actual {want}")
+    if not drift:
+        click.echo("Counters are consistent.")
+    elif repair:
+        with con:
+            rebuild_counters(con)
+        click.echo(f"Rebuilt counters ({len(drift)} drifted).")
+    con.close()
+
+@app.cli.command('backfill-rollups')
+def backfill_rollups_command():
+    """Rebuild the /reports rollup tables from tickets, comments and activity_log."""
+    con = connect()
+    started = time.monotonic()
+    archived = archive.attach(con, app.config['ARCHIVE_DATABASE_URL'])
+    with con:
+        rollups.rebuild(con, archived=archived)
+    days = con.execute("SELECT COUNT(DISTINCT day) FROM rollup_daily").fetchone()[0]
+    con.close()
+    click.echo(f"Rebuilt rollups for {days} days in {time.monotonic() - started:.1f}s.")
+
+@app.cli.command('archive-tickets')
+@click.option('--days', default=None, type=int, help='Archive closed tickets unchanged for this many days (default: ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', default=None, type=int, help='Tickets per transaction (default: ARCHIVE_BATCH_SIZE).')
+def archive_tickets_command(days, batch_size):
+    """Move old closed tickets, with their comments, attachments and activity, to the archive database."""
+    days = app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    con = connect()
+    archive.attach(con, app.config['ARCHIVE_DATABASE_URL'], create=True)
+    started = time.monotonic()
+    moved = archive.archive_closed(con, time.time() - days * 86400,
+                                   batch_size=batch_size or app.config['ARCHIVE_BATCH_SIZE'],
+                                   pause=app.config['ARCHIVE_PAUSE'],
+                                   progress=lambda n: click.echo(f"  {n} tickets archived"))
+    con.close()
+    click.echo(f"Archived {moved} tickets older than {days} days in {time.monotonic() - started:.1f}s "
+               f"to {app.config['ARCHIVE_DATABASE_URL']}.")
+
+@app.cli.command('prune-notifications')
+@click.option('--days', default=None, type=int, help='Delete read notifications older than this (default: NOTIFICATION_RETENTION_DAYS).')
+def prune_notifications_command(days):
+    """Delete read notifications past the retention period."""
+    days = app.config['NOTIFICATION_RETENTION_DAYS'] if days is None else days
+    con = connect()
+    deleted = archive.prune_notifications(con, days, pause=app.config['ARCHIVE_PAUSE'])
+    con.close()
+    click.echo(f"Deleted {deleted} read notifications older than {days} days.")
+
+@app.cli.command('db-maintenance')
+@click.argument('tasks', nargs=-1, type=click.Choice(maintenance.TASKS))
+@click.option('--enable-incremental-vacuum', is_flag=True,
+              help='First switch the database to auto_vacuum=INCREMENTAL. Runs a full VACUUM, which locks the database while it runs.')
+def db_maintenance_command(tasks, enable_incremental_vacuum):
+    """Run database maintenance now: check, optimize, vacuum, checkpoint, backup (default: all, in that order)."""
+    con = connect()
+    if enable_incremental_vacuum:
+        started = time.monotonic()
+        if maintenance.enable_incremental_vacuum(con):
+            click.echo(f"Switched to auto_vacuum=INCREMENTAL in {time.monotonic() - started:.1f}s.")
+        else:
+            click.echo("auto_vacuum is already INCREMENTAL.")
+    for task in [t for t in maintenance.TASKS if t in tasks] or maintenance.TASKS:
+        maintenance.claim(con, task, 0)
+        started = time.monotonic()
+        result = maintenance_task(con, task)
+        maintenance.record(con, task, result)
+        click.echo(f"{task}: {result} ({time.monotonic() - started:.1f}s)")
+    con.close()
+
+@app.cli.command('create-api-token')
+@click.argument('username')
+@click.option('--name', required=True, help='What the token is for, e.g. "student portal".')
+def create_api_token_command(username, name):
+    """Create an /api/v1 token that acts as USERNAME. The token is shown once; only its hash is stored."""
+    con = connect()
+    row = con.execute("SELECT id FROM users WHERE username = ?", (username,)).fetchone()
+    if not row:
+        raise click.BadParameter(f'no such user: {username}', param_hint='USERNAME')
+    token = secrets.token_urlsafe(32)
+    with con:
+        cur = con.execute("INSERT INTO api_tokens (user_id, name, token_sha256) VALUES (?, ?, ?)",
+                          (row['id'], name, hashlib.sha256(token.encode()).hexdigest()))
+    con.close()
+    click.echo(f"Token #{cur.lastrowid} for {username} ({name}):\n{token}")
+
+@app.cli.command('list-api-tokens')
+def list_api_tokens_command():
+    """List API tokens (not the tokens themselves)."""
+    con = connect()
+    for row in con.execute("SELECT k.id, u.username, k.name, k.created_at FROM api_tokens k JOIN users u ON u.id = k.user_id ORDER BY k.id"):
+        click.echo(f"#{row['id']}  {row['username']}  {row['name']}  created {api_time(row['created_at'])}")
+    con.close()
+
+@app.cli.command('revoke-api-token')
+@click.argument('token_id', type=int)
+def revoke_api_token_command(token_id):
+    """Delete API token #TOKEN_ID."""
+    con = connect()
+    with con:
+        deleted = con.execute("DELETE FROM api_tokens WHERE id = ?", (token_id,)).rowcount
+    con.close()
+    click.echo(f"Revoked token #{token_id}." if deleted else f"No token #{token_id}.")
+
+@app.cli.command('migrate-attachments')
+def migrate_attachments_command():
+    """Move pre-existing uploads into the content-addressed store, hashing each one."""
+    con = connect()
+    root = app.config['UPLOAD_FOLDER']
+    rows = con.execute("SELECT id, stored_filename FROM attachments WHERE sha256 IS NULL").fetchall()
+    moved, missing = 0, 0
+    for row in rows:
+        path = os.path.join(root, row['stored_filename'])
+        if not os.path.isfile(path):
+            missing += 1
+            click.echo(f"missing: {row['stored_filename']}")
+            continue
+        sha256, size = blobstore.store_file(root, path)
+        with con:
+            con.execute("INSERT INTO blobs (sha256, size) VALUES (?, ?) ON CONFLICT (sha256) DO NOTHING", (sha256, size))
+            con.execute("UPDATE attachments SET sha256 = ? WHERE id = ?", (sha256, row['id']))
+        # Only now that the row points at the blob is the original no longer needed.
+        os.unlink(path)
+        moved += 1
+    con.close()
+    click.echo(f"{moved} attachments migrated, {missing} files missing.")
+
+@app.cli.command('gc-blobs')
+def gc_blobs_command():
+    """Delete blobs no attachment refers to, including files left by failed uploads.
+
+    Runs under the write lock, which an upload holds from its ticket INSERT
+    until it commits, so no upload can store or reuse a blob meanwhile. Files
+    written in the last BLOB_GC_GRACE seconds are left alone.
+    """
+    con = connect()
+    root = app.config['UPLOAD_FOLDER']
+    cutoff = time.time() - app.config['BLOB_GC_GRACE']
+    removed = 0
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        unreferenced = [r['sha256'] for r in con.execute("SELECT sha256 FROM blobs WHERE refcount <= 0")]
+        for sha256 in unreferenced:
+            path = blobstore.blob_path(root, sha256)
+            if os.path.exists(path) and not blobstore.modified_before(path, cutoff):
+                continue
+            con.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            if os.path.exists(path):
+                os.unlink(path)
+                removed += 1
+        known = {r['sha256'] for r in con.execute("SELECT sha256 FROM blobs")}
+        for sha256 in list(blobstore.iter_blobs(root)):
+            path = blobstore.blob_path(root, sha256)
+            if sha256 not in known and blobstore.modified_before(path, cutoff):
+                os.unlink(path)
+                removed += 1
+        for path in list(blobstore.iter_tmp(root)):
+            if blobstore.modified_before(path, cutoff):
+                os.unlink(path)
+                removed += 1
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+    click.echo(f"Removed {removed} blob files.")
 
 if __name__ == '__main__':
     app.run(debug=True)
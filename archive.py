@@ -0,0 +1,202 @@
+"""
+Hot/cold archival of closed tickets into a separate SQLite database.
+
+The archive is an ordinary database file ATTACHed as schema 'archive'. It
+holds tickets, comments, attachments and activity_log with the same columns
+as the main database; attach() creates them, and adds columns the main
+schema has gained since. Archived tickets are read-only: the app looks in
+the archive when a ticket is not in the main database.
+
+A ticket is archived once it is closed and its latest activity_log row
+(every status change, assignment and comment writes one) is older than the
+cut-off. Each batch runs as
+three short transactions that each write to one database only, because
+with WAL a transaction spanning attached databases is not atomic across
+them:
+
+  1. copy the tickets and their rows into the archive (INSERT OR REPLACE,
+     so a batch that was interrupted can simply be copied again)
+  2. delete them from the main database, but only those still closed and
+     unchanged since step 1
+  3. drop archive copies of any ticket that is still in the main database
+
+A crash between steps leaves a ticket in both databases, never in neither;
+the next run finishes the move.
+
+Deleting from the main database fires the usual triggers, so the hot
+counters shrink. The archive job records what it moved in the 'archived'
+counters scope instead, and keeps each archived attachment's blob
+referenced, so gc-blobs leaves archived files alone.
+"""
+import os, time
+from urllib.request import pathname2url
+import timestamps
+
+TABLES = ('tickets', 'comments', 'attachments', 'activity_log')
+CHILDREN = ('comments', 'attachments', 'activity_log')
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_tickets_user ON tickets(user_id, id)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_comments_ticket ON comments(ticket_id)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_attachments_ticket ON attachments(ticket_id)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_attachments_stored ON attachments(stored_filename)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_activity_ticket ON activity_log(ticket_id)",
+]
+
+
+def is_attached(con):
+    return any(row[1] == 'archive' for row in con.execute("PRAGMA database_list"))
+
+
+def attach(con, path, readonly=False, create=False):
+    """ATTACH the archive database as 'archive'. Returns False if it does not exist and create is False.
+
+    readonly attaches with mode=ro, which needs a connection opened with uri=True.
+    """
+    if is_attached(con):
+        return True
+    if not create and not os.path.exists(path):
+        return False
+    if readonly:
+        con.execute("ATTACH DATABASE ? AS archive", (f"file:{pathname2url(path)}?mode=ro",))
+    else:
+        con.execute("ATTACH DATABASE ? AS archive", (path,))
+        con.execute("PRAGMA archive.journal_mode = WAL")
+        ensure_schema(con)
+    return True
+
+
+def ensure_schema(con):
+    """Create the archive tables from the main schema, or add columns they are missing.
+
+    Tables from before created_at became Unix time are converted first, see timestamps.py.
+    """
+    timestamps.migrate(con, 'archive')
+    for table in TABLES:
+        columns = con.execute(f"PRAGMA main.table_info({table})").fetchall()
+        existing = {row[1] for row in con.execute(f"PRAGMA archive.table_info({table})")}
+        if not existing:
+            defs = ', '.join(f"{c[1]} {c[2]}{' PRIMARY KEY' if c[5] else ''}" for c in columns)
+            con.execute(f"CREATE TABLE archive.{table} ({defs})")
+        for c in columns:
+            if c[1] not in existing and existing:
+                con.execute(f"ALTER TABLE archive.{table} ADD COLUMN {c[1]} {c[2]}")
+    for sql in INDEXES:
+        con.execute(sql)
+    con.commit()
+
+
+def _columns(con, table):
+    return ', '.join(row[1] for row in con.execute(f"PRAGMA main.table_info({table})"))
+
+
+def _in(ids):
+    return '(' + ','.join('?' * len(ids)) + ')'
+
+
+def archive_batch(con, before, batch_size, after=0):
+    """Move up to batch_size closed tickets with ids above `after`, last changed before `before` (Unix time).
+
+    Returns (number moved, highest id tried), or (0, None) when no ticket
+    above `after` is eligible. Fewer than tried are moved when some changed
+    during the copy.
+    """
+    # 1. Copy. Reads main, writes only the archive.
+    con.execute("BEGIN")
+    try:
+        candidates = dict(con.execute(
+            """SELECT t.id, v.version FROM main.tickets t JOIN main.versions v ON v.entity = 'ticket' AND v.id = t.id
+               WHERE t.id > ? AND t.status = 'closed'
+                 AND coalesce((SELECT max(a.created_at) FROM main.activity_log a WHERE a.ticket_id = t.id), t.created_at) < ?
+               ORDER BY t.id LIMIT ?""", (after, before, batch_size)).fetchall())
+        if not candidates:
+            con.rollback()
+            return 0, None
+        ids = list(candidates)
+        for table in TABLES:
+            cols = _columns(con, table)
+            key = 'id' if table == 'tickets' else 'ticket_id'
+            con.execute(f"INSERT OR REPLACE INTO archive.{table} ({cols}) SELECT {cols} FROM main.{table} WHERE {key} IN {_in(ids)}", ids)
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+
+    # 2. Delete from main the tickets nobody touched in the meantime.
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        current = con.execute(
+            f"""SELECT t.id, v.version FROM main.tickets t JOIN main.versions v ON v.entity = 'ticket' AND v.id = t.id
+                WHERE t.id IN {_in(ids)} AND t.status = 'closed'""", ids).fetchall()
+        moved = [tid for tid, version in current if candidates.get(tid) == version]
+        if moved:
+            where = _in(moved)
+            categories = con.execute(f"SELECT coalesce(category, ''), COUNT(*) FROM main.tickets WHERE id IN {where} GROUP BY 1",
+                                     moved).fetchall()
+            # Archived attachments still point at their blobs.
+            con.execute(f"""UPDATE main.blobs SET refcount = refcount +
+                              (SELECT COUNT(*) FROM main.attachments a WHERE a.sha256 = blobs.sha256 AND a.ticket_id IN {where})
+                            WHERE sha256 IN (SELECT sha256 FROM main.attachments WHERE ticket_id IN {where})""", moved + moved)
+            # Foreign keys are checked at COMMIT, so the ticket can go first; its
+            # search row goes with it, which makes the comment deletes below cheap.
+            con.execute("PRAGMA defer_foreign_keys = ON")
+            con.execute(f"DELETE FROM main.tickets WHERE id IN {where}", moved)
+            for table in CHILDREN + ('notifications',):
+                con.execute(f"DELETE FROM main.{table} WHERE ticket_id IN {where}", moved)
+            con.executemany("""INSERT INTO main.counters (scope, key, value) VALUES ('archived', ?, ?)
+                               ON CONFLICT (scope, key) DO UPDATE SET value = value + excluded.value""", categories)
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+
+    # 3. Anything still in main was not archived after all.
+    if len(moved) < len(ids):
+        heal(con, [tid for tid in ids if tid not in set(moved)])
+    return len(moved), ids[-1]
+
+
+def heal(con, ids=None):
+    """Remove archive copies of tickets that are (still or again) in the main database."""
+    sql, params = "SELECT a.id FROM archive.tickets a JOIN main.tickets t ON t.id = a.id", []
+    if ids is not None:
+        sql, params = sql + f" WHERE a.id IN {_in(ids)}", list(ids)
+    with con:
+        stale = [r[0] for r in con.execute(sql, params)]
+        for table in TABLES:
+            key = 'id' if table == 'tickets' else 'ticket_id'
+            con.executemany(f"DELETE FROM archive.{table} WHERE {key} = ?", [(tid,) for tid in stale])
+    return len(stale)
+
+
+def archive_closed(con, before, batch_size=200, pause=0.05, progress=None):
+    """Archive every eligible ticket in batches, sleeping `pause` seconds between them.
+
+    progress(total_so_far) is called after each batch. Returns the total moved.
+    """
+    heal(con)
+    total, last = 0, 0
+    while True:
+        # A batch whose tickets all changed during the copy moves nothing, but
+        # later tickets may still be eligible: go on past the ids tried.
+        moved, last = archive_batch(con, before, batch_size, after=last)
+        if last is None:
+            return total
+        total += moved
+        if progress:
+            progress(total)
+        time.sleep(pause)
+
+
+def prune_notifications(con, days, batch_size=1000, pause=0.05):
+    """Delete read notifications older than `days`, batch_size rows per transaction. Returns the number deleted."""
+    total = 0
+    while True:
+        with con:
+            cur = con.execute("""DELETE FROM notifications WHERE id IN (
+                                   SELECT id FROM notifications WHERE is_read = 1 AND created_at < unixepoch('now', ?)
+                                   ORDER BY id LIMIT ?)""", (f'-{int(days)} days', batch_size))
+        total += cur.rowcount
+        if cur.rowcount < batch_size:
+            return total
+        time.sleep(pause)
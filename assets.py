@@ -0,0 +1,65 @@
+"""
+Fingerprinted static assets produced by build_assets.py.
+
+The build writes each asset to ASSET_FOLDER under a content-hashed name
+(css/styles.3f2a9c1b7d4e.css) with .br/.gz siblings, and a manifest.json
+mapping logical names to those files. Because a name changes whenever the
+content does, the files are served with an immutable, year-long cache
+lifetime, and the precompressed sibling the client accepts is sent instead
+of compressing on every request.
+
+Until the assets are built the templates fall back to the pinned CDN copies
+below and to Tailwind's in-browser compiler (ASSET_CDN_FALLBACK, on by
+default), with Subresource Integrity hashes from frontend/vendor.lock.json
+once they are recorded there.
+"""
+import base64, json, os
+
+TAILWIND_VERSION = '3.4.17'
+TAILWIND_PLAY_CDN = f'https://cdn.tailwindcss.com/{TAILWIND_VERSION}'
+
+# Third-party scripts: the pinned copies build_assets.py vendors, also used as-is when not built.
+CDN = {
+    'js/alpine.min.js': 'https://cdn.jsdelivr.net/npm/alpinejs@3.14.8/dist/cdn.min.js',
+    'js/echarts.min.js': 'https://cdn.jsdelivr.net/npm/echarts@5.5.0/dist/echarts.min.js',
+}
+
+# Precompressed siblings in order of preference: (Content-Encoding, file suffix).
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+MANIFEST = 'manifest.json'
+
+# {url: sha256 hex digest} of every pinned third-party file, written by `build_assets.py --lock`.
+LOCK = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend', 'vendor.lock.json')
+
+
+def load_manifest(folder):
+    """{logical name: built file relative to folder}, or {} when nothing has been built."""
+    try:
+        with open(os.path.join(folder, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def load_lock(path=LOCK):
+    """{url: sha256 hex digest, or None where none is recorded yet}."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def integrity(lock, url):
+    """Subresource Integrity value ('sha256-...') for a pinned url, or None if its hash is not recorded."""
+    digest = lock.get(url)
+    return 'sha256-' + base64.b64encode(bytes.fromhex(digest)).decode() if digest else None
+
+
+def negotiate(accept_encodings, path):
+    """(encoding, suffix) of the best precompressed sibling of path the client accepts, or (None, '')."""
+    for encoding, suffix in ENCODINGS:
+        if accept_encodings[encoding] and os.path.isfile(path + suffix):
+            return encoding, suffix
+    return None, ''
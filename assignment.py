@@ -0,0 +1,146 @@
+"""
+Least-loaded auto-assignment of new tickets to agents.
+
+An agent's load is the summed weight of the open and in-progress tickets
+assigned to them, High counting more than Low. Loads are kept in memory:
+load() reads them with one GROUP BY over the assignee index, and from then
+on pick() and change() adjust them as tickets are assigned, closed or
+re-prioritised, without touching the tickets table.
+
+Agents may list the categories they handle (agent_skills); an agent with no
+rows handles every category. A category nobody handles goes to the
+least-loaded agent overall rather than staying unassigned. There is one
+heap of (load, sequence, agent) per category, one for the generalists and
+one for everybody, so pick() looks at a few heap tops and pushes a few
+entries: O(log agents). A heap entry is never updated in place; a changed
+agent gets a new entry, outdated ones are dropped when they reach the top,
+and the heaps are rebuilt when outdated entries pile up. The sequence
+number breaks ties in favour of the agent whose load changed longest ago.
+
+Loads are per process. Each worker sees its own assignments at once and the
+other workers' when it reloads, every `resync` seconds or after
+invalidate() (role or skill changes).
+"""
+import heapq, itertools, threading, time
+
+WEIGHTS = {'High': 3, 'Medium': 2, 'Low': 1}
+ACTIVE = ('open', 'in_progress')
+ANYONE = object()  # heap key holding every agent
+
+
+def weight(status, priority):
+    """What a ticket in this state adds to its assignee's load."""
+    if status not in ACTIVE:
+        return 0
+    return WEIGHTS.get(priority, WEIGHTS['Medium'])
+
+
+class AgentLoad:
+    def __init__(self, resync=300):
+        self.resync = resync
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._loaded_at = None
+        self._load = {}    # agent id -> weighted load
+        self._skills = {}  # agent id -> frozenset of categories; empty: all categories
+        self._heaps = {}   # category, None for generalists, or ANYONE -> [(load, seq, agent id)]
+        self._entries = 0  # heap entries, current or outdated
+        self._current = 0  # heap entries right after the last rebuild
+
+    def load(self, con):
+        """Read agents, their skills and their current loads from the database."""
+        load = {row[0]: 0 for row in con.execute("SELECT id FROM users WHERE role = 'agent'")}
+        skills = {uid: set() for uid in load}
+        for uid, category in con.execute("SELECT user_id, category FROM agent_skills"):
+            if uid in skills:
+                skills[uid].add(category)
+        for uid, status, priority, n in con.execute(
+                """SELECT assigned_to, status, priority, COUNT(*) FROM tickets
+                   WHERE assigned_to IN (SELECT id FROM users WHERE role = 'agent') AND status IN ('open', 'in_progress')
+                   GROUP BY 1, 2, 3"""):
+            load[uid] += weight(status, priority) * n
+        with self._lock:
+            self._load = load
+            self._skills = {uid: frozenset(s) for uid, s in skills.items()}
+            self._rebuild_heaps()
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Reload on the next pick(), e.g. after an agent's role or skills changed."""
+        with self._lock:
+            self._loaded_at = None
+
+    def pick(self, con, category, priority):
+        """Return the least-loaded agent for category and charge them the ticket, or None without agents.
+
+        con is used to reload the loads when they are due for a resync.
+        """
+        with self._lock:
+            stale = self._loaded_at is None or time.monotonic() - self._loaded_at > self.resync
+        if stale:
+            self.load(con)
+        with self._lock:
+            candidates = [top for top in (self._top(category), self._top(None)) if top]
+            if not candidates:
+                candidates = [top for top in (self._top(ANYONE),) if top]
+            if not candidates:
+                return None
+            agent = min(candidates)[2]
+            self._add(agent, weight('open', priority))
+            return agent
+
+    def change(self, old, new):
+        """Apply a ticket moving from old to new, each (assignee, status, priority)."""
+        with self._lock:
+            self._add(_agent_id(old[0]), -weight(old[1], old[2]))
+            self._add(_agent_id(new[0]), weight(new[1], new[2]))
+
+    def loads(self):
+        with self._lock:
+            return dict(self._load)
+
+    def _add(self, agent, amount):
+        if amount and agent in self._load:
+            self._load[agent] += amount
+            self._push(agent)
+
+    def _entry(self, agent):
+        return (self._load[agent], next(self._seq), agent)
+
+    def _keys(self, agent):
+        return tuple(self._skills[agent] or (None,)) + (ANYONE,)
+
+    def _push(self, agent):
+        for key in self._keys(agent):
+            heapq.heappush(self._heaps.setdefault(key, []), self._entry(agent))
+            self._entries += 1
+        if self._entries > 4 * self._current + 64:
+            self._rebuild_heaps()
+
+    def _top(self, category):
+        heap = self._heaps.get(category)
+        while heap:
+            load, _, agent = heap[0]
+            if self._load.get(agent) == load:
+                return heap[0]
+            heapq.heappop(heap)
+            self._entries -= 1
+        return None
+
+    def _rebuild_heaps(self):
+        heaps = {}
+        for agent in self._skills:
+            for key in self._keys(agent):
+                heaps.setdefault(key, []).append(self._entry(agent))
+        for heap in heaps.values():
+            heapq.heapify(heap)
+        self._heaps = heaps
+        self._entries = self._current = sum(map(len, heaps.values()))
+
+
+def _agent_id(value):
+    # assigned_to comes from a free-text form field and may be a string.
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,283 @@
+"""
+Endpoint benchmarks through Flask's test client against a generated data set.
+
+For every case it reports p50/p95/p99 latency, SQL statements per request and
+peak Python memory per request (tracemalloc, measured in a separate pass so
+tracing does not skew the timings). Results are written as JSON so runs can
+be compared.
+
+Run: python bench.py --users 5000 --tickets 100000     (generates bench.db first)
+     python bench.py --compare bench_results.json      (reuse bench.db, diff against a saved run)
+     python bench.py --logins scrypt:16384:8:1,scrypt:32768:8:1,pbkdf2:sha256:600000
+                                                       (concurrent logins/sec per hash setting)
+"""
+import argparse, json, os, platform, random, sqlite3, statistics, subprocess, sys, threading, time, tracemalloc
+from datetime import datetime, timedelta, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the helpdesk routes.')
+    parser.add_argument('--db', default=os.path.join(HERE, 'bench.db'), help='database to benchmark (default: bench.db)')
+    parser.add_argument('--regenerate', action='store_true', help='rebuild the database even if it exists')
+    parser.add_argument('--users', type=int, default=2000, help='students to generate')
+    parser.add_argument('--tickets', type=int, default=20000, help='tickets to generate')
+    parser.add_argument('--comments', type=float, default=3.0, help='mean comments per ticket')
+    parser.add_argument('--iterations', type=int, default=50, help='timed requests per case')
+    parser.add_argument('--only', default='', help='comma-separated substrings; run matching cases only')
+    parser.add_argument('--output', default=os.path.join(HERE, 'bench_results.json'))
+    parser.add_argument('--compare', help='previous results file to compare against')
+    parser.add_argument('--logins', help='comma-separated PASSWORD_HASH_METHODs; benchmark logins/sec instead of the routes')
+    parser.add_argument('--login-threads', type=int, default=8, help='concurrent clients for --logins')
+    parser.add_argument('--login-seconds', type=float, default=5.0, help='duration per hash method for --logins')
+    return parser.parse_args()
+
+
+def percentile(sorted_samples, p):
+    """Linear-interpolated percentile of an already sorted list."""
+    if len(sorted_samples) == 1:
+        return sorted_samples[0]
+    k = (len(sorted_samples) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_samples) - 1)
+    return sorted_samples[lo] + (sorted_samples[hi] - sorted_samples[lo]) * (k - lo)
+
+
+class QueryCounter:
+    """Wraps app.connect so every connection reports executed statements here."""
+
+    def __init__(self, connect):
+        self._connect = connect
+        self.count = 0
+
+    def _trace(self, statement):
+        self.count += 1
+
+    def __call__(self, *args, **kwargs):
+        con = self._connect(*args, **kwargs)
+        con.set_trace_callback(self._trace)  # after connect(), so its PRAGMAs are not counted
+        return con
+
+
+def bench_logins(helpdesk, args):
+    """Concurrent POST /login throughput for each hash method, with the app's pool limits."""
+    from passwords import PasswordHasher
+    flask_app = helpdesk.app
+    print(f"{args.login_threads} clients, {args.login_seconds:g}s per method, "
+          f"pool: {flask_app.config['PASSWORD_HASH_WORKERS']} workers + {flask_app.config['PASSWORD_HASH_QUEUE']} queued\n")
+    print(f"{'method':28} {'logins/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'429s':>6}")
+    results = {}
+    con = sqlite3.connect(args.db)
+    for method in args.logins.split(','):
+        helpdesk.hasher = PasswordHasher(method, flask_app.config['PASSWORD_HASH_WORKERS'], flask_app.config['PASSWORD_HASH_QUEUE'])
+        password = 'bench-login-123'
+        with con:
+            con.execute("DELETE FROM users WHERE username = 'bench_login'")
+            con.execute("INSERT INTO users (username, password_hash, role) VALUES ('bench_login', ?, 'student')",
+                        (helpdesk.hasher.hash(password),))
+        samples, shed = [], []
+        deadline = time.perf_counter() + args.login_seconds
+
+        def worker():
+            client = flask_app.test_client()
+            mine, rejected = [], 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                r = client.post('/login', data={'username': 'bench_login', 'password': password})
+                if r.status_code == 429:
+                    rejected += 1
+                else:
+                    mine.append((time.perf_counter() - start) * 1000)
+                client.get('/logout')
+            samples.extend(mine)
+            shed.append(rejected)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.login_threads)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        samples.sort()
+        results[method] = {
+            'logins': len(samples), 'rejected': sum(shed),
+            'logins_per_sec': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(samples, 50), 3) if samples else None,
+            'p95_ms': round(percentile(samples, 95), 3) if samples else None,
+        }
+        r = results[method]
+        print(f"{method:28} {r['logins_per_sec']:9.1f} {r['p50_ms'] or 0:9.2f} {r['p95_ms'] or 0:9.2f} {r['rejected']:6}")
+    with con:
+        con.execute("DELETE FROM users WHERE username = 'bench_login'")
+    con.close()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'logins': results}, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+def main():
+    args = parse_args()
+    # Config reads the environment when first imported, by seed_data or app.
+    os.environ['DATABASE_URL'] = args.db
+    if args.regenerate or not os.path.exists(args.db):
+        import seed_data
+        seed_data.seed(args.db, users=args.users, tickets=args.tickets, comments=args.comments)
+
+    import app as helpdesk
+    if args.logins:
+        return bench_logins(helpdesk, args)
+    flask_app = helpdesk.app
+    counter = QueryCounter(helpdesk.connect)
+    helpdesk.connect = counter
+
+    con = sqlite3.connect(args.db)
+    con.row_factory = sqlite3.Row
+    dataset = {t: con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+               for t in ('users', 'tickets', 'comments', 'activity_log', 'notifications', 'kb_articles')}
+    ticket_ids = [r[0] for r in con.execute("SELECT id FROM tickets")]
+    busiest_agent = con.execute("""SELECT u.username FROM tickets t JOIN users u ON u.id = t.assigned_to
+                                   GROUP BY t.assigned_to ORDER BY COUNT(*) DESC LIMIT 1""").fetchone()
+    busiest_student = con.execute("""SELECT u.username FROM tickets t JOIN users u ON u.id = t.user_id
+                                     WHERE u.role = 'student' GROUP BY t.user_id ORDER BY COUNT(*) DESC LIMIT 1""").fetchone()
+    deep_id = con.execute("SELECT id FROM tickets ORDER BY id DESC LIMIT 1 OFFSET ?",
+                          (min(len(ticket_ids) - 1, 5000),)).fetchone()
+    con.close()
+    rng = random.Random(1)
+
+    # Generated users share these passwords (see seed_data.generate).
+    passwords = {'admin': 'admin123', 'agent': 'agent123', 'student': 'student123'}
+    clients = {}
+    for role, username in (('admin', 'admin'),
+                           ('agent', busiest_agent[0] if busiest_agent else 'agent_priya'),
+                           ('student', busiest_student[0] if busiest_student else 'student_aarav')):
+        client = flask_app.test_client()
+        r = client.post('/login', data={'username': username, 'password': passwords[role]})
+        if r.status_code != 302:
+            sys.exit(f'Could not log in as {username}')
+        client.get('/dashboard')  # consume the login flash
+        clients[role] = client
+
+    today = datetime.now(timezone.utc).date()
+    month_ago = today - timedelta(days=30)
+    etags = {}
+
+    def ticket_view_revalidate(client):
+        tid = rng.choice(ticket_ids[:10])
+        headers = {'If-None-Match': etags[tid]} if tid in etags else {}
+        r = client.get(f'/ticket/{tid}', headers=headers)
+        if r.headers.get('ETag'):
+            etags[tid] = r.headers['ETag']
+        return r
+
+    def get(path):
+        return lambda client: client.get(path() if callable(path) else path)
+
+    # (name, role, request, iterations factor)
+    cases = [
+        ('dashboard', 'admin', get('/dashboard'), 1),
+        ('dashboard status=open', 'admin', get('/dashboard?status=open'), 1),
+        ('dashboard category=Hostel', 'admin', get('/dashboard?category=Hostel'), 1),
+        ('dashboard q=printer', 'admin', get('/dashboard?q=printer'), 1),
+        ('dashboard q=ex (short)', 'admin', get('/dashboard?q=ex'), 1),
+        ('dashboard mine=1', 'agent', get('/dashboard?mine=1'), 1),
+        ('dashboard assignee', 'admin', get(f"/dashboard?assignee=2"), 1),
+        ('dashboard date range', 'admin', get(f'/dashboard?from={month_ago}&to={today}'), 1),
+        ('dashboard deep page', 'admin', get(f"/dashboard?after_id={deep_id[0] if deep_id else 1}"), 1),
+        ('dashboard student', 'student', get('/dashboard'), 1),
+        ('ticket_view', 'admin', get(lambda: f'/ticket/{rng.choice(ticket_ids)}'), 1),
+        ('ticket_view revalidate', 'admin', ticket_view_revalidate, 1),
+        ('kb', 'student', get('/kb'), 1),
+        ('kb q=wifi', 'student', get('/kb?q=wifi'), 1),
+        ('kb q=password reset', 'student', get('/kb?q=password+reset'), 1),
+        ('reports', 'admin', get('/reports'), 1),
+        ('export_csv', 'admin', get('/reports/export'), 0.1),
+        ('export_csv jsonl+gzip+extras', 'admin', get('/reports/export?format=jsonl&gzip=1&include=comments,first_response'), 0.1),
+        ('export_csv category=Hostel', 'admin', get('/reports/export?category=Hostel'), 0.2),
+        ('comment_add', 'agent', lambda client: client.post(f'/ticket/{rng.choice(ticket_ids)}/comment',
+                                                            data={'content': 'Benchmark reply.'}), 1),
+    ]
+    if args.only:
+        wanted = [w.strip() for w in args.only.split(',') if w.strip()]
+        cases = [c for c in cases if any(w in c[0] for w in wanted)]
+
+    def run(case):
+        _, role, request, _ = case
+        response = request(clients[role])
+        response.get_data()  # drain streamed bodies
+        response.close()
+        return response.status_code
+
+    results = {}
+    for case in cases:
+        name, _, _, factor = case
+        n = max(3, int(args.iterations * factor))
+        for _ in range(2):
+            run(case)  # warm caches
+        samples, queries, errors = [], [], 0
+        for _ in range(n):
+            counter.count = 0
+            start = time.perf_counter()
+            status = run(case)
+            samples.append((time.perf_counter() - start) * 1000)
+            queries.append(counter.count)
+            errors += status >= 400
+        samples.sort()
+        results[name] = {
+            'n': n, 'errors': errors,
+            'p50_ms': round(percentile(samples, 50), 3),
+            'p95_ms': round(percentile(samples, 95), 3),
+            'p99_ms': round(percentile(samples, 99), 3),
+            'mean_ms': round(statistics.fmean(samples), 3),
+            'queries': round(statistics.fmean(queries), 1),
+        }
+
+    tracemalloc.start()
+    for case in cases:
+        peak = 0
+        for _ in range(3):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            run(case)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+        results[case[0]]['peak_kib'] = round(peak / 1024, 1)
+    tracemalloc.stop()
+    helpdesk.events.flush()
+
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                  capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        revision = None
+    report = {
+        'meta': {'timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'), 'revision': revision,
+                 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                 'iterations': args.iterations, 'dataset': dataset},
+        'results': results,
+    }
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)['results']
+
+    print(f"{'case':34} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'peak KiB':>9}"
+          + (f" {'p50 vs prev':>12}" if previous else ''))
+    for name, r in results.items():
+        line = (f"{name:34} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['p99_ms']:9.2f} "
+                f"{r['queries']:8.1f} {r['peak_kib']:9.1f}")
+        if previous and name in previous and previous[name]['p50_ms']:
+            change = (r['p50_ms'] / previous[name]['p50_ms'] - 1) * 100
+            line += f" {change:+11.1f}%"
+        if r['errors']:
+            line += f"  ({r['errors']} errors)"
+        print(line)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nDataset: {', '.join(f'{k}={v}' for k, v in dataset.items())}")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Content-addressed file storage for ticket attachments.
+
+Each distinct file is stored once under <root>/blobs/<aa>/<sha256>, where aa
+is the first two hex digits of its SHA-256. Uploads are streamed to a
+temporary file in the same directory tree while being hashed, then renamed
+into place, so a partially written upload is never visible under its hash.
+"""
+import hashlib, os, tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+def blob_relpath(sha256):
+    return os.path.join('blobs', sha256[:2], sha256)
+
+
+def blob_path(root, sha256):
+    return os.path.join(root, blob_relpath(sha256))
+
+
+def store_stream(root, stream):
+    """Copy a binary stream into the store. Returns (sha256, size)."""
+    tmp_dir = os.path.join(root, 'blobs', 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        final = blob_path(root, sha256)
+        if os.path.exists(final):
+            os.unlink(tmp_path)  # already stored: identical content
+        else:
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            os.replace(tmp_path, final)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return sha256, size
+
+
+def store_file(root, path):
+    """Copy an existing file into the store. Returns (sha256, size).
+
+    The original is left in place; remove it once the row pointing at the blob is committed.
+    """
+    with open(path, 'rb') as f:
+        return store_stream(root, f)
+
+
+def modified_before(path, cutoff):
+    """True if the file at path exists and was last written before cutoff (Unix time)."""
+    try:
+        return os.path.getmtime(path) < cutoff
+    except OSError:
+        return False
+
+
+def iter_blobs(root):
+    """Yield the sha256 of every blob file present on disk."""
+    base = os.path.join(root, 'blobs')
+    if not os.path.isdir(base):
+        return
+    for prefix in os.listdir(base):
+        if len(prefix) != 2:
+            continue
+        for name in os.listdir(os.path.join(base, prefix)):
+            yield name
+
+
+def iter_tmp(root):
+    """Yield the path of every temporary file left in the store, e.g. by an upload that was killed."""
+    tmp_dir = os.path.join(root, 'blobs', 'tmp')
+    if os.path.isdir(tmp_dir):
+        for name in os.listdir(tmp_dir):
+            yield os.path.join(tmp_dir, name)
@@ -0,0 +1,200 @@
+"""
+Build the static assets into static/dist: a precompiled Tailwind stylesheet,
+the vendored third-party scripts and the app's own CSS, each under a
+content-hashed name with .gz and .br siblings, plus manifest.json (see
+assets.py).
+
+The stylesheet is compiled by the Tailwind CLI with frontend/tailwind.config.js,
+which scans templates/ so only the classes in use are emitted. Scripts are
+downloaded once from the pinned URLs in assets.CDN and kept in
+frontend/vendor/; every build checks them against the sha256 recorded in
+frontend/vendor.lock.json and fails on a mismatch. After changing a URL,
+run with --lock and commit the lockfile: it downloads the pinned files
+(and the Tailwind Play CDN script the unbuilt fallback uses) and records
+their hashes, refusing a jsDelivr npm file that differs from the package
+published to the npm registry, whose tarball is checked against the
+registry's own integrity hash. The app also uses these hashes for the
+integrity attributes of its CDN fallback.
+.br files need the brotli package (pip install brotli); without it only
+.gz files are written.
+
+Files from earlier builds are kept, so pages still cached by browsers keep
+working. Restart the app after a build so it reads the new manifest.
+
+Run: python build_assets.py
+     python build_assets.py --tailwind ./tailwindcss   (standalone Tailwind CLI instead of npx)
+     python build_assets.py --lock                      (record the vendored scripts' hashes)
+"""
+import argparse, base64, gzip, hashlib, io, json, os, re, shlex, subprocess, sys, tarfile, tempfile
+from urllib.request import urlopen
+import assets
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FRONTEND = os.path.join(HERE, 'frontend')
+VENDOR = os.path.join(FRONTEND, 'vendor')
+# A file on jsDelivr's npm mirror: package, version, path inside the package.
+_NPM_URL = re.compile(r'^https://cdn\.jsdelivr\.net/npm/((?:@[^/]+/)?[^@/]+)@([^/]+)/(.+)$')
+OWN = ['css/styles.css']  # files under static/ that are fingerprinted as they are
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--out', default=os.path.join(HERE, 'static', 'dist'), help='output folder (ASSET_FOLDER)')
+    parser.add_argument('--tailwind', default=f'npx --yes tailwindcss@{assets.TAILWIND_VERSION}',
+                        help='command that runs the Tailwind CLI')
+    parser.add_argument('--lock', action='store_true',
+                        help='download the pinned scripts afresh and record their sha256 in the lockfile')
+    return parser.parse_args()
+
+
+class LockError(Exception):
+    pass
+
+
+def compile_tailwind(command):
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, 'tailwind.css')
+        subprocess.run(shlex.split(command) + ['-c', os.path.join(FRONTEND, 'tailwind.config.js'),
+                                               '-i', os.path.join(FRONTEND, 'tailwind.css'), '-o', out, '--minify'],
+                       check=True, cwd=HERE)
+        return _read(out)
+
+
+def vendored(url, lock):
+    """Contents of url, downloaded on first use and then read from frontend/vendor/.
+
+    Raises LockError unless their sha256 is the one recorded in the lockfile.
+    """
+    if not lock.get(url):
+        raise LockError(f"no hash recorded for {url} in {os.path.relpath(assets.LOCK, HERE)}; run with --lock")
+    path = _vendor_path(url)
+    cached = os.path.exists(path)
+    data = _read(path) if cached else _download(url)
+    digest = hashlib.sha256(data).hexdigest()
+    if lock[url] != digest:
+        raise LockError(f"sha256 {digest} of {path if cached else url} does not match the lockfile")
+    if not cached:
+        _cache(path, data)
+    return data
+
+
+def relock(url, lock):
+    """Download url afresh, check it against the npm registry where possible, and record its sha256."""
+    data = _download(url)
+    reference = published(url)
+    if reference is None:
+        print(f"{url}: no independent copy to compare with; recording the hash of this download", file=sys.stderr)
+    elif reference != data:
+        raise LockError(f"{url} differs from the file published to the npm registry")
+    lock[url] = hashlib.sha256(data).hexdigest()
+    if url in assets.CDN.values():
+        _cache(_vendor_path(url), data)
+    return data
+
+
+def published(url):
+    """The file at url as published to the npm registry, or None if url is not a jsDelivr npm file.
+
+    The package tarball must match the integrity hash the registry lists for it.
+    """
+    match = _NPM_URL.match(url)
+    if not match:
+        return None
+    package, version, name = match.groups()
+    meta = json.loads(_download(f'https://registry.npmjs.org/{package}/{version}'))
+    tarball = _download(meta['dist']['tarball'])
+    algorithm, _, expected = meta['dist']['integrity'].partition('-')
+    if base64.b64encode(hashlib.new(algorithm, tarball).digest()).decode() != expected:
+        raise LockError(f"{meta['dist']['tarball']} does not match the registry's integrity {meta['dist']['integrity']}")
+    with tarfile.open(fileobj=io.BytesIO(tarball)) as tar:
+        member = tar.extractfile(f'package/{name}')
+        if member is None:
+            raise LockError(f"{name} is not in {package}@{version}")
+        return member.read()
+
+
+def _vendor_path(url):
+    return os.path.join(VENDOR, hashlib.sha256(url.encode()).hexdigest()[:16] + '-' + os.path.basename(url))
+
+
+def _download(url):
+    with urlopen(url, timeout=120) as response:
+        return response.read()
+
+
+def _cache(path, data):
+    os.makedirs(VENDOR, exist_ok=True)
+    _write(path, data)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _write(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def emit(out, name, data):
+    """Write data as name with its content hash in the file name, plus compressed siblings. Returns the file name."""
+    root, ext = os.path.splitext(name)
+    built = f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+    path = os.path.join(out, built)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    outputs = {'': lambda: data, '.gz': lambda: gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        outputs['.br'] = lambda: brotli.compress(data, quality=11)
+    for suffix, encode in outputs.items():
+        if not os.path.exists(path + suffix):
+            _write(path + suffix, encode())
+    return built
+
+
+def main():
+    args = parse_args()
+    sources = {name: (lambda name=name: _read(os.path.join(HERE, 'static', name))) for name in OWN}
+    sources['css/tailwind.css'] = lambda: compile_tailwind(args.tailwind)
+    lock, failed = assets.load_lock(), []
+    if args.lock:
+        lock = {url: lock.get(url) for url in [assets.TAILWIND_PLAY_CDN, *assets.CDN.values()]}
+        try:
+            relock(assets.TAILWIND_PLAY_CDN, lock)
+        except (OSError, LockError) as e:
+            failed.append(assets.TAILWIND_PLAY_CDN)
+            print(f"{assets.TAILWIND_PLAY_CDN}: FAILED ({e})", file=sys.stderr)
+    for name, url in assets.CDN.items():
+        sources[name] = lambda url=url: relock(url, lock) if args.lock else vendored(url, lock)
+
+    manifest = assets.load_manifest(args.out)
+    for name, load in sources.items():
+        try:
+            data = load()
+        except (OSError, subprocess.CalledProcessError, LockError) as e:
+            # The previous build of this asset stays in use.
+            failed.append(name)
+            print(f"{name}: FAILED ({e})", file=sys.stderr)
+            continue
+        manifest[name] = emit(args.out, name, data)
+        print(f"{name} -> {manifest[name]} ({len(data)} bytes)")
+
+    os.makedirs(args.out, exist_ok=True)
+    _write(os.path.join(args.out, assets.MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    if args.lock:
+        _write(assets.LOCK, (json.dumps(lock, indent=2, sort_keys=True) + '\n').encode())
+    if brotli is None:
+        print("brotli is not installed; wrote .gz files only", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
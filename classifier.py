@@ -0,0 +1,180 @@
+"""
+Keyword classifier used to guess a ticket's category.
+
+keyword_tags.json maps each category to its keywords. A keyword is either a
+plain string (weight 1) or a [term, weight] pair, and a term may be a phrase.
+Keywords only match whole words (an optional plural "s"/"es" is allowed), so
+"lab" no longer matches "available". The text is split into words once and
+single-word keywords are found with one hash lookup per distinct word; phrases are only
+checked when their first word is present. The file is re-read automatically
+when it changes.
+
+Run: python classifier.py   (micro-benchmark against the old substring scan)
+"""
+import json, os, re, string, threading, time
+
+
+class KeywordClassifier:
+    def __init__(self, path, default='General', check_interval=1.0):
+        self.path = path
+        self.default = default
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._mtime = None
+        self._state = None
+        self._maybe_reload(force=True)
+
+    @property
+    def categories(self):
+        return list(self._state[0])
+
+    def classify(self, text):
+        """Return the best-scoring category for text, or the default when nothing matches."""
+        self._maybe_reload()
+        return self._classify(self._state, text)
+
+    def classify_many(self, texts):
+        """Classify an iterable of texts against a single snapshot of the keywords."""
+        self._maybe_reload()
+        state = self._state
+        return [self._classify(state, text) for text in texts]
+
+    def _classify(self, state, text):
+        categories, words, phrases, terms = state
+        if not text:
+            return self.default
+        tokens = split_words(text)
+        present = set(tokens)
+        # A keyword counts once no matter how often it appears.
+        found = {words[w] for w in present if w in words}
+        if phrases and not present.isdisjoint(phrases):
+            joined = None
+            for i in range(len(tokens) - 1):
+                for term, second, pattern in phrases.get(tokens[i], ()):
+                    if term in found or tokens[i + 1] not in second:
+                        continue
+                    if pattern is None:
+                        found.add(term)
+                        continue
+                    joined = joined or ' '.join(tokens)
+                    if pattern.search(joined):
+                        found.add(term)
+        scores = {}
+        for term in found:
+            for cat, weight in terms[term]:
+                scores[cat] = scores.get(cat, 0) + weight
+        best, score = None, 0
+        for cat in categories:
+            if scores.get(cat, 0) > score:
+                score, best = scores[cat], cat
+        return best or self.default
+
+    def _maybe_reload(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                if self._state is None:
+                    raise
+                return
+            if mtime == self._mtime and not force:
+                return
+            with open(self.path, 'r', encoding='utf-8') as f:
+                keywords = json.load(f)
+            self._state = compile_keywords(keywords)
+            self._mtime = mtime
+
+
+_SEPARATORS = str.maketrans({c: ' ' for c in string.punctuation})
+
+
+def split_words(text):
+    """Lowercase text and split it into words on whitespace and ASCII punctuation."""
+    return text.lower().translate(_SEPARATORS).split()
+
+
+def compile_keywords(keywords):
+    """Build the matcher state from the keyword_tags.json structure.
+
+    Returns (categories, words, phrases, terms):
+      words   - every accepted spelling of a one-word term (incl. plurals) -> term
+      phrases - first word of a multi-word term -> [(term, accepted second words,
+                regex for the full phrase or None for two-word phrases)]
+      terms   - term -> [(category, weight)] it scores for
+    Terms are normalised to their lowercase words joined by single spaces, so
+    "Wi-Fi" and "wi fi" are the same phrase.
+    """
+    words, phrases, terms = {}, {}, {}
+    for cat, entries in keywords.items():
+        for entry in entries:
+            term, weight = (entry, 1) if isinstance(entry, str) else (entry[0], entry[1])
+            parts = split_words(term)
+            if not parts:
+                continue
+            term = ' '.join(parts)
+            if term not in terms:
+                if len(parts) == 1:
+                    for form in (term + 'es', term + 's', term):
+                        words[form] = term
+                else:
+                    if len(parts) == 2:
+                        # The word pair is the whole phrase, no need to look further.
+                        second, pattern = {parts[1], parts[1] + 's', parts[1] + 'es'}, None
+                    else:
+                        second = {parts[1]}
+                        pattern = re.compile(r'(?<!\w)' + re.escape(term) + r'(?:e?s)?(?!\w)')
+                    phrases.setdefault(parts[0], []).append((term, second, pattern))
+            terms.setdefault(term, []).append((cat, weight))
+    return list(keywords), words, phrases, terms
+
+
+def _legacy_guess(keywords, text):
+    text_l = text.lower()
+    best, score = None, 0
+    for cat, words in keywords.items():
+        s = sum(1 for w in words if (w if isinstance(w, str) else w[0]) in text_l)
+        if s > score:
+            score, best = s, cat
+    return best if best else 'General'
+
+
+if __name__ == '__main__':
+    import random, timeit
+
+    import tempfile
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keyword_tags.json')
+    with open(path, 'r', encoding='utf-8') as f:
+        shipped = json.load(f)
+    filler = ('the a my is not in on for since yesterday please urgent campus block student '
+              'portal issue available resulting working showing error days').split()
+    rng = random.Random(42)
+
+    # The shipped file, then the same categories padded with synthetic keywords
+    # to show how each approach scales with the size of the keyword list.
+    for extra in (0, 100, 500):
+        keywords = {cat: list(words) + [f'{split_words(cat)[0]}kw{i}' for i in range(extra)]
+                    for cat, words in shipped.items()}
+        vocab = [w if isinstance(w, str) else w[0] for words in keywords.values() for w in words]
+        texts = [' '.join(rng.choice(vocab) if rng.random() < 0.05 else rng.choice(filler)
+                          for _ in range(rng.randint(20, 120)))
+                 for _ in range(2000)]
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as tmp:
+            json.dump(keywords, tmp)
+        clf = KeywordClassifier(tmp.name)
+
+        runs = 5
+        legacy = min(timeit.repeat(lambda: [_legacy_guess(keywords, t) for t in texts], number=1, repeat=runs))
+        single = min(timeit.repeat(lambda: [clf.classify(t) for t in texts], number=1, repeat=runs))
+        batch = min(timeit.repeat(lambda: clf.classify_many(texts), number=1, repeat=runs))
+        os.unlink(tmp.name)
+        n = len(texts)
+        print(f"{n} texts, {len(vocab)} keywords, best of {runs}")
+        print(f"  substring scan : {legacy * 1e6 / n:8.1f} us/text")
+        print(f"  classify       : {single * 1e6 / n:8.1f} us/text")
+        print(f"  classify_many  : {batch * 1e6 / n:8.1f} us/text")
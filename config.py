@@ -4,6 +4,89 @@ BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', '3cf9644e1f054dcc77e66ecf4fc51295e683a2129901db747b46307e06eba586')
-    DATABASE_URL = os.path.join(BASE_DIR, 'campus_helpdesk.db')
+    DATABASE_URL = os.environ.get('DATABASE_URL', os.path.join(BASE_DIR, 'campus_helpdesk.db'))
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+    BLOB_GC_GRACE = int(os.environ.get('BLOB_GC_GRACE', 3600))  # seconds; `flask gc-blobs` leaves newer files alone
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max upload
+    # None: serve attachments from Python. 'x-accel' (nginx) or 'x-sendfile'
+    # (Apache/lighttpd): hand the file to the front proxy instead.
+    ATTACHMENT_SENDFILE = os.environ.get('ATTACHMENT_SENDFILE') or None
+    ATTACHMENT_ACCEL_PREFIX = os.environ.get('ATTACHMENT_ACCEL_PREFIX', '/protected-uploads/')  # internal nginx location
+    ASSET_FOLDER = os.environ.get('ASSET_FOLDER', os.path.join(BASE_DIR, 'static', 'dist'))  # output of build_assets.py, served at /assets/
+    ASSET_CDN_FALLBACK = os.environ.get('ASSET_CDN_FALLBACK', '1') == '1'  # load unbuilt assets from their pinned CDN URLs; 0 never contacts a CDN
+    TICKETS_PER_PAGE = int(os.environ.get('TICKETS_PER_PAGE', 50))
+    EXPORT_CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 500))  # rows fetched per streamed chunk
+    BULK_UPDATE_MAX = int(os.environ.get('BULK_UPDATE_MAX', 1000))  # tickets changed by one bulk action on the dashboard
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))  # /api/v1 list items per page without ?limit=
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 200))
+    API_GZIP_MIN_BYTES = int(os.environ.get('API_GZIP_MIN_BYTES', 1024))  # smaller /api/v1 responses are sent uncompressed
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 1000))  # tickets per transaction in bulk imports
+
+    # SQLite connection tuning, applied to every connection opened by app.connect()
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # ms
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -16000))  # negative = KiB
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))
+    SQLITE_AUTO_VACUUM = os.environ.get('SQLITE_AUTO_VACUUM', 'INCREMENTAL')  # applies to new databases; existing ones: flask db-maintenance --enable-incremental-vacuum
+    TIMESTAMP_MIGRATION_BATCH = int(os.environ.get('TIMESTAMP_MIGRATION_BATCH', 5000))  # rows per transaction when init_db converts text timestamps
+
+    # Write-behind queue for activity_log/notifications inserts
+    EVENT_QUEUE_SYNC = os.environ.get('EVENT_QUEUE_SYNC', '0') == '1'  # write inline, e.g. for tests
+    EVENT_FLUSH_INTERVAL = float(os.environ.get('EVENT_FLUSH_INTERVAL', 0.5))  # seconds
+    EVENT_BATCH_SIZE = int(os.environ.get('EVENT_BATCH_SIZE', 500))
+
+    # Server-Sent Events (/events)
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 100))  # open streams per worker process
+    SSE_HEARTBEAT = int(os.environ.get('SSE_HEARTBEAT', 15))  # seconds between keep-alive comments
+    SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', 3000))  # client reconnect delay
+
+    # Instrumentation: slow-query log and /metrics
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))  # statements slower than this are logged with their query plan
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG') or None  # file path; default: the 'helpdesk.slowsql' logger only
+    # When set, /metrics requires 'Authorization: Bearer <token>'; when unset it answers only
+    # requests from the loopback address (a scraper on the same host) and is a 404 for the rest.
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+    # Password hashing (see passwords.py). Stored hashes with other parameters are upgraded at login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')  # werkzeug method, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # hashes computed at once per worker process
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))  # more than this waiting: answer 429
+    PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 5))  # seconds, sent with the 429
+
+    # Auto-assignment of new tickets to the least-loaded agent with the category's skill (see assignment.py)
+    AUTO_ASSIGN = os.environ.get('AUTO_ASSIGN', '1') == '1'
+    AUTO_ASSIGN_RESYNC = int(os.environ.get('AUTO_ASSIGN_RESYNC', 300))  # seconds between reloads of agent loads (picks up other workers' assignments)
+
+    # Similar-ticket and KB suggestions while a ticket is written (see similar.py)
+    SIMILAR_RESULTS = int(os.environ.get('SIMILAR_RESULTS', 5))  # articles and tickets returned, each
+    SIMILAR_MIN_SCORE = float(os.environ.get('SIMILAR_MIN_SCORE', 0.15))  # cosine similarity, 0..1
+    SIMILAR_DUPLICATE_SCORE = float(os.environ.get('SIMILAR_DUPLICATE_SCORE', 0.5))  # open tickets at least this similar are flagged as duplicates
+    SIMILAR_RESYNC = int(os.environ.get('SIMILAR_RESYNC', 300))  # seconds between background rebuilds from the database
+
+    # Archival: closed tickets untouched for ARCHIVE_AFTER_DAYS move to a separate database (`flask archive-tickets`)
+    ARCHIVE_DATABASE_URL = os.environ.get('ARCHIVE_DATABASE_URL', os.path.splitext(DATABASE_URL)[0] + '_archive.db')
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 200))  # tickets per transaction
+    ARCHIVE_PAUSE = float(os.environ.get('ARCHIVE_PAUSE', 0.05))  # seconds between batches, so app writes get the lock
+    NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))  # read notifications older than this are deleted
+
+    # Database maintenance (see maintenance.py): `flask db-maintenance`, or a background thread in each worker
+    MAINTENANCE_THREAD = os.environ.get('MAINTENANCE_THREAD', '0') == '1'
+    MAINTENANCE_CHECK_INTERVAL = int(os.environ.get('MAINTENANCE_CHECK_INTERVAL', 86400))  # seconds; 0 disables a task
+    MAINTENANCE_OPTIMIZE_INTERVAL = int(os.environ.get('MAINTENANCE_OPTIMIZE_INTERVAL', 3600))
+    MAINTENANCE_VACUUM_INTERVAL = int(os.environ.get('MAINTENANCE_VACUUM_INTERVAL', 3600))
+    MAINTENANCE_CHECKPOINT_INTERVAL = int(os.environ.get('MAINTENANCE_CHECKPOINT_INTERVAL', 300))
+    MAINTENANCE_BACKUP_INTERVAL = int(os.environ.get('MAINTENANCE_BACKUP_INTERVAL', 86400))
+    MAINTENANCE_PAUSE = float(os.environ.get('MAINTENANCE_PAUSE', 0.02))  # seconds between backup and vacuum steps
+    ANALYSIS_LIMIT = int(os.environ.get('ANALYSIS_LIMIT', 1000))  # rows ANALYZE samples per index
+    VACUUM_STEP_PAGES = int(os.environ.get('VACUUM_STEP_PAGES', 500))  # free pages released per transaction
+    VACUUM_MAX_PAGES = int(os.environ.get('VACUUM_MAX_PAGES', 25000))  # per run
+    WAL_TRUNCATE_MB = int(os.environ.get('WAL_TRUNCATE_MB', 64))  # a larger WAL file is reset after the checkpoint
+    BACKUP_FOLDER = os.environ.get('BACKUP_FOLDER', os.path.join(BASE_DIR, 'backups'))
+    BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 7))  # newest copies kept per database; 0 keeps all
+    BACKUP_STEP_PAGES = int(os.environ.get('BACKUP_STEP_PAGES', 1000))  # pages copied per step
+
+    # Rendered-fragment cache and ETags for ticket and knowledge-base pages
+    FRAGMENT_CACHE_CHARS = int(os.environ.get('FRAGMENT_CACHE_CHARS', 8 * 1024 * 1024))  # per worker process
+    FRAGMENT_TTL = int(os.environ.get('FRAGMENT_TTL', 60))  # seconds relative times ('5m ago') may lag
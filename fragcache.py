@@ -0,0 +1,57 @@
+"""
+Size-bounded LRU cache for rendered template fragments.
+
+Keys carry everything a fragment depends on (normally an entity's version
+stamp from the versions table), so entries never need explicit invalidation:
+a change produces a new key and the old entry ages out. The bound is on the
+total length of the cached strings.
+"""
+import collections, threading
+
+
+class FragmentCache:
+    def __init__(self, max_chars=8 * 1024 * 1024):
+        self.max_chars = max_chars
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_chars:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get_or_render(self, key, render):
+        """Return the cached fragment for key, calling render() to build it on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,8 @@
+// Tailwind CLI configuration for build_assets.py. Only classes that appear in
+// the templates are emitted. theme.json is also what the in-browser compiler
+// uses when the stylesheet has not been built (see base.html).
+module.exports = {
+  darkMode: 'class',
+  content: [__dirname + '/../templates/**/*.html'],
+  theme: { extend: require('./theme.json') },
+};
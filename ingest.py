@@ -0,0 +1,211 @@
+"""
+Bulk ticket ingestion from JSON Lines.
+
+Each line is one ticket:
+
+    {"title": "...", "description": "...", "priority": "High",
+     "category": "Hostel", "username": "student_neha"}
+
+Only title is required. "body" is accepted in place of description, and
+user_id in place of username. Records without a user are filed under the
+importing user. Without a category the ticket is classified like one from
+the web form, and with an assigner it is auto-assigned like one too. Unknown
+keys such as an upstream "request_id" are ignored.
+
+Lines are read one at a time and committed in batches. Each batch is one
+BEGIN IMMEDIATE transaction holding the ticket inserts and their 'created'
+and 'assigned' activity rows. After every commit the byte offset of the next unread line
+is written to the checkpoint, so an interrupted run resumes where it
+stopped. Lines that fail validation are appended to a dead-letter file
+with the reason and never stop the run.
+"""
+import json, os, time
+from rollups import ASSIGNED_DETAIL
+
+PRIORITIES = {'low': 'Low', 'medium': 'Medium', 'high': 'High'}
+MAX_TITLE = 200
+
+
+class IngestStats:
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = 0
+        self.offset = 0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.inserted / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {'inserted': self.inserted, 'rejected': self.rejected, 'offset': self.offset,
+                'seconds': round(self.elapsed, 3), 'rows_per_sec': round(self.rows_per_sec, 1)}
+
+
+def parse_record(line, users, user_ids, default_user_id):
+    """Validate one JSONL line. Returns (user_id, title, description, category, priority).
+
+    users maps username -> id and user_ids is the set of valid ids. Raises
+    ValueError with a short reason for anything that cannot be imported.
+    category is None when the record leaves it to the classifier.
+    """
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f'invalid JSON: {e}')
+    if not isinstance(record, dict):
+        raise ValueError('record is not an object')
+
+    title = record.get('title')
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError('missing title')
+    title = title.strip()
+    if len(title) > MAX_TITLE:
+        raise ValueError(f'title longer than {MAX_TITLE} characters')
+    description = record.get('description', record.get('body', ''))
+    if description is None:
+        description = ''
+    if not isinstance(description, str):
+        raise ValueError('description is not a string')
+
+    priority = record.get('priority') or 'Medium'
+    if not isinstance(priority, str) or priority.lower() not in PRIORITIES:
+        raise ValueError(f'unknown priority {priority!r}')
+    category = record.get('category') or None
+    if category is not None and not isinstance(category, str):
+        raise ValueError('category is not a string')
+
+    if 'user_id' in record:
+        user_id = record['user_id']
+        if not isinstance(user_id, int) or user_id not in user_ids:
+            raise ValueError(f'unknown user_id {user_id!r}')
+    elif 'username' in record:
+        user_id = users.get(record['username'])
+        if user_id is None:
+            raise ValueError(f"unknown username {record['username']!r}")
+    else:
+        user_id = default_user_id
+    return user_id, title, description.strip(), category, PRIORITIES[priority.lower()]
+
+
+def ingest(con, stream, classify_many, default_user_id, batch_size=1000,
+           checkpoint=None, dead_letter=None, assigner=None, imported=None):
+    """Import tickets from a binary JSONL stream positioned at a line start.
+
+    checkpoint(offset) is called after each committed batch with the stream
+    offset of the next unread line. dead_letter(offset, reason, line) is
+    called for every rejected line. assigner, an assignment.AgentLoad, gives
+    each ticket to the least-loaded agent; without one tickets arrive
+    unassigned. imported(rows) is called after each commit with the new
+    tickets as (id, user_id, title, description) rows. Returns an IngestStats.
+    """
+    stats = IngestStats()
+    stats.offset = stream.tell() if stream.seekable() else 0
+    users = {r[0]: r[1] for r in con.execute("SELECT username, id FROM users")}
+    user_ids = set(users.values())
+    batch = []
+    offset = stats.offset
+    for raw in stream:
+        line_offset, offset = offset, offset + len(raw)
+        try:
+            line = raw.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            stats.rejected += 1
+            if dead_letter:
+                dead_letter(line_offset, 'not UTF-8', raw.decode('utf-8', 'replace').strip())
+            continue
+        if not line:
+            continue
+        try:
+            batch.append(parse_record(line, users, user_ids, default_user_id))
+        except ValueError as e:
+            stats.rejected += 1
+            if dead_letter:
+                dead_letter(line_offset, str(e), line)
+            continue
+        if len(batch) >= batch_size:
+            stats.inserted += _insert_batch(con, batch, classify_many, assigner, imported)
+            batch = []
+            stats.offset = offset
+            if checkpoint:
+                checkpoint(offset)
+    if batch:
+        stats.inserted += _insert_batch(con, batch, classify_many, assigner, imported)
+    stats.offset = offset
+    if checkpoint:
+        checkpoint(offset)
+    stats.elapsed = time.monotonic() - stats.started
+    return stats
+
+
+def _insert_batch(con, batch, classify_many, assigner=None, imported=None):
+    unclassified = [i for i, rec in enumerate(batch) if rec[3] is None]
+    categories = classify_many(f'{batch[i][1]} {batch[i][2]}' for i in unclassified)
+    rows = [list(rec) for rec in batch]
+    for i, category in zip(unclassified, categories):
+        rows[i][3] = category
+    for row in rows:
+        row.append(assigner.pick(con, row[3], row[4]) if assigner else None)
+    # IMMEDIATE takes the write lock up front, so no other writer can add
+    # tickets between reading the high-water mark and the inserts below.
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        high = con.execute("SELECT coalesce(max(id), 0) FROM tickets").fetchone()[0]
+        con.executemany("INSERT INTO tickets (user_id, title, description, category, priority, assigned_to) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        con.execute("""INSERT INTO activity_log (ticket_id, user_id, action, detail)
+                       SELECT id, user_id, 'created', 'Ticket imported with priority ' || priority
+                       FROM tickets WHERE id > ? ORDER BY id""", (high,))
+        # Made by the system, not by the submitter (user_id NULL), as on the web form.
+        con.execute("""INSERT INTO activity_log (ticket_id, user_id, action, detail)
+                       SELECT id, NULL, 'assigned', ? || assigned_to
+                       FROM tickets WHERE id > ? AND assigned_to IS NOT NULL ORDER BY id""", (ASSIGNED_DETAIL.format(''), high))
+        new = con.execute("SELECT id, user_id, title, description FROM tickets WHERE id > ? ORDER BY id", (high,)).fetchall()
+        con.commit()
+    except BaseException:
+        con.rollback()
+        # The batch is gone, so its agents never got those tickets.
+        for row in rows:
+            if row[5]:
+                assigner.change((row[5], 'open', row[4]), (None, 'open', row[4]))
+        raise
+    if imported:
+        imported(new)
+    return len(rows)
+
+
+class FileCheckpoint:
+    """Byte offset stored next to the input file, replaced atomically on every write."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def __call__(self, offset):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(str(offset))
+        os.replace(tmp, self.path)
+
+
+class DeadLetterFile:
+    """Appends rejected lines as JSON objects: {"offset", "error", "line"}."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __call__(self, offset, reason, line):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps({'offset': offset, 'error': reason, 'line': line}) + '\n')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
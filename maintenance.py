@@ -0,0 +1,241 @@
+"""
+Online maintenance of the SQLite database: backups, planner statistics,
+space reclamation, integrity checks and WAL checkpoints.
+
+Each task runs on its own connection and in small steps, so requests keep
+reading and writing while it works:
+
+  backup      copies the database with the backup API, `step_pages` pages
+              at a time with a pause in between. A write by another
+              connection restarts a stepped copy; after a few restarts it is
+              copied in one step instead, which only holds a read snapshot
+              and under WAL does not block writers.
+  optimize    ANALYZE with analysis_limit, so it reads a sample of each
+              index instead of all of it, then PRAGMA optimize.
+  vacuum      with auto_vacuum=INCREMENTAL, returns free pages to the file
+              system a few hundred per write transaction.
+  check       PRAGMA quick_check.
+  checkpoint  a PASSIVE checkpoint, which never waits for anyone. A WAL
+              grown past a limit is truncated with a short busy timeout,
+              giving up rather than holding up writers.
+
+auto_vacuum only takes effect on a new database or after a full VACUUM;
+enable_incremental_vacuum() does that VACUUM, which locks the database
+for its duration.
+
+Scheduler runs the tasks from a background thread. Every worker process
+may run one; the maintenance_runs table makes sure each task runs once per
+interval across all of them.
+"""
+import logging, os, sqlite3, threading, time
+from datetime import datetime, timezone
+
+log = logging.getLogger(__name__)
+
+TASKS = ('check', 'optimize', 'vacuum', 'checkpoint', 'backup')
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+MAX_BACKUP_RESTARTS = 3
+
+
+def _pragma(con, name):
+    return con.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def stats(con, path):
+    """Page counts, auto_vacuum mode and file sizes of the database at path, open on con."""
+    page_size = _pragma(con, 'page_size')
+    return {
+        'page_size': page_size,
+        'page_count': _pragma(con, 'page_count'),
+        'freelist_count': _pragma(con, 'freelist_count'),
+        'free_bytes': _pragma(con, 'freelist_count') * page_size,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(_pragma(con, 'auto_vacuum'), 'unknown'),
+        'db_bytes': file_size(path),
+        'wal_bytes': file_size(path + '-wal'),
+    }
+
+
+def quick_check(con, max_errors=10):
+    """Problems PRAGMA quick_check finds, or [] when the database is fine."""
+    problems = [row[0] for row in con.execute(f"PRAGMA quick_check({int(max_errors)})")]
+    return [] if problems == ['ok'] else problems
+
+
+def optimize(con, analysis_limit=1000):
+    """Refresh the planner's statistics (sqlite_stat1) from a sample of each index."""
+    con.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+    con.execute("ANALYZE")
+    con.execute("PRAGMA optimize")
+    con.commit()
+
+
+def incremental_vacuum(con, max_pages=10000, step=500, pause=0.02):
+    """Return up to max_pages free pages to the file system, step pages per transaction.
+
+    Does nothing unless auto_vacuum is INCREMENTAL. Returns the number of pages freed.
+    """
+    if _pragma(con, 'auto_vacuum') != 2:
+        return 0
+    freed = 0
+    while freed < max_pages:
+        before = _pragma(con, 'freelist_count')
+        if not before:
+            break
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            # Python steps a PRAGMA once, and each step frees one page.
+            for _ in range(min(step, before, max_pages - freed)):
+                con.execute("PRAGMA incremental_vacuum(1)")
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        done = before - _pragma(con, 'freelist_count')
+        if done <= 0:
+            break
+        freed += done
+        time.sleep(pause)
+    return freed
+
+
+def enable_incremental_vacuum(con):
+    """Switch an existing database to auto_vacuum=INCREMENTAL. Runs a full VACUUM, which locks the database."""
+    if _pragma(con, 'auto_vacuum') == 2:
+        return False
+    con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    con.execute("VACUUM")
+    return True
+
+
+def checkpoint(con, path, truncate_bytes=64 * 1024 * 1024, busy_ms=100):
+    """Copy the WAL back into the database. Returns (busy, wal pages, pages checkpointed) of the last attempt.
+
+    PASSIVE never blocks. If the WAL file is still larger than truncate_bytes,
+    a TRUNCATE checkpoint resets it, waiting at most busy_ms for readers and writers.
+    """
+    result = con.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+    if truncate_bytes and file_size(path + '-wal') > truncate_bytes:
+        timeout = _pragma(con, 'busy_timeout')
+        con.execute(f"PRAGMA busy_timeout = {int(busy_ms)}")
+        try:
+            result = con.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        finally:
+            con.execute(f"PRAGMA busy_timeout = {int(timeout)}")
+    return tuple(result)
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _copy(con, target, schema, step_pages, pause):
+    restarts, last = 0, None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last
+        # A restarted step starts over from the first page, so it makes no progress.
+        if last is not None and remaining >= last:
+            restarts += 1
+            if restarts > MAX_BACKUP_RESTARTS:
+                raise _Restarted()
+        last = remaining
+        # Called between steps, when the source is not locked.
+        time.sleep(pause)
+
+    try:
+        con.backup(target, pages=step_pages, progress=progress, name=schema)
+    except _Restarted:
+        log.info('Backup of %s kept restarting under writes; copying it in one step', schema)
+        con.backup(target, pages=-1, name=schema)
+
+
+def backup(con, folder, stem, keep=7, step_pages=1000, pause=0.02, schema='main'):
+    """Copy database `schema` of con to folder/<stem>-<UTC timestamp>.db and keep the newest `keep` copies.
+
+    The copy is written to a .tmp file and renamed into place when complete.
+    Returns the path of the new backup.
+    """
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{stem}-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.db")
+    tmp = path + '.tmp'
+    target = sqlite3.connect(tmp)
+    try:
+        _copy(con, target, schema, step_pages, pause)
+        target.close()
+        os.replace(tmp, path)
+    except BaseException:
+        target.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    old = sorted(f for f in os.listdir(folder) if f.startswith(stem + '-') and f.endswith('.db'))
+    for name in old[:-keep] if keep else ():
+        os.remove(os.path.join(folder, name))
+    return path
+
+
+class Scheduler:
+    def __init__(self, connect, run, intervals, tick=60):
+        """Run run(con, task) for each task in intervals ({task: seconds}, 0 disables) when it is due.
+
+        connect() opens the connection the thread works on.
+        """
+        self._connect = connect
+        self._run = run
+        self.intervals = {task: seconds for task, seconds in intervals.items() if seconds > 0}
+        self.tick = tick
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ensure_started(self):
+        if self._thread is not None or not self.intervals:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='db-maintenance', daemon=True)
+                self._thread.start()
+
+    def run_due(self, con):
+        for task in TASKS:
+            if task in self.intervals and claim(con, task, self.intervals[task]):
+                try:
+                    result = self._run(con, task)
+                except Exception as e:
+                    log.exception('Maintenance task %s failed', task)
+                    result = f'failed: {e}'
+                record(con, task, result)
+
+    def _loop(self):
+        con = None
+        while True:
+            try:
+                con = con or self._connect()
+                self.run_due(con)
+            except Exception:
+                # e.g. the database was locked for longer than the busy timeout; try again next tick.
+                log.exception('Database maintenance failed')
+            time.sleep(self.tick)
+
+
+def claim(con, task, interval):
+    """Mark task as started if it has not started in the last `interval` seconds. True if this caller got it."""
+    with con:
+        cur = con.execute("""INSERT INTO maintenance_runs (task, started_at) VALUES (?, unixepoch())
+                             ON CONFLICT (task) DO UPDATE SET started_at = excluded.started_at
+                             WHERE started_at <= unixepoch() - ?""", (task, int(interval)))
+    return cur.rowcount == 1
+
+
+def record(con, task, result):
+    """Store the outcome of a task run."""
+    with con:
+        con.execute("""INSERT INTO maintenance_runs (task, started_at, finished_at, result) VALUES (?, unixepoch(), unixepoch(), ?)
+                       ON CONFLICT (task) DO UPDATE SET finished_at = excluded.finished_at, result = excluded.result""",
+                    (task, result))
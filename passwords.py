@@ -0,0 +1,74 @@
+"""
+Password hashing off the request threads, with a cap on concurrent work.
+
+Hashes are computed by a small thread pool: werkzeug's KDFs (hashlib
+scrypt/pbkdf2) release the GIL, so the pool bounds how many CPUs a login
+burst can occupy while other requests keep running. At most max_workers
+hashes run at once and max_queue more may wait; beyond that Overloaded is
+raised immediately so the caller can shed the request.
+
+The method string is werkzeug's (e.g. 'scrypt:32768:8:1' or
+'pbkdf2:sha256:600000'). A stored hash produced with different parameters
+is reported by needs_rehash() so it can be upgraded at the next login.
+"""
+import os, threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class Overloaded(Exception):
+    """Too many hashes are already running or waiting."""
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', max_workers=2, max_queue=16, salt_length=16):
+        self.method = method
+        self.salt_length = salt_length
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        # Normalised parameter prefix, e.g. 'scrypt' -> 'scrypt:32768:8:1'.
+        self.params = generate_password_hash('', method, salt_length).split('$', 1)[0]
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.in_flight = 0
+        self.rejected = 0
+
+    def _pool(self):
+        # A pool started before a fork has no threads in the child.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='passwords')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def check(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when pwhash was made with other parameters than the configured ones."""
+        return pwhash.split('$', 1)[0] != self.params
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,78 @@
+"""
+In-process publish/subscribe broker behind the /events Server-Sent Events stream.
+
+Each worker process has its own broker. Events get a per-process
+increasing id and the most recent ones are kept so a reconnecting client
+(Last-Event-ID) can be replayed what it missed. Subscriptions are capped
+per process because every open stream holds a worker thread.
+"""
+import collections, json, queue, threading
+
+
+class Subscription:
+    def __init__(self, channels, maxsize):
+        self.channels = frozenset(channels)
+        self._queue = queue.Queue(maxsize)
+
+    def get(self, timeout):
+        """Return the next (id, event, data) or None if nothing arrived within timeout."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _offer(self, item):
+        # A client that stops reading must not block publishers; it will catch
+        # up from history when it reconnects.
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            pass
+
+
+class Broker:
+    def __init__(self, max_streams=200, history=500, queue_size=100):
+        self.max_streams = max_streams
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subs = set()
+        self._history = collections.deque(maxlen=history)
+        self._last_id = 0
+
+    def publish(self, channel, event, data):
+        payload = json.dumps(data)
+        with self._lock:
+            self._last_id += 1
+            item = (self._last_id, event, payload)
+            self._history.append((channel, item))
+            targets = [s for s in self._subs if channel in s.channels]
+        for sub in targets:
+            sub._offer(item)
+
+    def subscribe(self, channels, last_event_id=None):
+        """Register a subscription, or return None when the stream cap is reached.
+
+        Events after last_event_id that are still in history are queued first.
+        """
+        sub = Subscription(channels, self.queue_size)
+        with self._lock:
+            if len(self._subs) >= self.max_streams:
+                return None
+            if last_event_id is not None:
+                for channel, item in self._history:
+                    if item[0] > last_event_id and channel in sub.channels:
+                        sub._offer(item)
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+
+    @property
+    def stream_count(self):
+        return len(self._subs)
+
+
+def format_sse(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
@@ -0,0 +1,206 @@
+"""
+Queries over the daily rollup tables behind /reports, and their rebuild.
+
+The tables and the triggers that keep them current are in schema.sql. Every
+function here reads rollup rows for a date range, so the cost of a report
+grows with the number of days shown, not with the number of tickets.
+Percentiles come from the latency histograms: the bucket holding the wanted
+rank is found and the value is interpolated linearly inside it.
+"""
+from datetime import date, datetime, timedelta, timezone
+
+# Latency histogram bucket for a duration in seconds named secs.
+_BUCKET = ("(SELECT coalesce(min(bucket), (SELECT max(bucket) FROM latency_buckets))"
+           " FROM latency_buckets WHERE upper_seconds >= secs)")
+
+# activity_log details of status changes and assignments. The triggers key on
+# the ticket columns, but the rebuild can only find past changes here.
+STATUS_DETAIL = 'Status changed to {}'
+ASSIGNED_DETAIL = 'Assigned to user #{}'
+
+# Same definitions as the rollup triggers, applied to the whole history.
+# {tickets}, {comments} and {activity_log} are the source tables (see rebuild());
+# closes are credited to the ticket's current assignee.
+REBUILD = [
+    "DELETE FROM rollup_daily",
+    "DELETE FROM rollup_latency",
+    "DELETE FROM rollup_agent_daily",
+    """INSERT INTO rollup_daily (day, category, opened)
+       SELECT date(created_at, 'unixepoch'), coalesce(category, ''), COUNT(*) FROM {tickets} GROUP BY 1, 2""",
+    """CREATE TEMP TABLE rollup_closes AS
+       SELECT day, user_id, category, secs FROM (
+         SELECT date(a.created_at, 'unixepoch') AS day, t.assigned_to AS user_id, a.detail, coalesce(t.category, '') AS category,
+                max(0, a.created_at - t.created_at) AS secs,
+                lag(a.detail) OVER (PARTITION BY a.ticket_id ORDER BY a.id) AS previous
+         FROM {activity_log} a JOIN {tickets} t ON t.id = a.ticket_id
+         WHERE a.action = 'status_change')
+       WHERE detail = {closed} AND previous IS NOT {closed}""",
+    """INSERT INTO rollup_daily (day, category, closed)
+       SELECT day, category, COUNT(*) FROM rollup_closes GROUP BY 1, 2
+       ON CONFLICT (day, category) DO UPDATE SET closed = excluded.closed""",
+    """INSERT INTO rollup_latency (day, category, metric, bucket, count, total_seconds)
+       SELECT day, category, 'close', {bucket} AS b, COUNT(*), SUM(secs) FROM rollup_closes GROUP BY 1, 2, 4""",
+    """INSERT INTO rollup_agent_daily (day, user_id, closed)
+       SELECT day, user_id, COUNT(*) FROM rollup_closes WHERE user_id IS NOT NULL GROUP BY 1, 2""",
+    "DROP TABLE rollup_closes",
+    """INSERT INTO rollup_latency (day, category, metric, bucket, count, total_seconds)
+       SELECT day, category, 'first_response', {bucket} AS b, COUNT(*), SUM(secs) FROM (
+         SELECT date(c.created_at, 'unixepoch') AS day, coalesce(t.category, '') AS category,
+                max(0, c.created_at - t.created_at) AS secs
+         FROM {tickets} t
+         JOIN {comments} c ON c.id = (SELECT min(c2.id) FROM {comments} c2 WHERE c2.ticket_id = t.id AND c2.user_id != t.user_id))
+       GROUP BY 1, 2, 4""",
+    """INSERT INTO rollup_agent_daily (day, user_id, responses)
+       SELECT date(c.created_at, 'unixepoch'), c.user_id, COUNT(*) FROM {comments} c JOIN {tickets} t ON t.id = c.ticket_id
+       WHERE c.user_id != t.user_id GROUP BY 1, 2
+       ON CONFLICT (day, user_id) DO UPDATE SET responses = excluded.responses""",
+    """INSERT INTO rollup_agent_daily (day, user_id, assigned)
+       SELECT day, user_id, COUNT(*) FROM (
+         SELECT a.day, u.id AS user_id, lag(u.id) OVER (PARTITION BY a.ticket_id ORDER BY a.id) AS previous FROM (
+           SELECT id, ticket_id, date(created_at, 'unixepoch') AS day, detail FROM {activity_log} WHERE action = 'assigned') a
+         JOIN users u ON (substr(a.detail, 1, length({assigned})) = {assigned}
+                          AND u.id = CAST(substr(a.detail, length({assigned}) + 1) AS INTEGER))
+                      OR (instr(a.detail, '#') = 0 AND u.username = substr(a.detail, 13)))  -- older rows name the user
+       WHERE user_id IS NOT previous
+       GROUP BY 1, 2
+       ON CONFLICT (day, user_id) DO UPDATE SET assigned = excluded.assigned""",
+]
+
+# Columns the rebuild reads, for combining main and archive tables.
+_SOURCE_COLUMNS = {
+    'tickets': 'id, user_id, assigned_to, category, created_at',
+    'comments': 'id, ticket_id, user_id, created_at',
+    'activity_log': 'id, ticket_id, user_id, action, detail, created_at',
+}
+
+
+def rebuild(con, archived=False):
+    """Recompute every rollup row from the base tables. Run inside a transaction.
+
+    With archived, the archive database must be attached and its tickets
+    are counted too.
+    """
+    sources = {table: table for table in _SOURCE_COLUMNS}
+    if archived:
+        sources = {table: f"(SELECT {cols} FROM main.{table} UNION ALL SELECT {cols} FROM archive.{table})"
+                   for table, cols in _SOURCE_COLUMNS.items()}
+    details = {'closed': _literal(STATUS_DETAIL.format('closed')), 'assigned': _literal(ASSIGNED_DETAIL.format(''))}
+    for sql in REBUILD:
+        con.execute(sql.format(bucket=_BUCKET, **details, **sources))
+
+
+def _literal(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+def periods(start, end, by='day'):
+    """ISO dates of every period from start to end; weeks are keyed by their Monday."""
+    if by == 'week':
+        start -= timedelta(days=start.weekday())
+    step = timedelta(days=7 if by == 'week' else 1)
+    out = []
+    while start <= end:
+        out.append(start.isoformat())
+        start += step
+    return out
+
+
+def _period(by):
+    # date(day, 'weekday 0', '-6 days') is the Monday on or before day.
+    return "date(day, 'weekday 0', '-6 days')" if by == 'week' else 'day'
+
+
+def _range(start, end, category):
+    where, params = "day BETWEEN ? AND ?", [start.isoformat(), end.isoformat()]
+    if category is not None:
+        where += " AND category = ?"
+        params.append(category)
+    return where, params
+
+
+def trend(con, start, end, by='day', category=None):
+    """[(period, opened, closed)] for every day or week from start to end, zero-filled."""
+    where, params = _range(start, end, category)
+    rows = con.execute(f"SELECT {_period(by)} AS period, SUM(opened), SUM(closed) FROM rollup_daily"
+                       f" WHERE {where} GROUP BY period", params).fetchall()
+    found = {r[0]: (r[1], r[2]) for r in rows}
+    return [(p,) + found.get(p, (0, 0)) for p in periods(start, end, by)]
+
+
+def by_category(con, start, end):
+    """[(category, opened, closed)] over the range, busiest first."""
+    where, params = _range(start, end, None)
+    return con.execute(f"SELECT category, SUM(opened) AS opened, SUM(closed) AS closed FROM rollup_daily"
+                       f" WHERE {where} GROUP BY category HAVING opened OR closed ORDER BY opened DESC", params).fetchall()
+
+
+def _stats(histogram, bounds, percentiles):
+    """count, mean and percentiles (seconds) of {bucket: [count, total_seconds]}."""
+    count = sum(c for c, _ in histogram.values())
+    if not count:
+        return None
+    stats = {'count': count, 'mean': sum(s for _, s in histogram.values()) / count}
+    for p in percentiles:
+        rank, seen = count * p / 100, 0
+        for bucket in sorted(histogram):
+            n = histogram[bucket][0]
+            if seen + n >= rank:
+                lower = bounds[bucket - 1] if bucket else 0
+                stats[f'p{p}'] = lower + (bounds[bucket] - lower) * (rank - seen) / n
+                break
+            seen += n
+    return stats
+
+
+def latency(con, start, end, percentiles=(50, 90)):
+    """{metric: {category: stats}} for first_response and close, plus category None for all.
+
+    stats is {'count', 'mean', 'p50', 'p90', ...} in seconds, or the metric
+    is missing when nothing happened in the range.
+    """
+    bounds = dict(con.execute("SELECT bucket, upper_seconds FROM latency_buckets").fetchall())
+    where, params = _range(start, end, None)
+    rows = con.execute(f"SELECT metric, category, bucket, SUM(count), SUM(total_seconds) FROM rollup_latency"
+                       f" WHERE {where} GROUP BY metric, category, bucket", params).fetchall()
+    histograms = {}
+    for metric, category, bucket, count, total in rows:
+        for key in (category, None):
+            h = histograms.setdefault(metric, {}).setdefault(key, {})
+            h.setdefault(bucket, [0, 0])
+            h[bucket][0] += count
+            h[bucket][1] += total
+    return {metric: {category: _stats(h, bounds, percentiles) for category, h in by_cat.items()}
+            for metric, by_cat in histograms.items()}
+
+
+def agent_workload(con, start, end):
+    """Agents' and admins' assignments, replies and closes over the range, plus tickets open now."""
+    where, params = _range(start, end, None)
+    rows = con.execute(f"""SELECT u.id, u.username, coalesce(SUM(r.assigned), 0) AS assigned,
+                                  coalesce(SUM(r.responses), 0) AS responses, coalesce(SUM(r.closed), 0) AS closed
+                           FROM users u LEFT JOIN rollup_agent_daily r ON r.user_id = u.id AND r.{where}
+                           WHERE u.role IN ('agent', 'admin')
+                           GROUP BY u.id ORDER BY closed DESC, responses DESC, u.username""", params).fetchall()
+    ids = [r['id'] for r in rows]
+    open_now = {}
+    if ids:
+        open_now = dict(con.execute(f"""SELECT assigned_to, COUNT(*) FROM tickets
+                                        WHERE assigned_to IN ({','.join('?' * len(ids))}) AND status IN ('open', 'in_progress')
+                                        GROUP BY assigned_to""", ids).fetchall())
+    return [dict(r, open=open_now.get(r['id'], 0)) for r in rows]
+
+
+def parse_range(args, default_days=30):
+    """(start, end) dates from ?from=&to= (YYYY-MM-DD), defaulting to the last default_days days (UTC)."""
+    end = _date(args.get('to')) or datetime.now(timezone.utc).date()
+    start = _date(args.get('from')) or end - timedelta(days=default_days - 1)
+    if start > end:
+        start, end = end, start
+    return start, end
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
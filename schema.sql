@@ -1,3 +1,7 @@
+-- Timestamps (created_at) are Unix time in seconds, UTC. Databases from
+-- before that stored CURRENT_TIMESTAMP text; init_db() converts them (see
+-- timestamps.py), and the *_text views below show the old form.
+
 -- Users
 CREATE TABLE IF NOT EXISTS users (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -5,7 +9,7 @@ CREATE TABLE IF NOT EXISTS users (
   email TEXT,
   password_hash TEXT NOT NULL,
   role TEXT NOT NULL DEFAULT 'student', -- student | agent | admin
-  created_at TEXT DEFAULT CURRENT_TIMESTAMP
+  created_at INTEGER DEFAULT (unixepoch())
 );
 
 -- Tickets
@@ -18,7 +22,7 @@ CREATE TABLE IF NOT EXISTS tickets (
   status TEXT NOT NULL DEFAULT 'open', -- open | in_progress | closed
   priority TEXT NOT NULL DEFAULT 'Medium', -- Low | Medium | High
   assigned_to INTEGER,
-  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  created_at INTEGER DEFAULT (unixepoch()),
   FOREIGN KEY(user_id) REFERENCES users(id),
   FOREIGN KEY(assigned_to) REFERENCES users(id)
 );
@@ -29,7 +33,7 @@ CREATE TABLE IF NOT EXISTS comments (
   ticket_id INTEGER NOT NULL,
   user_id INTEGER NOT NULL,
   content TEXT NOT NULL,
-  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  created_at INTEGER DEFAULT (unixepoch()),
   FOREIGN KEY(ticket_id) REFERENCES tickets(id),
   FOREIGN KEY(user_id) REFERENCES users(id)
 );
@@ -40,16 +44,28 @@ CREATE TABLE IF NOT EXISTS kb_articles (
   title TEXT NOT NULL,
   content TEXT,
   category TEXT,
-  created_at TEXT DEFAULT CURRENT_TIMESTAMP
+  created_at INTEGER DEFAULT (unixepoch())
 );
 
--- Attachments
+-- Attachment contents, stored once per distinct SHA-256 (see blobstore.py).
+-- refcount is the number of attachments rows pointing at the blob.
+CREATE TABLE IF NOT EXISTS blobs (
+  sha256 TEXT PRIMARY KEY,
+  size INTEGER NOT NULL,
+  refcount INTEGER NOT NULL DEFAULT 0,
+  created_at INTEGER DEFAULT (unixepoch())
+) WITHOUT ROWID;
+
+-- Attachments. stored_filename is the name used in download URLs; the bytes
+-- live in the blob named by sha256 (NULL only for files not yet migrated by
+-- `flask migrate-attachments`).
 CREATE TABLE IF NOT EXISTS attachments (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   ticket_id INTEGER NOT NULL,
   original_filename TEXT NOT NULL,
   stored_filename TEXT NOT NULL UNIQUE,
-  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  sha256 TEXT REFERENCES blobs(sha256),
+  created_at INTEGER DEFAULT (unixepoch()),
   FOREIGN KEY(ticket_id) REFERENCES tickets(id)
 );
 
@@ -60,7 +76,7 @@ CREATE TABLE IF NOT EXISTS notifications (
   ticket_id INTEGER NOT NULL,
   message TEXT NOT NULL,
   is_read INTEGER NOT NULL DEFAULT 0,
-  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  created_at INTEGER DEFAULT (unixepoch()),
   FOREIGN KEY(user_id) REFERENCES users(id),
   FOREIGN KEY(ticket_id) REFERENCES tickets(id)
 );
@@ -69,17 +85,428 @@ CREATE TABLE IF NOT EXISTS notifications (
 CREATE TABLE IF NOT EXISTS activity_log (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   ticket_id INTEGER NOT NULL,
-  user_id INTEGER NOT NULL,
+  user_id INTEGER, -- NULL for the system (auto-assignment)
   action TEXT NOT NULL,
   detail TEXT,
-  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  created_at INTEGER DEFAULT (unixepoch()),
   FOREIGN KEY(ticket_id) REFERENCES tickets(id),
   FOREIGN KEY(user_id) REFERENCES users(id)
 );
 
+-- Categories an agent takes in auto-assignment (see assignment.py).
+-- An agent without rows takes every category.
+CREATE TABLE IF NOT EXISTS agent_skills (
+  user_id INTEGER NOT NULL REFERENCES users(id),
+  category TEXT NOT NULL,
+  PRIMARY KEY (user_id, category)
+) WITHOUT ROWID;
+
+-- Tokens for the read-only /api/v1 (`flask create-api-token`). A token acts
+-- as its user; only its SHA-256 is stored.
+CREATE TABLE IF NOT EXISTS api_tokens (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL REFERENCES users(id),
+  name TEXT NOT NULL,
+  token_sha256 TEXT NOT NULL UNIQUE,
+  created_at INTEGER DEFAULT (unixepoch())
+);
+
+-- Last run of each database maintenance task (see maintenance.py), in Unix
+-- time. Worker processes claim a due task by moving started_at forward.
+CREATE TABLE IF NOT EXISTS maintenance_runs (
+  task TEXT PRIMARY KEY,
+  started_at INTEGER NOT NULL,
+  finished_at INTEGER,
+  result TEXT
+);
+
 -- Indexes
-CREATE INDEX IF NOT EXISTS idx_tickets_user ON tickets(user_id);
-CREATE INDEX IF NOT EXISTS idx_comments_ticket ON comments(ticket_id);
-CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status);
+-- Ticket indexes mirror the dashboard's filter shapes; the trailing id keeps
+-- each one ordered for keyset pagination (ORDER BY id DESC with id < ?).
+CREATE INDEX IF NOT EXISTS idx_tickets_user_id ON tickets(user_id, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_status_id ON tickets(status, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_category_id ON tickets(category, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_assignee_status_id ON tickets(assigned_to, status, id);
+DROP INDEX IF EXISTS idx_tickets_user;    -- superseded by idx_tickets_user_id
+DROP INDEX IF EXISTS idx_tickets_status;  -- superseded by idx_tickets_status_id
+-- The from/to date filters; comments are read per ticket in time order.
+CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets(created_at);
+CREATE INDEX IF NOT EXISTS idx_comments_ticket_created ON comments(ticket_id, created_at);
+DROP INDEX IF EXISTS idx_comments_ticket;  -- superseded by idx_comments_ticket_created
 CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id);
+CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(user_id, ticket_id) WHERE is_read = 0;
+CREATE INDEX IF NOT EXISTS idx_notifications_ticket ON notifications(ticket_id);
 CREATE INDEX IF NOT EXISTS idx_activity_ticket ON activity_log(ticket_id);
+CREATE INDEX IF NOT EXISTS idx_attachments_ticket ON attachments(ticket_id);
+CREATE INDEX IF NOT EXISTS idx_attachments_sha256 ON attachments(sha256);
+
+-- created_at as 'YYYY-MM-DD HH:MM:SS' text, for reports and scripts written
+-- against the old columns.
+CREATE VIEW IF NOT EXISTS users_text AS
+  SELECT id, username, email, password_hash, role, datetime(created_at, 'unixepoch') AS created_at FROM users;
+CREATE VIEW IF NOT EXISTS tickets_text AS
+  SELECT id, user_id, title, description, category, status, priority, assigned_to,
+         datetime(created_at, 'unixepoch') AS created_at FROM tickets;
+CREATE VIEW IF NOT EXISTS comments_text AS
+  SELECT id, ticket_id, user_id, content, datetime(created_at, 'unixepoch') AS created_at FROM comments;
+CREATE VIEW IF NOT EXISTS kb_articles_text AS
+  SELECT id, title, content, category, datetime(created_at, 'unixepoch') AS created_at FROM kb_articles;
+CREATE VIEW IF NOT EXISTS attachments_text AS
+  SELECT id, ticket_id, original_filename, stored_filename, sha256, datetime(created_at, 'unixepoch') AS created_at FROM attachments;
+CREATE VIEW IF NOT EXISTS notifications_text AS
+  SELECT id, user_id, ticket_id, message, is_read, datetime(created_at, 'unixepoch') AS created_at FROM notifications;
+CREATE VIEW IF NOT EXISTS activity_log_text AS
+  SELECT id, ticket_id, user_id, action, detail, datetime(created_at, 'unixepoch') AS created_at FROM activity_log;
+
+CREATE TRIGGER IF NOT EXISTS blobs_ref_ai AFTER INSERT ON attachments
+WHEN new.sha256 IS NOT NULL BEGIN
+  UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = new.sha256;
+END;
+
+CREATE TRIGGER IF NOT EXISTS blobs_ref_ad AFTER DELETE ON attachments
+WHEN old.sha256 IS NOT NULL BEGIN
+  UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = old.sha256;
+END;
+
+CREATE TRIGGER IF NOT EXISTS blobs_ref_au AFTER UPDATE OF sha256 ON attachments
+WHEN old.sha256 IS NOT new.sha256 BEGIN
+  UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = old.sha256;
+  UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = new.sha256;
+END;
+
+-- Knowledge-base full-text index. External-content FTS5 table over
+-- kb_articles, kept in sync by the triggers below.
+CREATE VIRTUAL TABLE IF NOT EXISTS kb_fts USING fts5(
+  title, content, category,
+  content='kb_articles', content_rowid='id',
+  tokenize='porter unicode61', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS kb_fts_ai AFTER INSERT ON kb_articles BEGIN
+  INSERT INTO kb_fts(rowid, title, content, category) VALUES (new.id, new.title, new.content, new.category);
+END;
+
+CREATE TRIGGER IF NOT EXISTS kb_fts_ad AFTER DELETE ON kb_articles BEGIN
+  INSERT INTO kb_fts(kb_fts, rowid, title, content, category) VALUES ('delete', old.id, old.title, old.content, old.category);
+END;
+
+CREATE TRIGGER IF NOT EXISTS kb_fts_au AFTER UPDATE ON kb_articles BEGIN
+  INSERT INTO kb_fts(kb_fts, rowid, title, content, category) VALUES ('delete', old.id, old.title, old.content, old.category);
+  INSERT INTO kb_fts(rowid, title, content, category) VALUES (new.id, new.title, new.content, new.category);
+END;
+
+-- Migration: databases created before kb_fts existed already have articles
+-- but an empty index, so rebuild it from kb_articles once.
+INSERT INTO kb_fts(kb_fts)
+  SELECT 'rebuild' WHERE NOT EXISTS (SELECT 1 FROM kb_fts_docsize) AND EXISTS (SELECT 1 FROM kb_articles);
+
+-- Ticket search index: title, description and all comment text per ticket,
+-- trigram-tokenized so any substring of 3+ characters can be matched.
+-- rowid is the ticket id.
+CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+  title, description, comments,
+  tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS tickets_fts_ai AFTER INSERT ON tickets BEGIN
+  INSERT INTO tickets_fts(rowid, title, description, comments) VALUES (new.id, new.title, new.description, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS tickets_fts_au AFTER UPDATE OF title, description ON tickets BEGIN
+  UPDATE tickets_fts SET title = new.title, description = new.description WHERE rowid = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tickets_fts_ad AFTER DELETE ON tickets BEGIN
+  DELETE FROM tickets_fts WHERE rowid = old.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tickets_fts_comment_ai AFTER INSERT ON comments BEGIN
+  UPDATE tickets_fts SET comments = comments || char(10) || new.content WHERE rowid = new.ticket_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tickets_fts_comment_au AFTER UPDATE OF content ON comments BEGIN
+  UPDATE tickets_fts SET comments = (SELECT group_concat(content, char(10)) FROM comments WHERE ticket_id = new.ticket_id)
+  WHERE rowid = new.ticket_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tickets_fts_comment_ad AFTER DELETE ON comments BEGIN
+  UPDATE tickets_fts SET comments = coalesce((SELECT group_concat(content, char(10)) FROM comments WHERE ticket_id = old.ticket_id), '')
+  WHERE rowid = old.ticket_id;
+END;
+
+-- Migration: index tickets that were created before tickets_fts existed.
+INSERT INTO tickets_fts(rowid, title, description, comments)
+  SELECT t.id, t.title, t.description,
+         coalesce((SELECT group_concat(c.content, char(10)) FROM comments c WHERE c.ticket_id = t.id), '')
+  FROM tickets t
+  WHERE NOT EXISTS (SELECT 1 FROM tickets_fts_docsize);
+
+-- Exact counts maintained by the triggers below, so stats and badges are
+-- primary-key lookups instead of COUNT(*)/GROUP BY scans. (scope, key):
+--   ('status', <status>)          tickets per status (summed for the total)
+--   ('category', <category>)      tickets per category ('' for NULL)
+--   ('users', 'total')            users
+--   ('kb_articles', 'total')      knowledge-base articles
+--   ('unread', <user_id>)         unread notifications per user
+-- Existing databases are backfilled by init_db(); `flask check-counters`
+-- reports and repairs drift.
+CREATE TABLE IF NOT EXISTS counters (
+  scope TEXT NOT NULL,
+  key TEXT NOT NULL,
+  value INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (scope, key)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS counters_tickets_ai AFTER INSERT ON tickets BEGIN
+  INSERT INTO counters (scope, key, value) VALUES ('status', new.status, 1)
+    ON CONFLICT (scope, key) DO UPDATE SET value = value + 1;
+  INSERT INTO counters (scope, key, value) VALUES ('category', coalesce(new.category, ''), 1)
+    ON CONFLICT (scope, key) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS counters_tickets_ad AFTER DELETE ON tickets BEGIN
+  UPDATE counters SET value = value - 1 WHERE scope = 'status' AND key = old.status;
+  UPDATE counters SET value = value - 1 WHERE scope = 'category' AND key = coalesce(old.category, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS counters_tickets_status AFTER UPDATE OF status ON tickets
+WHEN old.status IS NOT new.status BEGIN
+  UPDATE counters SET value = value - 1 WHERE scope = 'status' AND key = old.status;
+  INSERT INTO counters (scope, key, value) VALUES ('status', new.status, 1)
+    ON CONFLICT (scope, key) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS counters_tickets_category AFTER UPDATE OF category ON tickets
+WHEN old.category IS NOT new.category BEGIN
+  UPDATE counters SET value = value - 1 WHERE scope = 'category' AND key = coalesce(old.category, '');
+  INSERT INTO counters (scope, key, value) VALUES ('category', coalesce(new.category, ''), 1)
+    ON CONFLICT (scope, key) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS counters_users_ai AFTER INSERT ON users BEGIN
+  INSERT INTO counters (scope, key, value) VALUES ('users', 'total', 1)
+    ON CONFLICT (scope, key) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS counters_users_ad AFTER DELETE ON users BEGIN
+  UPDATE counters SET value = value - 1 WHERE scope = 'users' AND key = 'total';
+END;
+
+CREATE TRIGGER IF NOT EXISTS counters_kb_ai AFTER INSERT ON kb_articles BEGIN
+  INSERT INTO counters (scope, key, value) VALUES ('kb_articles', 'total', 1)
+    ON CONFLICT (scope, key) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS counters_kb_ad AFTER DELETE ON kb_articles BEGIN
+  UPDATE counters SET value = value - 1 WHERE scope = 'kb_articles' AND key = 'total';
+END;
+
+CREATE TRIGGER IF NOT EXISTS counters_notifications_ai AFTER INSERT ON notifications
+WHEN new.is_read = 0 BEGIN
+  INSERT INTO counters (scope, key, value) VALUES ('unread', new.user_id, 1)
+    ON CONFLICT (scope, key) DO UPDATE SET value = value + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS counters_notifications_ad AFTER DELETE ON notifications
+WHEN old.is_read = 0 BEGIN
+  UPDATE counters SET value = value - 1 WHERE scope = 'unread' AND key = CAST(old.user_id AS TEXT);
+END;
+
+CREATE TRIGGER IF NOT EXISTS counters_notifications_read AFTER UPDATE OF is_read ON notifications
+WHEN (old.is_read = 0) IS NOT (new.is_read = 0) BEGIN
+  INSERT INTO counters (scope, key, value) VALUES ('unread', new.user_id, CASE WHEN new.is_read = 0 THEN 1 ELSE 0 END)
+    ON CONFLICT (scope, key) DO UPDATE SET value = value + CASE WHEN new.is_read = 0 THEN 1 ELSE -1 END;
+END;
+
+-- Version stamps for cached pages (ETags and rendered fragments). A row is
+-- bumped by the triggers below whenever something shown on that page
+-- changes. (entity, id):
+--   ('ticket', <ticket id>)   the ticket, its comments, attachments or activity
+--   ('kb', <article id>)      one knowledge-base article
+--   ('kb_list', 0)            any knowledge-base article (the /kb list)
+-- updated_at is a Unix timestamp, used for Last-Modified.
+CREATE TABLE IF NOT EXISTS versions (
+  entity TEXT NOT NULL,
+  id INTEGER NOT NULL,
+  version INTEGER NOT NULL DEFAULT 1,
+  updated_at INTEGER NOT NULL,
+  PRIMARY KEY (entity, id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS versions_tickets_ai AFTER INSERT ON tickets BEGIN
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('ticket', new.id, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS versions_tickets_au AFTER UPDATE ON tickets BEGIN
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('ticket', new.id, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS versions_comments_ai AFTER INSERT ON comments BEGIN
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('ticket', new.ticket_id, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS versions_comments_au AFTER UPDATE ON comments BEGIN
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('ticket', new.ticket_id, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS versions_comments_ad AFTER DELETE ON comments BEGIN
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('ticket', old.ticket_id, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS versions_attachments_ai AFTER INSERT ON attachments BEGIN
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('ticket', new.ticket_id, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+-- activity_log rows arrive through the write-behind queue, after the change
+-- they describe, so the timeline is stamped again when they land.
+CREATE TRIGGER IF NOT EXISTS versions_activity_ai AFTER INSERT ON activity_log BEGIN
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('ticket', new.ticket_id, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS versions_kb_ai AFTER INSERT ON kb_articles BEGIN
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('kb', new.id, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('kb_list', 0, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS versions_kb_au AFTER UPDATE ON kb_articles BEGIN
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('kb', new.id, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('kb_list', 0, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS versions_kb_ad AFTER DELETE ON kb_articles BEGIN
+  DELETE FROM versions WHERE entity = 'kb' AND id = old.id;
+  INSERT INTO versions (entity, id, version, updated_at) VALUES ('kb_list', 0, 1, unixepoch())
+    ON CONFLICT (entity, id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+END;
+
+-- Migration: stamp rows that existed before the versions table.
+INSERT INTO versions (entity, id, version, updated_at)
+  SELECT entity, id, 1, unixepoch() FROM (
+    SELECT 'ticket' AS entity, id FROM tickets
+    UNION ALL SELECT 'kb', id FROM kb_articles
+    UNION ALL SELECT 'kb_list', 0
+  ) WHERE NOT EXISTS (SELECT 1 FROM versions);
+
+-- Daily rollups behind /reports, maintained incrementally by the triggers
+-- below so a date-range report reads a few hundred rows rather than the
+-- ticket history. Days are UTC dates ('YYYY-MM-DD'); category is '' for
+-- uncategorised tickets. Rows are never decremented when tickets are
+-- deleted: they record what happened on each day. `flask backfill-rollups`
+-- rebuilds them from tickets, comments and activity_log (see rollups.py).
+--   rollup_daily        tickets opened and closed per day and category
+--   rollup_latency      time to first response / to close, as histogram
+--                       buckets per day (of the response or close) and category
+--   rollup_agent_daily  assignments, replies and closes per day and user
+-- A close is a ticket's status changing to 'closed', credited to its
+-- assignee; an assignment is assigned_to being set to a different user; a
+-- first response is the first comment by anyone other than the submitter.
+CREATE TABLE IF NOT EXISTS rollup_daily (
+  day TEXT NOT NULL,
+  category TEXT NOT NULL,
+  opened INTEGER NOT NULL DEFAULT 0,
+  closed INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, category)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_latency (
+  day TEXT NOT NULL,
+  category TEXT NOT NULL,
+  metric TEXT NOT NULL, -- first_response | close
+  bucket INTEGER NOT NULL,
+  count INTEGER NOT NULL DEFAULT 0,
+  total_seconds INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, category, metric, bucket)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_agent_daily (
+  day TEXT NOT NULL,
+  user_id INTEGER NOT NULL,
+  assigned INTEGER NOT NULL DEFAULT 0,
+  responses INTEGER NOT NULL DEFAULT 0,
+  closed INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, user_id)
+) WITHOUT ROWID;
+
+-- Latency histogram bounds: bucket n holds durations up to upper_seconds,
+-- growing by 25% per bucket from one minute to about a year.
+CREATE TABLE IF NOT EXISTS latency_buckets (
+  bucket INTEGER PRIMARY KEY,
+  upper_seconds INTEGER NOT NULL
+);
+
+INSERT INTO latency_buckets (bucket, upper_seconds)
+  WITH RECURSIVE b(bucket, upper_seconds) AS (
+    SELECT 0, 60
+    UNION ALL SELECT bucket + 1, CAST(round(upper_seconds * 1.25) AS INTEGER) FROM b WHERE bucket < 59
+  )
+  SELECT bucket, upper_seconds FROM b WHERE NOT EXISTS (SELECT 1 FROM latency_buckets);
+
+CREATE TRIGGER IF NOT EXISTS rollup_tickets_ai AFTER INSERT ON tickets BEGIN
+  INSERT INTO rollup_daily (day, category, opened) VALUES (date(new.created_at, 'unixepoch'), coalesce(new.category, ''), 1)
+    ON CONFLICT (day, category) DO UPDATE SET opened = opened + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS rollup_tickets_category AFTER UPDATE OF category ON tickets
+WHEN old.category IS NOT new.category BEGIN
+  UPDATE rollup_daily SET opened = opened - 1 WHERE day = date(new.created_at, 'unixepoch') AND category = coalesce(old.category, '');
+  INSERT INTO rollup_daily (day, category, opened) VALUES (date(new.created_at, 'unixepoch'), coalesce(new.category, ''), 1)
+    ON CONFLICT (day, category) DO UPDATE SET opened = opened + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS rollup_comments_ai AFTER INSERT ON comments
+WHEN new.user_id IS NOT (SELECT user_id FROM tickets WHERE id = new.ticket_id) BEGIN
+  INSERT INTO rollup_agent_daily (day, user_id, responses) VALUES (date(new.created_at, 'unixepoch'), new.user_id, 1)
+    ON CONFLICT (day, user_id) DO UPDATE SET responses = responses + 1;
+  INSERT INTO rollup_latency (day, category, metric, bucket, count, total_seconds)
+    SELECT date(new.created_at, 'unixepoch'), category, 'first_response',
+           (SELECT coalesce(min(bucket), (SELECT max(bucket) FROM latency_buckets)) FROM latency_buckets WHERE upper_seconds >= secs),
+           1, secs
+    FROM (SELECT coalesce(t.category, '') AS category, max(0, new.created_at - t.created_at) AS secs
+          FROM tickets t WHERE t.id = new.ticket_id
+            AND NOT EXISTS (SELECT 1 FROM comments c WHERE c.ticket_id = new.ticket_id AND c.id < new.id AND c.user_id != t.user_id))
+    WHERE true
+    ON CONFLICT (day, category, metric, bucket) DO UPDATE SET count = count + 1, total_seconds = total_seconds + excluded.total_seconds;
+END;
+
+-- Closes and assignments were once counted from activity_log details; they
+-- are now keyed on the ticket columns themselves.
+DROP TRIGGER IF EXISTS rollup_activity_closed;
+DROP TRIGGER IF EXISTS rollup_activity_assigned;
+
+CREATE TRIGGER IF NOT EXISTS rollup_tickets_closed AFTER UPDATE OF status ON tickets
+WHEN new.status = 'closed' AND old.status IS NOT 'closed' BEGIN
+  INSERT INTO rollup_daily (day, category, closed) VALUES (date('now'), coalesce(new.category, ''), 1)
+    ON CONFLICT (day, category) DO UPDATE SET closed = closed + 1;
+  INSERT INTO rollup_latency (day, category, metric, bucket, count, total_seconds)
+    SELECT date('now'), coalesce(new.category, ''), 'close',
+           (SELECT coalesce(min(bucket), (SELECT max(bucket) FROM latency_buckets)) FROM latency_buckets WHERE upper_seconds >= secs),
+           1, secs
+    FROM (SELECT max(0, unixepoch() - new.created_at) AS secs)
+    WHERE true
+    ON CONFLICT (day, category, metric, bucket) DO UPDATE SET count = count + 1, total_seconds = total_seconds + excluded.total_seconds;
+  INSERT INTO rollup_agent_daily (day, user_id, closed) SELECT date('now'), new.assigned_to, 1 WHERE new.assigned_to IS NOT NULL
+    ON CONFLICT (day, user_id) DO UPDATE SET closed = closed + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS rollup_tickets_assigned_ai AFTER INSERT ON tickets
+WHEN new.assigned_to IS NOT NULL BEGIN
+  INSERT INTO rollup_agent_daily (day, user_id, assigned) VALUES (date(new.created_at, 'unixepoch'), new.assigned_to, 1)
+    ON CONFLICT (day, user_id) DO UPDATE SET assigned = assigned + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS rollup_tickets_assigned AFTER UPDATE OF assigned_to ON tickets
+WHEN new.assigned_to IS NOT NULL AND new.assigned_to IS NOT old.assigned_to BEGIN
+  INSERT INTO rollup_agent_daily (day, user_id, assigned) VALUES (date('now'), new.assigned_to, 1)
+    ON CONFLICT (day, user_id) DO UPDATE SET assigned = assigned + 1;
+END;
@@ -1,22 +1,34 @@
 """
-Seed the database with demo data for presentation.
+Seed the database with demo data for presentation, optionally followed by
+a synthetic data set at production scale for benchmarking (see bench.py).
+
 Run: python seed_data.py
+     python seed_data.py --users 5000 --tickets 100000   (demo data + synthetic load)
+
+The database path is DATABASE_URL (see config.py).
 """
-import sqlite3, os
+import sqlite3, os, random, argparse, time
+from datetime import datetime, timedelta, timezone
 from werkzeug.security import generate_password_hash
+from config import Config
+import rollups
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'campus_helpdesk.db')
+DB_PATH = Config.DATABASE_URL
 
-def seed():
+def seed(db_path=DB_PATH, **scale):
+    """Recreate the database with the demo data, then generate(**scale) when given."""
     # Delete old DB if exists for clean re-seed
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
-        print("Removed old database.")
+    for path in (db_path, db_path + '-wal', db_path + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+            if path == db_path:
+                print("Removed old database.")
 
-    con = sqlite3.connect(DB_PATH)
+    con = sqlite3.connect(db_path)
     cur = con.cursor()
+    cur.execute(f"PRAGMA auto_vacuum = {Config.SQLITE_AUTO_VACUUM}")
 
-    with open('schema.sql', 'r') as f:
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql'), 'r') as f:
         cur.executescript(f.read())
 
     # --- Users (with emails) ---
@@ -114,6 +126,11 @@ def seed():
     cur.executemany("INSERT INTO kb_articles (title, category, content) VALUES (?, ?, ?)", articles)
 
     con.commit()
+    if scale.get('tickets'):
+        generate(con, **scale)
+    with con:
+        # The rollup triggers count status and assignee changes, not rows inserted closed or assigned.
+        rollups.rebuild(con)
     con.close()
     print("Database seeded successfully!")
     print()
@@ -125,5 +142,173 @@ def seed():
     print("  Student: student_neha / student123")
     print("  Student: student_kabir / student123")
 
+# -------------------- Synthetic data --------------------
+# Vocabulary per category; titles and descriptions are built from these so
+# the classifier, search and category filters behave as on real tickets.
+SUBJECTS = {
+    'IT Support': ['Wi-Fi', 'internet', 'campus email', 'portal login', 'lab printer', 'network drive', 'password reset', 'VPN'],
+    'Academics': ['exam schedule', 'grade', 'course enrollment', 'attendance', 'mid-semester marks', 'result', 'elective course'],
+    'Accounts': ['fee payment', 'fee receipt', 'scholarship', 'refund', 'hostel fee', 'payment gateway'],
+    'Hostel': ['hostel room', 'mess food', 'water supply', 'electricity', 'room allocation', 'warden approval'],
+    'General': ['ID card', 'library card', 'parking permit', 'lost and found', 'general query'],
+}
+PROBLEMS = ['not working', 'issue', 'problem since yesterday', 'error on the portal', 'still pending',
+            'request', 'urgent help needed', 'keeps failing', 'incorrect', 'not updated']
+PLACES = ['Library Block B', 'Hostel A', 'Computer Lab 2', 'Main Building', 'Girls Hostel B',
+          'Science Block', 'Admin Office', 'Room 304', 'Cafeteria']
+SENTENCES = [
+    'I have been facing this for {n} days.', 'Other students in {place} have the same problem.',
+    'I need this resolved before my submission deadline.', 'I already tried again after restarting.',
+    'Please look into the {subject} as soon as possible.', 'My student ID is {sid}.',
+    'The {subject} was fine last week.', 'I contacted the office but was asked to raise a ticket.',
+]
+REPLIES = [
+    'We are looking into this and will update you shortly.', 'Can you share a screenshot of the error?',
+    'This has been forwarded to the concerned department.', 'The issue should be fixed now, please check.',
+    'Thanks, it works now.', 'It is still not working for me.', 'A technician will visit today.',
+    'Closing this ticket as resolved. Reopen if the problem persists.',
+]
+CATEGORY_WEIGHTS = {'IT Support': 35, 'Academics': 25, 'Accounts': 15, 'Hostel': 20, 'General': 5}
+PRIORITY_WEIGHTS = {'Low': 30, 'Medium': 50, 'High': 20}
+
+def zipf_weights(n, s):
+    """Cumulative weights where item i is picked in proportion to 1/(i+1)**s."""
+    total, cum = 0.0, []
+    for i in range(n):
+        total += 1.0 / (i + 1) ** s
+        cum.append(total)
+    return cum
+
+def ts(dt):
+    """Unix time of an aware datetime, as created_at stores it."""
+    return int(dt.timestamp())
+
+def generate(con, users=1000, agents=None, tickets=10000, comments=3.0, days=180, skew=0.9,
+             kb=200, chunk=5000, seed=42):
+    """Append synthetic users, tickets, comments, activity and notifications.
+
+    A few students file most tickets and a few agents carry most of the
+    assigned work (Zipf, exponent skew). Ticket volume grows towards the
+    present with an enrollment-week spike; older tickets are mostly closed
+    and their notifications read. Comments per ticket are geometric with
+    mean comments. Rows go in with executemany, one transaction per chunk.
+    """
+    rng = random.Random(seed)
+    agents = agents or max(2, users // 50)
+    started = time.monotonic()
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    cur = con.cursor()
+
+    first_user = cur.execute("SELECT coalesce(max(id), 0) + 1 FROM users").fetchone()[0]
+    student_hash, agent_hash = generate_password_hash('student123'), generate_password_hash('agent123')
+    agent_ids = list(range(first_user, first_user + agents))
+    student_ids = list(range(first_user + agents, first_user + agents + users))
+    rows = [(uid, f'agent_{i:04d}', f'agent_{i:04d}@campus.edu', agent_hash, 'agent', ts(now - timedelta(days=days)))
+            for i, uid in enumerate(agent_ids)]
+    rows += [(uid, f'student_{i:06d}', f'student_{i:06d}@student.campus.edu', student_hash, 'student',
+              ts(now - timedelta(days=rng.uniform(0, days * 2)))) for i, uid in enumerate(student_ids)]
+    with con:
+        cur.executemany("INSERT INTO users (id, username, email, password_hash, role, created_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    student_cum = zipf_weights(len(student_ids), skew)
+    agent_cum = zipf_weights(len(agent_ids), skew)
+    categories, category_w = list(CATEGORY_WEIGHTS), list(CATEGORY_WEIGHTS.values())
+    priorities, priority_w = list(PRIORITY_WEIGHTS), list(PRIORITY_WEIGHTS.values())
+    spike = days * 0.6  # enrollment week, this many days ago
+    p_more = comments / (comments + 1.0)
+
+    first_ticket = cur.execute("SELECT coalesce(max(id), 0) + 1 FROM tickets").fetchone()[0]
+    fts_trigger = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'tickets_fts_comment_ai'").fetchone()[0]
+    made = 0
+    while made < tickets:
+        n = min(chunk, tickets - made)
+        owners = rng.choices(student_ids, cum_weights=student_cum, k=n)
+        assignees = rng.choices(agent_ids, cum_weights=agent_cum, k=n)
+        t_rows, c_rows, a_rows, n_rows = [], [], [], []
+        for i in range(n):
+            tid = first_ticket + made + i
+            owner, agent = owners[i], assignees[i]
+            if rng.random() < 0.2:
+                age = abs(spike + rng.gauss(0, 2))
+            else:
+                age = days * (1 - rng.random() ** 0.5)  # denser towards the present
+            created = now - timedelta(days=age, seconds=rng.randint(0, 86399))
+            category = rng.choices(categories, category_w)[0]
+            subject = rng.choice(SUBJECTS[category])
+            title = f"{subject[0].upper()}{subject[1:]} {rng.choice(PROBLEMS)}"
+            if rng.random() < 0.5:
+                title += f" in {rng.choice(PLACES)}"
+            description = ' '.join(rng.choice(SENTENCES).format(n=rng.randint(1, 9), place=rng.choice(PLACES),
+                                                                subject=subject, sid=f'S{owner:06d}')
+                                   for _ in range(rng.randint(1, 4)))
+            priority = rng.choices(priorities, priority_w)[0]
+            closed_p = min(0.9, age / days * 1.5)
+            r = rng.random()
+            status = 'closed' if r < closed_p else 'in_progress' if r < closed_p + 0.25 else 'open'
+            assigned = agent if status != 'open' or rng.random() < 0.4 else None
+            t_rows.append((tid, owner, title, description, category, status, priority, assigned, ts(created)))
+            read = 1 if age > 7 else 0
+
+            when = created
+            a_rows.append((tid, owner, 'created', f'Ticket created with priority {priority}', ts(when)))
+            if assigned:
+                when += timedelta(minutes=rng.randint(5, 600))
+                a_rows.append((tid, assigned, 'assigned', rollups.ASSIGNED_DETAIL.format(assigned), ts(when)))
+                n_rows.append((owner, tid, f'Your ticket #{tid} has been assigned to an agent.', read, ts(when)))
+            k = 0
+            while rng.random() < p_more and k < 50:
+                k += 1
+                author = assigned if assigned and k % 2 else owner
+                when += timedelta(minutes=rng.randint(10, 2880))
+                if when > now:
+                    break
+                c_rows.append((tid, author, rng.choice(REPLIES), ts(when)))
+                a_rows.append((tid, author, 'comment', 'Added a comment', ts(when)))
+                if author != owner:
+                    n_rows.append((owner, tid, f'Someone commented on ticket #{tid}.', read, ts(when)))
+            if status != 'open' and assigned:
+                when = min(now, when + timedelta(minutes=rng.randint(10, 4320)))
+                a_rows.append((tid, assigned, 'status_change', rollups.STATUS_DETAIL.format(status), ts(when)))
+                n_rows.append((owner, tid, f"Your ticket #{tid} status changed to {status.replace('_', ' ').title()}.", read, ts(when)))
+        with con:
+            cur.executemany("""INSERT INTO tickets (id, user_id, title, description, category, status, priority, assigned_to, created_at)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", t_rows)
+            # Index each ticket's comments once, instead of re-indexing the
+            # ticket for every comment as the trigger does.
+            cur.execute("DROP TRIGGER tickets_fts_comment_ai")
+            cur.executemany("INSERT INTO comments (ticket_id, user_id, content, created_at) VALUES (?, ?, ?, ?)", c_rows)
+            cur.execute("""UPDATE tickets_fts SET comments = (SELECT group_concat(content, char(10)) FROM comments WHERE ticket_id = tickets_fts.rowid)
+                           WHERE rowid IN (SELECT DISTINCT ticket_id FROM comments WHERE ticket_id BETWEEN ? AND ?)""",
+                        (t_rows[0][0], t_rows[-1][0]))
+            cur.execute(fts_trigger)
+            cur.executemany("INSERT INTO activity_log (ticket_id, user_id, action, detail, created_at) VALUES (?, ?, ?, ?, ?)", a_rows)
+            cur.executemany("INSERT INTO notifications (user_id, ticket_id, message, is_read, created_at) VALUES (?, ?, ?, ?, ?)", n_rows)
+        made += n
+        print(f"  {made}/{tickets} tickets")
+
+    kb_rows = []
+    for i in range(kb):
+        category = rng.choices(categories, category_w)[0]
+        subject = rng.choice(SUBJECTS[category])
+        content = '\n'.join(rng.choice(SENTENCES + REPLIES).format(n=rng.randint(1, 9), place=rng.choice(PLACES),
+                                                                   subject=subject, sid='S000000')
+                            for _ in range(rng.randint(5, 30)))
+        kb_rows.append((f'{subject[0].upper()}{subject[1:]}: guide {i + 1}', category, content))
+    with con:
+        cur.executemany("INSERT INTO kb_articles (title, category, content) VALUES (?, ?, ?)", kb_rows)
+    print(f"Generated {users} students, {agents} agents, {tickets} tickets and {kb} articles "
+          f"in {time.monotonic() - started:.1f}s.")
+
 if __name__ == '__main__':
-    seed()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000, help='synthetic students')
+    parser.add_argument('--agents', type=int, default=None, help='synthetic agents (default: users/50)')
+    parser.add_argument('--tickets', type=int, default=0, help='synthetic tickets (0: demo data only)')
+    parser.add_argument('--comments', type=float, default=3.0, help='mean comments per ticket')
+    parser.add_argument('--days', type=int, default=180, help='time span the tickets are spread over')
+    parser.add_argument('--skew', type=float, default=0.9, help='Zipf exponent for tickets per student/agent')
+    parser.add_argument('--kb', type=int, default=200, help='synthetic knowledge-base articles')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+    args = parser.parse_args()
+    seed(users=args.users, agents=args.agents, tickets=args.tickets, comments=args.comments,
+         days=args.days, skew=args.skew, kb=args.kb, seed=args.seed)
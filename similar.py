@@ -0,0 +1,157 @@
+"""
+In-memory TF-IDF index that suggests knowledge-base articles and likely
+duplicate open tickets while a new ticket is being written.
+
+Documents are KB articles and open tickets, keyed ('kb', id) and
+('ticket', id). Hyphenated words are joined ("Wi-Fi" is "wifi"), text is
+split with classifier.split_words, stopwords and one-letter words are
+dropped, and title words count twice. A document's weights are
+(1 + log tf) * idf, L2-normalised, so a score is the cosine similarity in
+[0, 1] and one fixed threshold can flag a duplicate.
+
+Postings map term -> {document: weight}. A query looks at no more than
+MAX_QUERY_TERMS of its rarest words, so its cost depends on how many
+documents share those words and not on the size of the index.
+
+A document keeps the idf it was indexed with, which drifts as documents
+come and go. It is corrected, and changes made by other worker processes
+are picked up, by a full reload from the database every `resync` seconds.
+The reload builds a new index on a background thread while queries keep
+using the current one; changes made meanwhile are replayed onto it.
+"""
+import heapq, math, re, threading, time
+from classifier import split_words
+
+MAX_QUERY_TERMS = 12
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can cannot could do does doing for from get getting got had has have having
+how i i'm if in into is it its me my no not of on or our please since so still than that the their them then
+there these they this to too up us was we were what when where which while who why will with would you your
+""".split())
+
+_HYPHEN = re.compile(r'(?<=\w)-(?=\w)')
+
+
+def terms(text):
+    return [w for w in split_words(_HYPHEN.sub('', text or '')) if len(w) > 1 and w not in STOPWORDS]
+
+
+def term_counts(title, body):
+    counts = {}
+    for word in terms(title) * 2 + terms(body):
+        counts[word] = counts.get(word, 0) + 1
+    return counts
+
+
+class _State:
+    def __init__(self):
+        self.docs = {}      # key -> ({term: weight}, info)
+        self.postings = {}  # term -> {key: weight}
+
+    def idf(self, term):
+        return math.log((1 + len(self.docs)) / (1 + len(self.postings.get(term, ())))) + 1
+
+    def add(self, key, title, body, info):
+        self.remove(key)
+        counts = term_counts(title, body)
+        # Count the document first so its own terms have a df of at least one.
+        for term in counts:
+            self.postings.setdefault(term, {})[key] = 0.0
+        weights = {t: (1 + math.log(n)) * self.idf(t) for t, n in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        for term, w in weights.items():
+            weights[term] = w / norm
+            self.postings[term][key] = w / norm
+        self.docs[key] = (weights, info)
+
+    def remove(self, key):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        for term in doc[0]:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    del self.postings[term]
+
+
+class SimilarityIndex:
+    def __init__(self, load, resync=300):
+        """load() yields (key, title, body, info) for every document to index."""
+        self._load = load
+        self.resync = resync
+        self._lock = threading.Lock()
+        self._state = _State()
+        self._loaded_at = None
+        self._replay = None  # changes made while a reload runs, or None
+
+    def reload(self):
+        """Rebuild the index from load(). Safe to run while queries and changes continue."""
+        with self._lock:
+            self._replay = []
+        state = _State()
+        try:
+            for key, title, body, info in self._load():
+                state.add(key, title, body, info)
+        except BaseException:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            for op, args in self._replay:
+                getattr(state, op)(*args)
+            self._replay = None
+            self._state = state
+            self._loaded_at = time.monotonic()
+
+    def _maybe_reload(self):
+        with self._lock:
+            due = (self._replay is None and self._loaded_at is not None
+                   and time.monotonic() - self._loaded_at > self.resync)
+            if due:
+                self._loaded_at = time.monotonic()  # one reload at a time
+        if due:
+            threading.Thread(target=self.reload, name='similar-reload', daemon=True).start()
+
+    def add(self, key, title, body, info):
+        with self._lock:
+            self._state.add(key, title, body, info)
+            if self._replay is not None:
+                self._replay.append(('add', (key, title, body, info)))
+
+    def remove(self, key):
+        with self._lock:
+            self._state.remove(key)
+            if self._replay is not None:
+                self._replay.append(('remove', (key,)))
+
+    def __len__(self):
+        return len(self._state.docs)
+
+    def query(self, text, k=5, min_score=0.1, keep=None):
+        """{kind: [(score, id, info)]} with the k best documents of each kind, best first.
+
+        keep(kind, id, info), if given, leaves out documents it returns false for.
+        """
+        self._maybe_reload()
+        counts = term_counts('', text)
+        with self._lock:
+            state = self._state
+            known = [t for t in counts if t in state.postings]
+            known = heapq.nsmallest(MAX_QUERY_TERMS, known, key=lambda t: len(state.postings[t]))
+            weights = {t: (1 + math.log(counts[t])) * state.idf(t) for t in known}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            scores = {}
+            for term, w in weights.items():
+                w /= norm
+                for key, dw in state.postings[term].items():
+                    scores[key] = scores.get(key, 0.0) + w * dw
+            ranked = {}
+            for key, score in scores.items():
+                if score >= min_score and (keep is None or keep(key[0], key[1], state.docs[key][1])):
+                    ranked.setdefault(key[0], []).append((score, key[1]))
+            return {kind: [(score, doc_id, state.docs[(kind, doc_id)][1])
+                           for score, doc_id in heapq.nlargest(k, hits)]
+                    for kind, hits in ranked.items()}
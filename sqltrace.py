@@ -0,0 +1,120 @@
+"""
+Timing instrumentation for sqlite3 connections.
+
+Open connections with factory=InstrumentedConnection and give them an
+observer. Every execute/executemany and every fetch is timed, and the
+observer hears about it. Fetch time is added to the statement that produced
+the rows, because SQLite does most of a SELECT's work while rows are being
+stepped through. When a statement's total time passes the observer's
+slow_seconds, observer.slow() gets it once, together with its EXPLAIN QUERY
+PLAN.
+
+Iterating a cursor directly (for row in cur) is not timed beyond execute().
+"""
+import sqlite3, time
+
+
+class Observer:
+    """Receives timings from instrumented connections. All methods are optional no-ops."""
+    slow_seconds = None
+
+    def statement(self, sql, seconds):
+        """A statement finished execute()/executemany()."""
+
+    def fetch(self, sql, seconds, total):
+        """Rows of sql were fetched; total is the statement's time so far, execute included."""
+
+    def lock_wait(self, seconds):
+        """Time taken by a statement that opened a write transaction (waiting for the lock)."""
+
+    def busy(self, sql):
+        """A statement failed with SQLITE_BUSY/LOCKED after the busy timeout."""
+
+    def slow(self, sql, seconds, plan):
+        """A statement passed slow_seconds. plan is EXPLAIN QUERY PLAN lines, or None."""
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    observer = Observer()
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or InstrumentedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+_WRITE_BEGIN = ('BEGIN IMMEDIATE', 'BEGIN EXCLUSIVE')
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _sql = None
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters, None)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def _run(self, method, sql, parameters, explain_parameters):
+        con = self.connection
+        observer = con.observer
+        was_in_transaction = con.in_transaction
+        start = time.perf_counter()
+        try:
+            return method(sql, parameters)
+        except sqlite3.OperationalError as e:
+            if 'locked' in str(e) or 'busy' in str(e):
+                observer.busy(sql)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self._sql, self._parameters, self._seconds, self._reported = sql, explain_parameters, seconds, False
+            observer.statement(sql, seconds)
+            if (not was_in_transaction and con.in_transaction) or sql.lstrip()[:15].upper() in _WRITE_BEGIN:
+                observer.lock_wait(seconds)
+            self._check_slow()
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            seconds = time.perf_counter() - start
+            if self._sql is not None:
+                self._seconds += seconds
+                self.connection.observer.fetch(self._sql, seconds, self._seconds)
+                self._check_slow()
+
+    def _check_slow(self):
+        observer = self.connection.observer
+        if self._reported or observer.slow_seconds is None or self._seconds < observer.slow_seconds:
+            return
+        self._reported = True
+        observer.slow(self._sql, self._seconds, explain(self.connection, self._sql, self._parameters))
+
+
+def explain(con, sql, parameters):
+    """EXPLAIN QUERY PLAN lines for sql, or None when it has no plan or cannot be explained."""
+    words = sql.split(None, 1)
+    if parameters is None or not words or words[0].upper() not in _EXPLAINABLE:
+        return None
+    try:
+        # A plain cursor, so explaining is neither timed nor reported.
+        rows = sqlite3.Cursor(con).execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+    except sqlite3.Error:
+        return None
+    return [row[3] for row in rows]
@@ -0,0 +1,81 @@
+"""
+Test setup: the app runs against a freshly seeded database in a temporary
+folder, with EVENT_QUEUE_SYNC so activity, notifications and read receipts
+are written before each request returns.
+
+Run: python -m pytest
+"""
+import hashlib, os, secrets, shutil, sqlite3, sys, tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix='helpdesk-tests-')
+
+# Read by config.py when it is first imported, so set before anything imports it.
+os.environ['DATABASE_URL'] = os.path.join(TMP, 'helpdesk.db')
+os.environ['EVENT_QUEUE_SYNC'] = '1'
+sys.path.insert(0, ROOT)
+
+import seed_data
+seed_data.seed(os.environ['DATABASE_URL'])
+import app as helpdesk
+
+helpdesk.app.config.update(TESTING=True, UPLOAD_FOLDER=os.path.join(TMP, 'uploads'))
+os.makedirs(helpdesk.app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TMP, ignore_errors=True)
+
+
+@pytest.fixture
+def app():
+    return helpdesk.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def con():
+    con = helpdesk.connect()
+    yield con
+    con.close()
+
+
+@pytest.fixture
+def isolated_db(tmp_path, monkeypatch):
+    """Point the app at a copy of the test database (and a fresh archive) for tests that archive,
+    back up or import; returns the copy's path."""
+    path = str(tmp_path / 'copy.db')
+    source, target = helpdesk.connect(), sqlite3.connect(path)
+    source.backup(target)
+    source.close()
+    target.close()
+    monkeypatch.setitem(helpdesk.app.config, 'DATABASE_URL', path)
+    monkeypatch.setitem(helpdesk.app.config, 'ARCHIVE_DATABASE_URL', str(tmp_path / 'copy_archive.db'))
+    return path
+
+
+@pytest.fixture
+def login(client):
+    def login(username, password):
+        client.get('/logout')
+        response = client.post('/login', data={'username': username, 'password': password})
+        assert response.status_code == 302, f'login failed for {username}'
+        return client
+    return login
+
+
+@pytest.fixture
+def api_token(con):
+    """api_token(username) -> a new bearer token acting as that user."""
+    def create(username):
+        token = secrets.token_urlsafe(16)
+        with con:
+            con.execute("INSERT INTO api_tokens (user_id, name, token_sha256) SELECT id, 'tests', ? FROM users WHERE username = ?",
+                        (hashlib.sha256(token.encode()).hexdigest(), username))
+        return {'Authorization': f'Bearer {token}'}
+    return create
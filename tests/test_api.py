@@ -0,0 +1,69 @@
+def pages(client, headers, url):
+    """Every page of a cursor-paginated list, following next_cursor."""
+    out = []
+    while url:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200, response.json
+        out.append(response.json)
+        cursor = response.json['next_cursor']
+        url = cursor and f"{url.split('&cursor=')[0]}&cursor={cursor}"
+    return out
+
+
+def test_ticket_pages_cover_every_ticket_once(client, api_token, con):
+    expected = [r['id'] for r in con.execute("SELECT id FROM tickets ORDER BY id DESC")]
+    result = pages(client, api_token('admin'), '/api/v1/tickets?limit=3')
+    ids = [t['id'] for page in result for t in page['data']]
+    assert ids == expected and len(result) > 1
+    assert all(len(page['data']) == 3 for page in result[:-1])
+    assert result[-1]['next_cursor'] is None
+
+
+def test_ticket_pages_keep_the_viewer_filter(client, api_token, con):
+    expected = [r['id'] for r in con.execute("""SELECT t.id FROM tickets t JOIN users u ON u.id = t.user_id
+                                                WHERE u.username = 'student_aarav' ORDER BY t.id DESC""")]
+    result = pages(client, api_token('student_aarav'), '/api/v1/tickets?limit=2&fields=title')
+    assert [t['id'] for page in result for t in page['data']] == expected
+    assert set(result[0]['data'][0]) == {'id', 'title'}
+
+
+def test_kb_search_pages(client, api_token):
+    headers = api_token('admin')
+    everything = client.get('/api/v1/kb?q=portal&limit=100', headers=headers).json['data']
+    result = pages(client, headers, '/api/v1/kb?q=portal&limit=1')
+    assert len(result) > 1
+    assert [a['id'] for page in result for a in page['data']] == [a['id'] for a in everything]
+
+
+def test_invalid_cursor_is_rejected(client, api_token):
+    headers = api_token('admin')
+    assert client.get('/api/v1/tickets?cursor=not-a-cursor', headers=headers).status_code == 400
+    assert client.get('/api/v1/tickets?cursor=eyJvZmZzZXQiOjF9', headers=headers).status_code == 400  # {"offset":1}
+
+
+def test_requests_without_a_token_are_refused(client):
+    response = client.get('/api/v1/tickets')
+    assert response.status_code == 401
+    assert response.headers['WWW-Authenticate'] == 'Bearer'
+
+
+def test_unchanged_ticket_is_not_modified(client, api_token, login):
+    headers = api_token('admin')
+    first = client.get('/api/v1/tickets/2?embed=comments', headers=headers)
+    etag = first.headers['ETag']
+    again = client.get('/api/v1/tickets/2?embed=comments', headers={**headers, 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag and not again.data
+
+    login('agent_priya', 'agent123').post('/ticket/2/comment', data={'content': 'Router replaced.'})
+    changed = client.get('/api/v1/tickets/2?embed=comments', headers={**headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.json['comments'][-1]['content'] == 'Router replaced.'
+
+
+def test_unchanged_list_is_not_modified(client, api_token):
+    headers = api_token('admin')
+    etag = client.get('/api/v1/tickets?limit=5', headers=headers).headers['ETag']
+    assert client.get('/api/v1/tickets?limit=5', headers={**headers, 'If-None-Match': etag}).status_code == 304
+    assert client.get('/api/v1/tickets?limit=4', headers={**headers, 'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,103 @@
+import sqlite3, time
+import pytest
+import archive
+from conftest import helpdesk
+
+
+@pytest.fixture
+def archived_con(isolated_db):
+    """A connection to the database copy with five more closed tickets and the archive attached."""
+    con = helpdesk.connect()
+    with con:
+        con.execute("UPDATE tickets SET status = 'closed' WHERE id IN (1, 2, 3, 4, 5)")
+    archive.attach(con, helpdesk.app.config['ARCHIVE_DATABASE_URL'], create=True)
+    yield con
+    con.close()
+
+
+def closed_ids(con, schema):
+    return [r[0] for r in con.execute(f"SELECT id FROM {schema}.tickets WHERE status = 'closed' ORDER BY id")]
+
+
+def test_archive_moves_closed_tickets_with_their_rows(archived_con):
+    con = archived_con
+    eligible = closed_ids(con, 'main')
+    comments = con.execute("SELECT COUNT(*) FROM comments WHERE ticket_id IN (7, 9)").fetchone()[0]
+    assert archive.archive_closed(con, time.time() + 60, batch_size=2, pause=0) == len(eligible)
+    assert closed_ids(con, 'main') == []
+    assert closed_ids(con, 'archive') == eligible
+    assert con.execute("SELECT COUNT(*) FROM archive.comments WHERE ticket_id IN (7, 9)").fetchone()[0] == comments
+    assert con.execute("SELECT SUM(value) FROM counters WHERE scope = 'archived'").fetchone()[0] == len(eligible)
+    assert archive.archive_closed(con, time.time() + 60, pause=0) == 0
+
+
+def test_recently_changed_tickets_stay(archived_con):
+    assert archive.archive_closed(archived_con, time.time() - 365 * 86400, pause=0) == 0
+    assert closed_ids(archived_con, 'archive') == []
+
+
+def test_contended_batch_does_not_end_the_run(archived_con, isolated_db):
+    con = archived_con
+    eligible = closed_ids(con, 'main')
+    first = eligible[0]
+
+    class Contended:
+        """Changes the first ticket between the copy and the delete of its batch."""
+        bumped = False
+
+        def __getattr__(self, name):
+            return getattr(con, name)
+
+        def __enter__(self):
+            return con.__enter__()
+
+        def __exit__(self, *exc):
+            return con.__exit__(*exc)
+
+        def execute(self, sql, *args):
+            if sql == "BEGIN IMMEDIATE" and not self.bumped:
+                Contended.bumped = True
+                other = sqlite3.connect(isolated_db)
+                with other:
+                    other.execute("UPDATE versions SET version = version + 1 WHERE entity = 'ticket' AND id = ?", (first,))
+                other.close()
+            return con.execute(sql, *args)
+
+    assert archive.archive_closed(Contended(), time.time() + 60, batch_size=1, pause=0) == len(eligible) - 1
+    assert closed_ids(con, 'main') == [first]
+    assert closed_ids(con, 'archive') == eligible[1:]  # the copy of the changed ticket was healed away
+
+
+def test_heal_removes_copies_of_tickets_still_in_main(archived_con):
+    con = archived_con
+    with con:
+        con.execute("INSERT INTO archive.tickets SELECT * FROM main.tickets WHERE id = 1")
+    assert archive.heal(con) == 1
+    assert con.execute("SELECT COUNT(*) FROM archive.tickets").fetchone()[0] == 0
+
+
+def test_archived_ticket_view(archived_con, login, api_token):
+    archive.archive_closed(archived_con, time.time() + 60, pause=0)
+    client = login('student_aarav', 'student123')  # owner of ticket 9
+    page = client.get('/ticket/9')
+    assert page.status_code == 200
+    text = page.get_data(as_text=True)
+    assert 'Archived' in text and 'can no longer be changed' in text
+
+    client = login('agent_priya', 'agent123')
+    response = client.post('/ticket/9/update', data={'status': 'open'}, follow_redirects=True)
+    assert 'archived' in response.get_data(as_text=True)
+    assert closed_ids(archived_con, 'archive').count(9) == 1
+
+    data = client.get('/api/v1/tickets/9', headers=api_token('admin')).json
+    assert data['archived'] is True and data['status'] == 'closed'
+
+
+def test_prune_notifications_keeps_unread_and_recent(archived_con):
+    con = archived_con
+    with con:
+        con.execute("UPDATE notifications SET created_at = unixepoch('now', '-400 days')")
+    unread = con.execute("SELECT COUNT(*) FROM notifications WHERE is_read = 0").fetchone()[0]
+    read = con.execute("SELECT COUNT(*) FROM notifications WHERE is_read = 1").fetchone()[0]
+    assert archive.prune_notifications(con, 365, batch_size=2, pause=0) == read
+    assert con.execute("SELECT COUNT(*) FROM notifications").fetchone()[0] == unread
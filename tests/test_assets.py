@@ -0,0 +1,99 @@
+import base64, hashlib, io, json, tarfile
+import pytest
+import assets, build_assets
+from build_assets import LockError
+from conftest import helpdesk
+
+URL = 'https://cdn.jsdelivr.net/npm/alpinejs@3.14.8/dist/cdn.min.js'
+SCRIPT = b'window.Alpine = {};'
+
+
+@pytest.fixture
+def vendor(tmp_path, monkeypatch):
+    monkeypatch.setattr(build_assets, 'VENDOR', str(tmp_path))
+    return tmp_path
+
+
+def npm_registry(monkeypatch, content, integrity=None):
+    """Serve URL, and its package from a fake npm registry holding content."""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tar:
+        info = tarfile.TarInfo('package/dist/cdn.min.js')
+        info.size = len(content)
+        tar.addfile(info, io.BytesIO(content))
+    tarball = buf.getvalue()
+    integrity = integrity or 'sha512-' + base64.b64encode(hashlib.sha512(tarball).digest()).decode()
+    files = {URL: SCRIPT, 'https://registry.npmjs.org/alpinejs/3.14.8': json.dumps(
+                 {'dist': {'tarball': 'https://registry.npmjs.org/alpinejs.tgz', 'integrity': integrity}}).encode(),
+             'https://registry.npmjs.org/alpinejs.tgz': tarball}
+    monkeypatch.setattr(build_assets, '_download', lambda url: files[url])
+
+
+def test_vendored_requires_a_recorded_hash(vendor, monkeypatch):
+    npm_registry(monkeypatch, SCRIPT)
+    with pytest.raises(LockError, match='no hash recorded'):
+        build_assets.vendored(URL, {URL: None})
+    assert list(vendor.iterdir()) == []
+
+
+def test_vendored_checks_downloads_and_cached_copies(vendor, monkeypatch):
+    npm_registry(monkeypatch, SCRIPT)
+    lock = {URL: hashlib.sha256(SCRIPT).hexdigest()}
+    assert build_assets.vendored(URL, lock) == SCRIPT
+    [cached] = vendor.iterdir()
+    cached.write_bytes(SCRIPT + b'alert(1)')
+    with pytest.raises(LockError, match='does not match the lockfile'):
+        build_assets.vendored(URL, lock)
+
+
+def test_relock_records_a_file_matching_the_npm_package(vendor, monkeypatch):
+    npm_registry(monkeypatch, SCRIPT)
+    lock = {}
+    build_assets.relock(URL, lock)
+    assert lock == {URL: hashlib.sha256(SCRIPT).hexdigest()}
+
+
+def test_relock_refuses_a_file_that_differs_from_npm(vendor, monkeypatch):
+    npm_registry(monkeypatch, b'window.Alpine = {original: true};')
+    lock = {}
+    with pytest.raises(LockError, match='differs'):
+        build_assets.relock(URL, lock)
+    assert lock == {}
+
+
+def test_relock_refuses_a_tarball_failing_the_registry_integrity(vendor, monkeypatch):
+    npm_registry(monkeypatch, SCRIPT, integrity='sha512-' + base64.b64encode(b'0' * 64).decode())
+    with pytest.raises(LockError, match="registry's integrity"):
+        build_assets.relock(URL, {})
+
+
+def test_integrity_value():
+    digest = hashlib.sha256(SCRIPT).hexdigest()
+    assert assets.integrity({URL: digest}, URL) == 'sha256-' + base64.b64encode(hashlib.sha256(SCRIPT).digest()).decode()
+    assert assets.integrity({URL: None}, URL) is None
+
+
+def test_unbuilt_pages_fall_back_to_the_pinned_cdn(client, monkeypatch):
+    monkeypatch.setattr(helpdesk, 'asset_manifest', {})
+    monkeypatch.setattr(helpdesk, 'asset_lock', {assets.CDN['js/alpine.min.js']: hashlib.sha256(SCRIPT).hexdigest()})
+    page = client.get('/login').get_data(as_text=True)
+    assert assets.TAILWIND_PLAY_CDN in page
+    sri = assets.integrity(helpdesk.asset_lock, assets.CDN['js/alpine.min.js'])
+    assert f'src="{assets.CDN["js/alpine.min.js"]}" integrity="{sri}" crossorigin="anonymous"' in page
+
+
+def test_cdn_fallback_can_be_turned_off(client, monkeypatch):
+    monkeypatch.setattr(helpdesk, 'asset_manifest', {})
+    monkeypatch.setitem(helpdesk.app.config, 'ASSET_CDN_FALLBACK', False)
+    monkeypatch.setitem(helpdesk.app.jinja_env.globals, 'asset_cdn_fallback', False)
+    page = client.get('/login').get_data(as_text=True)
+    assert 'cdn.' not in page
+    assert '/static/js/alpine.min.js' in page
+
+
+def test_built_assets_are_served_from_the_manifest(client, monkeypatch):
+    monkeypatch.setattr(helpdesk, 'asset_manifest', {'js/alpine.min.js': 'js/alpine.min.0123456789ab.js',
+                                                    'css/tailwind.css': 'css/tailwind.0123456789ab.css'})
+    page = client.get('/login').get_data(as_text=True)
+    assert '/assets/js/alpine.min.0123456789ab.js"></script>' in page
+    assert assets.TAILWIND_PLAY_CDN not in page
@@ -0,0 +1,148 @@
+import random
+import pytest
+from assignment import AgentLoad, weight
+from conftest import helpdesk
+
+
+@pytest.fixture
+def agent_con(isolated_db):
+    con = helpdesk.connect()
+    yield con
+    con.close()
+
+
+def actual_loads(con):
+    loads = {r[0]: 0 for r in con.execute("SELECT id FROM users WHERE role = 'agent'")}
+    for agent, status, priority in con.execute("SELECT assigned_to, status, priority FROM tickets WHERE assigned_to IN (2, 3)"):
+        loads[agent] += weight(status, priority)
+    return loads
+
+
+def test_weights():
+    assert weight('open', 'High') > weight('in_progress', 'Medium') > weight('open', 'Low') > 0
+    assert weight('closed', 'High') == 0 and weight('open', 'Urgent') == weight('open', 'Medium')
+
+
+def test_load_reads_open_work_per_agent(agent_con):
+    loads = AgentLoad()
+    loads.load(agent_con)
+    assert loads.loads() == actual_loads(agent_con)
+
+
+def test_pick_charges_the_least_loaded_agent(agent_con):
+    loads = AgentLoad()
+    loads.load(agent_con)
+    before = loads.loads()
+    lightest = min(before, key=before.get)
+    assert loads.pick(agent_con, 'Hostel', 'High') == lightest
+    assert loads.loads()[lightest] == before[lightest] + weight('open', 'High')
+
+
+def test_ties_go_to_the_agent_idle_longest():
+    loads = AgentLoad()
+    loads._load, loads._skills = {2: 0, 3: 0}, {2: frozenset(), 3: frozenset()}
+    loads._rebuild_heaps()
+    loads._loaded_at = float('inf')
+    picks = [loads.pick(None, 'Hostel', 'Medium') for _ in range(4)]
+    assert picks == [2, 3, 2, 3]
+
+
+def test_skills_decide_who_can_take_a_category(agent_con):
+    with agent_con:
+        agent_con.execute("INSERT INTO agent_skills (user_id, category) VALUES (2, 'Hostel')")
+    loads = AgentLoad()
+    loads.load(agent_con)
+    loads._load.update({2: 100, 3: 0})  # priya is far busier
+    loads._rebuild_heaps()
+    # Rahul has no skills rows, so he takes every category, Hostel included.
+    assert loads.pick(agent_con, 'Hostel', 'Low') == 3
+    with agent_con:
+        agent_con.execute("INSERT INTO agent_skills (user_id, category) VALUES (3, 'Accounts')")
+    loads.load(agent_con)
+    loads._load.update({2: 100, 3: 0})
+    loads._rebuild_heaps()
+    assert loads.pick(agent_con, 'Hostel', 'Low') == 2
+    assert loads.pick(agent_con, 'Library', 'Low') == 3  # nobody handles it: least loaded overall
+
+
+def test_changes_move_load_between_agents():
+    loads = AgentLoad()
+    loads._load, loads._skills = {2: 5, 3: 5}, {2: frozenset(), 3: frozenset()}
+    loads._rebuild_heaps()
+    loads.change((2, 'open', 'High'), (3, 'open', 'High'))
+    assert loads.loads() == {2: 2, 3: 8}
+    loads.change((3, 'open', 'High'), (3, 'closed', 'High'))
+    loads.change((None, 'open', 'Low'), ('2', 'open', 'Low'))  # form values may be strings
+    loads.change((7, 'open', 'Low'), (None, 'open', 'Low'))     # not an agent
+    assert loads.loads() == {2: 3, 3: 5}
+
+
+def test_heaps_stay_correct_through_many_changes():
+    rng = random.Random(7)
+    loads = AgentLoad()
+    agents = list(range(10, 30))
+    loads._load = {a: 0 for a in agents}
+    loads._skills = {a: frozenset({rng.choice(['A', 'B'])}) if a % 3 else frozenset() for a in agents}
+    loads._rebuild_heaps()
+    loads._loaded_at = float('inf')
+    for _ in range(2000):
+        if rng.random() < 0.6:
+            category = rng.choice(['A', 'B'])
+            eligible = [a for a in agents if category in loads._skills[a] or not loads._skills[a]]
+            lowest = min(loads._load[a] for a in eligible)
+            picked = loads.pick(None, category, 'Low')
+            assert picked in eligible and loads._load[picked] - 1 == lowest
+        else:
+            agent = rng.choice(agents)
+            if loads._load[agent]:
+                loads.change((agent, 'open', 'Low'), (agent, 'closed', 'Low'))
+    assert loads._entries <= 4 * loads._current + 64  # outdated entries are pruned
+
+
+def test_no_agents(agent_con):
+    with agent_con:
+        agent_con.execute("UPDATE users SET role = 'admin' WHERE role = 'agent'")
+    loads = AgentLoad()
+    assert loads.pick(agent_con, 'Hostel', 'High') is None
+
+
+def test_an_invalidated_load_is_reread(agent_con):
+    loads = AgentLoad(resync=3600)
+    loads.load(agent_con)
+    with agent_con:
+        agent_con.execute("UPDATE tickets SET assigned_to = 2, status = 'open', priority = 'High' WHERE assigned_to = 3")
+    loads.invalidate()
+    loads.pick(agent_con, 'Hostel', 'Low')
+    expected = actual_loads(agent_con)
+    expected[3] += weight('open', 'Low')
+    assert loads.loads() == expected
+
+
+def test_new_tickets_go_to_the_least_loaded_agent(login, agent_con, monkeypatch):
+    loads = AgentLoad()
+    monkeypatch.setattr(helpdesk, 'assigner', loads)
+    loads.load(agent_con)
+    lightest = min(loads.loads(), key=loads.loads().get)
+    login('student_neha', 'student123').post('/ticket/new', data={'title': 'Hostel water leakage', 'priority': 'High'})
+    ticket = agent_con.execute("SELECT id, assigned_to FROM tickets ORDER BY id DESC LIMIT 1").fetchone()
+    assert ticket['assigned_to'] == lightest
+    activity = agent_con.execute("SELECT user_id, detail FROM activity_log WHERE ticket_id = ? AND action = 'assigned'",
+                                 (ticket['id'],)).fetchone()
+    assert tuple(activity) == (None, f'Assigned to user #{lightest}')
+    assert loads.loads() == actual_loads(agent_con)
+
+
+def test_auto_assign_can_be_turned_off(login, agent_con, monkeypatch):
+    monkeypatch.setitem(helpdesk.app.config, 'AUTO_ASSIGN', False)
+    login('student_neha', 'student123').post('/ticket/new', data={'title': 'Hostel water leakage'})
+    assert agent_con.execute("SELECT assigned_to FROM tickets ORDER BY id DESC LIMIT 1").fetchone()[0] is None
+
+
+def test_skill_changes_invalidate_the_loads(login, agent_con, monkeypatch):
+    loads = AgentLoad(resync=3600)
+    loads.load(agent_con)
+    monkeypatch.setattr(helpdesk, 'assigner', loads)
+    login('admin', 'admin123').post('/admin/users', data={'user_id': '2', 'action': 'skills', 'skills': ['Hostel']})
+    assert loads._loaded_at is None
+    loads.pick(agent_con, 'Hostel', 'Low')
+    assert loads._skills[2] == frozenset({'Hostel'})
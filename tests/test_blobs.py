@@ -0,0 +1,67 @@
+import hashlib, io, os, secrets
+import pytest
+import blobstore
+
+
+def upload(client, data, title='Projector broken'):
+    response = client.post('/ticket/new', data={'title': title, 'description': 'See attached.', 'priority': 'Low',
+                                                'attachment': (io.BytesIO(data), 'report.txt')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    return int(response.headers['Location'].rsplit('/', 1)[1])
+
+
+def refcount(con, sha256):
+    row = con.execute("SELECT refcount FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    return row and row['refcount']
+
+
+@pytest.fixture
+def content():
+    data = secrets.token_bytes(64)
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def test_identical_uploads_share_one_blob(app, login, con, content):
+    data, sha256 = content
+    client = login('student_aarav', 'student123')
+    first, second = upload(client, data), upload(client, data)
+    assert refcount(con, sha256) == 2
+    assert con.execute("SELECT COUNT(*) FROM attachments WHERE sha256 = ? AND ticket_id IN (?, ?)",
+                       (sha256, first, second)).fetchone()[0] == 2
+    with open(blobstore.blob_path(app.config['UPLOAD_FOLDER'], sha256), 'rb') as f:
+        assert f.read() == data
+    assert client.get(f'/uploads/{first}_report.txt').data == data
+
+
+def test_refcount_follows_attachment_rows(login, con, content):
+    data, sha256 = content
+    other = hashlib.sha256(b'other' + data).hexdigest()
+    upload(login('student_aarav', 'student123'), data)
+    with con:
+        con.execute("INSERT INTO blobs (sha256, size) VALUES (?, 0)", (other,))
+        con.execute("UPDATE attachments SET sha256 = ? WHERE sha256 = ?", (other, sha256))
+    assert (refcount(con, sha256), refcount(con, other)) == (0, 1)
+    with con:
+        con.execute("DELETE FROM attachments WHERE sha256 = ?", (other,))
+    assert refcount(con, other) == 0
+
+
+def test_gc_removes_only_old_unreferenced_blobs(app, login, con, content, monkeypatch):
+    data, kept = content
+    root = app.config['UPLOAD_FOLDER']
+    upload(login('student_aarav', 'student123'), data)
+    orphan, fresh = (blobstore.store_stream(root, io.BytesIO(secrets.token_bytes(32)))[0] for _ in range(2))
+    with con:
+        con.executemany("INSERT INTO blobs (sha256, size) VALUES (?, 32)", [(orphan,), (fresh,)])
+    old = os.path.getmtime(blobstore.blob_path(root, orphan)) - 7200
+    os.utime(blobstore.blob_path(root, orphan), (old, old))
+    monkeypatch.setitem(app.config, 'BLOB_GC_GRACE', 3600)
+
+    result = app.test_cli_runner().invoke(args=['gc-blobs'])
+    assert result.exit_code == 0, result.output
+    assert not os.path.exists(blobstore.blob_path(root, orphan))
+    assert refcount(con, orphan) is None
+    assert os.path.exists(blobstore.blob_path(root, fresh))  # within the grace period
+    assert os.path.exists(blobstore.blob_path(root, kept))
+    assert refcount(con, kept) == 1
@@ -0,0 +1,112 @@
+import pytest
+import similar
+from assignment import AgentLoad, weight
+from conftest import helpdesk
+
+
+@pytest.fixture
+def bulk(isolated_db, login, monkeypatch):
+    """An agent's client against a database copy, with agent loads and suggestions read from it."""
+    con = helpdesk.connect()
+    assigner = AgentLoad()
+    assigner.load(con)
+    suggestions = similar.SimilarityIndex(helpdesk.similar_documents)
+    suggestions.reload()
+    monkeypatch.setattr(helpdesk, 'assigner', assigner)
+    monkeypatch.setattr(helpdesk, 'suggestions', suggestions)
+    yield login('agent_priya', 'agent123'), con
+    con.close()
+
+
+def tickets(con, *ids):
+    return {r['id']: dict(r) for r in con.execute(
+        f"SELECT id, status, priority, assigned_to FROM tickets WHERE id IN ({','.join('?' * len(ids))})", ids)}
+
+
+def test_json_results_per_ticket(bulk):
+    client, con = bulk
+    con.execute("UPDATE tickets SET status = 'in_progress' WHERE id = 3")
+    con.commit()
+    response = client.post('/tickets/bulk', json={'ids': [1, 3, 999, 1], 'set': {'status': 'in_progress'}})
+    assert response.json == {'updated': 1, 'unchanged': 1, 'not_found': 1, 'results': [
+        {'id': 1, 'result': 'updated', 'changed': ['status']},
+        {'id': 3, 'result': 'unchanged', 'changed': []},
+        {'id': 999, 'result': 'not_found', 'changed': []}]}
+    assert tickets(con, 1)[1]['status'] == 'in_progress'
+    activity = con.execute("SELECT user_id, detail FROM activity_log WHERE ticket_id = 1 ORDER BY id DESC LIMIT 1").fetchone()
+    assert tuple(activity) == (2, 'Status changed to in_progress')
+    message = con.execute("SELECT message FROM notifications WHERE ticket_id = 1 ORDER BY id DESC LIMIT 1").fetchone()[0]
+    assert message == 'Your ticket #1 status changed to In Progress.'
+
+
+def test_several_fields_and_in_memory_state(bulk):
+    client, con = bulk
+    response = client.post('/tickets/bulk', json={'ids': [1, 6, 8], 'set': {'assignee': 3, 'priority': 'Low', 'status': 'closed'}})
+    assert response.json['updated'] == 3
+    assert all(t == {'id': t['id'], 'status': 'closed', 'priority': 'Low', 'assigned_to': 3} for t in tickets(con, 1, 6, 8).values())
+    expected = {r[0]: 0 for r in con.execute("SELECT id FROM users WHERE role = 'agent'")}
+    for agent, status, priority in con.execute("SELECT assigned_to, status, priority FROM tickets WHERE assigned_to IN (2, 3)"):
+        expected[agent] += weight(status, priority)
+    assert helpdesk.assigner.loads() == expected
+    assert 1 not in [tid for _, tid, _ in helpdesk.suggestions.query('Wi-Fi Library Block B').get('ticket', [])]
+
+
+def test_filters_select_the_tickets(bulk):
+    client, con = bulk
+    hostel = [r[0] for r in con.execute("SELECT id FROM tickets WHERE category = 'Hostel' AND status = 'open' ORDER BY id DESC")]
+    response = client.post('/tickets/bulk', json={'filter': {'category': 'Hostel', 'status': 'open'}, 'set': {'priority': 'Low'}})
+    assert [r['id'] for r in response.json['results']] == hostel
+    assert all(t['priority'] == 'Low' for t in tickets(con, *hostel).values())
+
+
+def test_limits(bulk, monkeypatch):
+    client, con = bulk
+    monkeypatch.setitem(helpdesk.app.config, 'BULK_UPDATE_MAX', 2)
+    before = tickets(con, 1, 2, 3)
+    response = client.post('/tickets/bulk', json={'ids': [1, 2, 3], 'set': {'priority': 'Low'}})
+    assert response.status_code == 400 and response.json['error'] == 'At most 2 tickets can be changed at once.'
+    response = client.post('/tickets/bulk', json={'filter': {}, 'set': {'priority': 'Low'}})
+    assert response.status_code == 400 and 'narrow the filter' in response.json['error']
+    assert tickets(con, 1, 2, 3) == before
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'ids': [1], 'set': {'status': 'done'}}, 'Unknown status: done.'),
+    ({'ids': [1], 'set': {'priority': 'Urgent'}}, 'Unknown priority: Urgent.'),
+    ({'ids': [1], 'set': {'assignee': 4}}, 'User #4 is not an agent or admin.'),
+    ({'ids': [1], 'set': {'assignee': 'priya'}}, 'User #priya is not an agent or admin.'),
+    ({'ids': [1], 'set': {}}, 'Choose a status, priority or assignee to apply.'),
+    ({'ids': ['one'], 'set': {'status': 'open'}}, 'Ticket ids must be integers.'),
+    ({'ids': [], 'set': {'status': 'open'}}, 'Select at least one ticket.'),
+    ([1, 2], 'Choose a status, priority or assignee to apply.'),
+])
+def test_bad_requests(bulk, body, error):
+    client, _ = bulk
+    response = client.post('/tickets/bulk', json=body)
+    assert response.status_code == 400 and response.json == {'error': error}
+
+
+def test_students_are_refused(login):
+    response = login('student_aarav', 'student123').post('/tickets/bulk', json={'ids': [1], 'set': {'status': 'closed'}})
+    assert response.status_code == 403
+
+
+def test_dashboard_form(bulk):
+    client, con = bulk
+    response = client.post('/tickets/bulk', data={'ids': ['1', '999'], 'set_priority': 'Low', 'next': '/dashboard?status=open'})
+    assert response.status_code == 302 and response.headers['Location'] == '/dashboard?status=open'
+    text = client.get('/dashboard').get_data(as_text=True)
+    assert '1 ticket(s) updated, 0 already up to date, 1 not found or archived.' in text
+    assert tickets(con, 1)[1]['priority'] == 'Low'
+
+    response = client.post('/tickets/bulk', data={'ids': ['1'], 'set_status': 'nope', 'next': '//evil.example/'})
+    assert response.headers['Location'] == '/dashboard'
+    assert 'Unknown status: nope.' in client.get('/dashboard').get_data(as_text=True)
+
+
+def test_dashboard_form_all_matching(bulk):
+    client, con = bulk
+    mine = [r[0] for r in con.execute("SELECT id FROM tickets WHERE assigned_to = 2 AND status != 'closed'")]
+    client.post('/tickets/bulk', data={'all_matching': '1', 'mine': '1', 'status': 'open', 'set_status': 'in_progress'})
+    assert all(t['status'] == 'in_progress' for t in tickets(con, *mine).values())
+    assert tickets(con, 6)[6]['status'] == 'open'  # agent_rahul's, so not matched
@@ -0,0 +1,74 @@
+import json, os
+import pytest
+from classifier import KeywordClassifier, split_words
+
+KEYWORDS = {
+    'IT Support': ['lab', 'box', 'wi-fi', ['lab printer', 3]],
+    'Academics': ['exam', ['exam schedule', 2], 'end of semester'],
+    'Hostel': ['room', 'water'],
+}
+
+
+@pytest.fixture
+def keyword_file(tmp_path):
+    path = tmp_path / 'keyword_tags.json'
+    path.write_text(json.dumps(KEYWORDS))
+    return path
+
+
+@pytest.fixture
+def clf(keyword_file):
+    return KeywordClassifier(str(keyword_file))
+
+
+def test_split_words():
+    assert split_words("Wi-Fi isn't working (Block-B)") == ['wi', 'fi', 'isn', 't', 'working', 'block', 'b']
+
+
+@pytest.mark.parametrize('text, category', [
+    ('Seats are available', 'General'),       # "lab" inside a word
+    ('Labs are closed', 'IT Support'),
+    ('Two boxes arrived', 'IT Support'),      # plural with "es"
+    ('The labx is closed', 'General'),
+    ('WI-FI down', 'IT Support'),
+    ('wi fi down', 'IT Support'),
+    ('', 'General'),
+])
+def test_whole_words_and_plurals(clf, text, category):
+    assert clf.classify(text) == category
+
+
+def test_phrases_and_weights(clf):
+    # Two "Hostel" words lose to one weighted phrase.
+    assert clf.classify('The lab printer in my room leaks water') == 'IT Support'
+    assert clf.classify('Exam schedules for my room and water supply') == 'Academics'
+    assert clf.classify('exam room water') == 'Hostel'
+    assert clf.classify('Results at the end of semesters') == 'Academics'
+    assert clf.classify('at the end of the semester') == 'General'
+
+
+def test_a_keyword_counts_once_and_ties_go_to_the_first_category(clf):
+    assert clf.classify('room room room exam') == 'Academics'
+    assert clf.classify('lab room') == 'IT Support'
+
+
+def test_classify_many(clf):
+    assert clf.classify_many(['labs', 'rooms', 'nothing']) == ['IT Support', 'Hostel', 'General']
+
+
+def test_changes_to_the_file_are_picked_up(keyword_file):
+    clf = KeywordClassifier(str(keyword_file), check_interval=0)
+    assert clf.classify('library fines') == 'General'
+    keyword_file.write_text(json.dumps({**KEYWORDS, 'Library': ['library']}))
+    stat = os.stat(keyword_file)
+    os.utime(keyword_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert clf.classify('library fines') == 'Library'
+    assert clf.categories[-1] == 'Library'
+
+
+def test_a_missing_file(keyword_file, tmp_path):
+    with pytest.raises(OSError):
+        KeywordClassifier(str(tmp_path / 'missing.json'))
+    clf = KeywordClassifier(str(keyword_file), check_interval=0)
+    keyword_file.unlink()
+    assert clf.classify('labs') == 'IT Support'  # keeps the last keywords it read
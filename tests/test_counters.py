@@ -0,0 +1,66 @@
+import pytest
+from conftest import helpdesk
+
+
+@pytest.fixture
+def counted(isolated_db):
+    con = helpdesk.connect()
+    yield con
+    con.close()
+
+
+def stored(con):
+    return {(r[0], r[1]): r[2] for r in con.execute("SELECT scope, key, value FROM counters WHERE scope != 'archived' AND value != 0")}
+
+
+def actual(con):
+    return {(r[0], str(r[1])): r[2] for r in con.execute(helpdesk.COUNTER_SOURCES)}
+
+
+def test_triggers_keep_counters_equal_to_counts(counted):
+    con = counted
+    assert stored(con) == actual(con)
+    with con:
+        con.execute("INSERT INTO tickets (user_id, title, category) VALUES (4, 'Projector', NULL)")
+        con.execute("UPDATE tickets SET status = 'closed' WHERE id IN (1, 2)")
+        con.execute("UPDATE tickets SET status = 'closed' WHERE id = 1")  # unchanged
+        con.execute("UPDATE tickets SET category = 'Hostel' WHERE id = 3")
+        con.execute("UPDATE tickets SET category = NULL WHERE id = 5")
+        con.execute("DELETE FROM tickets WHERE id = 6")
+        con.execute("INSERT INTO users (username, email, password_hash, role) VALUES ('x', 'x@campus.edu', '', 'student')")
+        con.execute("DELETE FROM users WHERE username = 'x'")
+        con.execute("INSERT INTO kb_articles (title, content) VALUES ('Printing', '')")
+        con.execute("INSERT INTO notifications (user_id, ticket_id, message) VALUES (4, 1, 'a'), (4, 1, 'b'), (5, 2, 'c')")
+        con.execute("UPDATE notifications SET is_read = 1 WHERE user_id = 4 AND message = 'a'")
+        con.execute("UPDATE notifications SET is_read = 0 WHERE user_id = 5")
+        con.execute("DELETE FROM notifications WHERE message = 'b'")
+    assert stored(con) == actual(con)
+
+
+def test_ticket_stats_count_archived_tickets_as_closed(counted):
+    with counted:
+        counted.execute("INSERT INTO counters (scope, key, value) VALUES ('archived', '2025-01', 4)")
+    counts = actual(counted)
+    with helpdesk.app.test_request_context():
+        stats = helpdesk.ticket_stats()
+    assert stats['closed'] == counts.get(('status', 'closed'), 0) + 4
+    assert stats['total'] == sum(v for (scope, _), v in counts.items() if scope == 'status') + 4
+
+
+def test_check_counters_reports_and_repairs_drift(app, counted):
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['check-counters']).output == 'Counters are consistent.\n'
+    with counted:
+        counted.execute("UPDATE counters SET value = value + 2 WHERE scope = 'status' AND key = 'open'")
+        counted.execute("DELETE FROM counters WHERE scope = 'users'")
+        counted.execute("INSERT INTO counters (scope, key, value) VALUES ('archived', '2025-01', 4)")
+    open_tickets = actual(counted)[('status', 'open')]
+    output = runner.invoke(args=['check-counters']).output
+    assert f'status/open: stored {open_tickets + 2}, actual {open_tickets}' in output
+    assert 'users/total: stored 0, actual 8' in output
+    assert 'Rebuilt' not in output and stored(counted) != actual(counted)
+
+    assert 'Rebuilt counters (2 drifted).' in runner.invoke(args=['check-counters', '--repair']).output
+    assert stored(counted) == actual(counted)
+    assert counted.execute("SELECT value FROM counters WHERE scope = 'archived'").fetchone()[0] == 4
+    assert runner.invoke(args=['check-counters']).output == 'Counters are consistent.\n'
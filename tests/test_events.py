@@ -0,0 +1,68 @@
+import pytest
+from pubsub import Broker
+from conftest import helpdesk
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = Broker(max_streams=2)
+    monkeypatch.setattr(helpdesk, 'broker', broker)
+    return broker
+
+
+def test_stream_starts_with_the_unread_count(login, broker):
+    response = login('student_aarav', 'student123').get('/events', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    first = next(response.response)
+    first = first.decode() if isinstance(first, bytes) else first
+    assert 'event: unread' in first
+    response.close()
+    assert broker.stream_count == 0
+
+
+def test_head_requests_release_their_slot(login, broker):
+    client = login('student_aarav', 'student123')
+    for _ in range(3):
+        client.head('/events').close()
+    assert broker.stream_count == 0
+    response = client.get('/events', buffered=False)
+    assert response.status_code == 200
+    response.close()
+
+
+def test_client_gone_before_the_first_chunk_releases_its_slot(login, broker):
+    client = login('student_aarav', 'student123')
+    for _ in range(3):
+        response = client.get('/events', buffered=False)
+        assert response.status_code == 200
+        response.close()  # never iterated
+    assert broker.stream_count == 0
+
+
+def test_stream_cap(login, broker):
+    client = login('student_aarav', 'student123')
+    open_streams = [client.get('/events', buffered=False) for _ in range(2)]
+    refused = client.get('/events')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == '30'
+    for response in open_streams:
+        response.close()
+    assert broker.stream_count == 0
+
+
+def test_anonymous_requests_are_refused(client, broker):
+    assert client.get('/events').status_code == 401
+    assert broker.stream_count == 0
+
+
+def test_subscribers_get_their_channels_and_missed_events():
+    broker = Broker()
+    broker.publish('ticket:1', 'comment', {'n': 1})
+    sub = broker.subscribe(['ticket:1'], last_event_id=0)
+    broker.publish('ticket:2', 'comment', {'n': 2})
+    broker.publish('ticket:1', 'status', {'n': 3})
+    assert [sub.get(timeout=0)[1] for _ in range(2)] == ['comment', 'status']
+    assert sub.get(timeout=0) is None
+    broker.unsubscribe(sub)
+    assert broker.stream_count == 0
@@ -0,0 +1,161 @@
+import io, json
+import pytest
+import assignment, ingest, similar
+from conftest import helpdesk
+
+classify_many = helpdesk.classifier.classify_many
+USERS = {'student_neha': 5}
+
+
+def jsonl(*records):
+    return b''.join((r if isinstance(r, bytes) else json.dumps(r).encode()) + b'\n' for r in records)
+
+
+def parse(record):
+    return ingest.parse_record(json.dumps(record), USERS, set(USERS.values()), 1)
+
+
+def test_parse_record_defaults_and_aliases():
+    assert parse({'title': ' Lab printer ', 'body': 'Out of toner', 'priority': 'high', 'request_id': 7}) == \
+        (1, 'Lab printer', 'Out of toner', None, 'High')
+    assert parse({'title': 'Fees', 'username': 'student_neha', 'category': 'Accounts'})[::3] == (5, 'Accounts')
+    assert parse({'title': 'Fees', 'user_id': 5})[0] == 5
+
+
+@pytest.mark.parametrize('record, reason', [
+    ('not json', 'invalid JSON'),
+    ([1, 2], 'not an object'),
+    ({'title': '  '}, 'missing title'),
+    ({'title': 'x' * 201}, 'longer than 200'),
+    ({'title': 'Fees', 'priority': 'Urgent'}, 'unknown priority'),
+    ({'title': 'Fees', 'username': 'nobody'}, 'unknown username'),
+    ({'title': 'Fees', 'user_id': '5'}, 'unknown user_id'),
+    ({'title': 'Fees', 'description': 3}, 'not a string'),
+])
+def test_parse_record_rejects(record, reason):
+    line = record if isinstance(record, str) else json.dumps(record)
+    with pytest.raises(ValueError, match=reason):
+        ingest.parse_record(line, USERS, set(USERS.values()), 1)
+
+
+@pytest.fixture
+def ingest_con(isolated_db):
+    con = helpdesk.connect()
+    yield con
+    con.close()
+
+
+def test_batches_checkpoint_and_dead_letters(ingest_con):
+    con = ingest_con
+    before = con.execute("SELECT max(id) FROM tickets").fetchone()[0]
+    data = jsonl({'title': 'Projector broken in Hall 3'}, {'priority': 'High'}, b'\xff\xfe',
+                 {'title': 'Hostel water leakage', 'username': 'student_neha'}, {'title': 'Fee receipt missing'})
+    checkpoints, rejected = [], []
+    stats = ingest.ingest(con, io.BytesIO(data), classify_many, 1, batch_size=2,
+                          checkpoint=checkpoints.append, dead_letter=lambda *args: rejected.append(args))
+    assert (stats.inserted, stats.rejected, stats.offset) == (3, 2, len(data))
+    assert checkpoints[-1] == len(data) and len(checkpoints) == 2
+    assert [(offset, reason) for offset, reason, _ in rejected] == [(data.index(b'{"priority"'), 'missing title'),
+                                                                    (data.index(b'\xff'), 'not UTF-8')]
+    rows = con.execute("SELECT t.title, t.user_id, a.action FROM tickets t JOIN activity_log a ON a.ticket_id = t.id "
+                       "WHERE t.id > ? AND a.action = 'created' ORDER BY t.id", (before,)).fetchall()
+    assert [tuple(r) for r in rows] == [('Projector broken in Hall 3', 1, 'created'), ('Hostel water leakage', 5, 'created'),
+                                        ('Fee receipt missing', 1, 'created')]
+
+
+def test_a_failed_batch_resumes_from_the_checkpoint(ingest_con):
+    con = ingest_con
+    before = con.execute("SELECT max(id) FROM tickets").fetchone()[0]
+    data = jsonl(*({'title': f'Imported ticket {n}'} for n in range(5)))
+    checkpoint = []
+    calls = []
+
+    def flaky(texts):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError('classifier went away')
+        return classify_many(texts)
+
+    with pytest.raises(RuntimeError):
+        ingest.ingest(con, io.BytesIO(data), flaky, 1, batch_size=2, checkpoint=checkpoint.append)
+    assert con.execute("SELECT COUNT(*) FROM tickets WHERE id > ?", (before,)).fetchone()[0] == 2
+
+    stream = io.BytesIO(data)
+    stream.seek(checkpoint[-1])
+    stats = ingest.ingest(con, stream, classify_many, 1, batch_size=2)
+    assert stats.inserted == 3
+    titles = [r[0] for r in con.execute("SELECT title FROM tickets WHERE id > ? ORDER BY id", (before,))]
+    assert titles == [f'Imported ticket {n}' for n in range(5)]
+
+
+def test_imported_tickets_are_auto_assigned_and_reported(ingest_con):
+    con = ingest_con
+    assigner = assignment.AgentLoad()
+    assigner.load(con)
+    loads = assigner.loads()
+    before = con.execute("SELECT max(id) FROM tickets").fetchone()[0]
+    imported = []
+    ingest.ingest(con, io.BytesIO(jsonl({'title': 'Wi-Fi down in hostel', 'priority': 'High'}, {'title': 'Portal login fails'})),
+                  classify_many, 1, assigner=assigner, imported=imported.extend)
+    tickets = con.execute("SELECT id, assigned_to, priority FROM tickets WHERE id > ? ORDER BY id", (before,)).fetchall()
+    assert all(t['assigned_to'] in loads for t in tickets)
+    assert sum(assigner.loads().values()) == sum(loads.values()) + 3 + 2
+    assigned = con.execute("SELECT ticket_id, user_id, detail FROM activity_log WHERE action = 'assigned' AND ticket_id > ? ORDER BY id",
+                           (before,)).fetchall()
+    assert [tuple(r) for r in assigned] == [(t['id'], None, f"Assigned to user #{t['assigned_to']}") for t in tickets]
+    assert [r[0] for r in imported] == [t['id'] for t in tickets]
+
+
+def test_a_rolled_back_batch_gives_its_agents_back(ingest_con):
+    con = ingest_con
+    assigner = assignment.AgentLoad()
+    assigner.load(con)
+    loads = assigner.loads()
+    con.execute("CREATE TEMP TRIGGER refuse BEFORE INSERT ON main.tickets WHEN NEW.title = 'boom' BEGIN SELECT RAISE(ABORT, 'boom'); END")
+    imported = []
+    with pytest.raises(Exception, match='boom'):
+        ingest.ingest(con, io.BytesIO(jsonl({'title': 'Lab printer jammed'}, {'title': 'boom'})),
+                      classify_many, 1, assigner=assigner, imported=imported.extend)
+    assert assigner.loads() == loads and imported == []
+
+
+@pytest.fixture
+def fresh_indexes(isolated_db, monkeypatch):
+    """Agent loads and suggestions read from the database copy, so imports don't leak into other tests."""
+    assigner = assignment.AgentLoad()
+    suggestions = similar.SimilarityIndex(helpdesk.similar_documents)
+    suggestions.reload()
+    monkeypatch.setattr(helpdesk, 'assigner', assigner)
+    monkeypatch.setattr(helpdesk, 'suggestions', suggestions)
+    return assigner, suggestions
+
+
+def test_import_endpoint_assigns_and_indexes(login, fresh_indexes):
+    _, suggestions = fresh_indexes
+    client = login('admin', 'admin123')
+    data = jsonl({'title': 'Basketball court floodlights broken', 'username': 'student_neha'}, {'title': ''})
+    result = client.post('/admin/tickets/import', data=data).json
+    assert result['inserted'] == 1 and result['rejected'] == 1
+    assert result['errors'][0]['error'] == 'missing title'
+    [(score, tid, info)] = suggestions.query('basketball court floodlights')['ticket']
+    assert info['owner'] == 5
+    con = helpdesk.connect()
+    assert con.execute("SELECT assigned_to FROM tickets WHERE id = ?", (tid,)).fetchone()[0] is not None
+    con.close()
+
+
+def test_import_endpoint_is_admin_only(login):
+    response = login('agent_priya', 'agent123').post('/admin/tickets/import', data=jsonl({'title': 'x'}))
+    assert response.status_code == 403
+
+
+def test_cli_resumes_and_writes_rejected_lines(app, tmp_path, fresh_indexes):
+    path = tmp_path / 'tickets.jsonl'
+    path.write_bytes(jsonl({'title': 'Library AC not working'}, {'title': 'Bad', 'priority': 'Urgent'}))
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['ingest-tickets', str(path)])
+    assert '1 tickets imported, 1 rejected' in result.output, result.output
+    assert json.loads((tmp_path / 'tickets.jsonl.rejected.jsonl').read_text())['error'] == "unknown priority 'Urgent'"
+    assert runner.invoke(args=['ingest-tickets', str(path)]).output.startswith('Resuming at byte')
+    assert '0 tickets imported' in runner.invoke(args=['ingest-tickets', str(path)]).output
+    assert runner.invoke(args=['ingest-tickets', str(path), '--user', 'nobody']).exit_code != 0
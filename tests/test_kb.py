@@ -0,0 +1,55 @@
+import re
+import similar
+from conftest import helpdesk
+
+
+def article_ids(page):
+    """Article ids in the order /kb lists them (from the agents' edit links)."""
+    return [int(i) for i in re.findall(r'/kb/(\d+)/edit', page.get_data(as_text=True))]
+
+
+def test_fts_query_quotes_and_prefixes_every_word():
+    assert helpdesk.fts_query('Wi-Fi "reset') == '"Wi"* "Fi"* "reset"*'
+    assert helpdesk.fts_query(' -*" ') == ''
+
+
+def test_title_matches_rank_first(login):
+    client = login('agent_priya', 'agent123')
+    # "password" is also in the Wi-Fi article's text, but only in this title.
+    ids = article_ids(client.get('/kb?q=password'))
+    assert ids[0] == 5 and len(ids) > 1
+
+
+def test_words_are_prefix_matched_and_all_required(login):
+    client = login('agent_priya', 'agent123')
+    assert article_ids(client.get('/kb?q=passw')) == article_ids(client.get('/kb?q=password'))
+    assert article_ids(client.get('/kb?q=hostel+gates')) == [3]
+    assert article_ids(client.get('/kb?q=hostel+wifi')) == []
+
+
+def test_matches_are_highlighted_and_escaped(login, isolated_db, monkeypatch):
+    monkeypatch.setattr(helpdesk, 'suggestions', similar.SimilarityIndex(lambda: iter(())))
+    client = login('agent_priya', 'agent123')
+    client.post('/kb/new', data={'title': '<b>Projector</b> setup', 'content': 'Use the HDMI cable.', 'category': 'IT Support'})
+    text = client.get('/kb?q=projector').get_data(as_text=True)
+    assert '&lt;b&gt;<mark>Projector</mark>&lt;/b&gt; setup' in text
+    assert '<b>Projector' not in text
+
+
+def test_edits_are_searchable(login, isolated_db, monkeypatch):
+    monkeypatch.setattr(helpdesk, 'suggestions', similar.SimilarityIndex(lambda: iter(())))
+    client = login('agent_priya', 'agent123')
+    assert article_ids(client.get('/kb?q=eduroam')) == []
+    client.post('/kb/1/edit', data={'title': 'How to Connect to Campus Wi-Fi', 'content': 'Join eduroam.', 'category': 'IT Support'})
+    assert article_ids(client.get('/kb?q=eduroam')) == [1]
+    assert article_ids(client.get('/kb?q=CampusNet')) == []
+
+
+def test_punctuation_only_queries_find_nothing(login):
+    text = login('student_aarav', 'student123').get('/kb?q=%22*%22').get_data(as_text=True)
+    assert 'No articles yet' in text
+
+
+def test_students_see_articles_without_edit_links(login):
+    text = login('student_aarav', 'student123').get('/kb').get_data(as_text=True)
+    assert 'How to Connect to Campus Wi-Fi' in text and '/kb/1/edit' not in text
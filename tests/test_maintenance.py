@@ -0,0 +1,145 @@
+import logging, os, sqlite3
+import pytest
+import archive, maintenance
+from conftest import helpdesk
+
+
+@pytest.fixture
+def scratch(tmp_path):
+    """A WAL database with auto_vacuum=INCREMENTAL and some free pages; returns (con, path)."""
+    path = str(tmp_path / 'scratch.db')
+    con = sqlite3.connect(path, isolation_level=None)
+    con.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, data BLOB)")
+    con.execute("CREATE TABLE maintenance_runs (task TEXT PRIMARY KEY, started_at INTEGER NOT NULL, finished_at INTEGER, result TEXT)")
+    con.executemany("INSERT INTO t (data) VALUES (?)", [(os.urandom(2000),) for _ in range(300)])
+    con.execute("DELETE FROM t WHERE id > 100")
+    yield con, path
+    con.close()
+
+
+def test_stats_and_quick_check(scratch):
+    con, path = scratch
+    s = maintenance.stats(con, path)
+    assert s['auto_vacuum'] == 'incremental' and s['freelist_count'] > 0 and s['wal_bytes'] > 0
+    assert s['free_bytes'] == s['freelist_count'] * s['page_size']
+    assert maintenance.quick_check(con) == []
+
+
+def test_incremental_vacuum_in_steps(scratch):
+    con, _ = scratch
+    free = con.execute("PRAGMA freelist_count").fetchone()[0]
+    assert maintenance.incremental_vacuum(con, max_pages=10, step=4, pause=0) == 10
+    assert maintenance.incremental_vacuum(con, step=50, pause=0) == free - 10
+    assert con.execute("PRAGMA freelist_count").fetchone()[0] == 0
+    assert maintenance.incremental_vacuum(con, pause=0) == 0
+
+
+def test_enable_incremental_vacuum(tmp_path):
+    con = sqlite3.connect(str(tmp_path / 'plain.db'), isolation_level=None)
+    con.execute("PRAGMA auto_vacuum = NONE")
+    con.execute("CREATE TABLE t (x)")
+    assert maintenance.incremental_vacuum(con) == 0  # not enabled: nothing to do
+    assert maintenance.enable_incremental_vacuum(con) is True
+    assert maintenance.stats(con, str(tmp_path / 'plain.db'))['auto_vacuum'] == 'incremental'
+    assert maintenance.enable_incremental_vacuum(con) is False
+    con.close()
+
+
+def test_optimize_and_checkpoint(scratch):
+    con, path = scratch
+    con.execute("CREATE INDEX t_data ON t (data)")
+    maintenance.optimize(con, 100)
+    assert con.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+    busy, wal_pages, done = maintenance.checkpoint(con, path, truncate_bytes=0)
+    assert busy == 0 and done == wal_pages
+    assert maintenance.file_size(path + '-wal') > 0
+    maintenance.checkpoint(con, path, truncate_bytes=1)
+    assert maintenance.file_size(path + '-wal') == 0
+
+
+def test_backup_copies_and_keeps_the_newest(scratch, tmp_path):
+    con, _ = scratch
+    folder = tmp_path / 'backups'
+    folder.mkdir()
+    for stamp in ('20250101-000000', '20250102-000000', '20250103-000000'):
+        (folder / f'scratch-{stamp}.db').write_bytes(b'')
+    (folder / 'other-20250101-000000.db').write_bytes(b'')
+    path = maintenance.backup(con, str(folder), 'scratch', keep=2, step_pages=5, pause=0)
+    copy = sqlite3.connect(path)
+    assert copy.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 100
+    copy.close()
+    assert sorted(os.listdir(folder)) == ['other-20250101-000000.db', 'scratch-20250103-000000.db', os.path.basename(path)]
+
+
+def test_backup_under_steady_writes_copies_in_one_step(scratch, tmp_path, monkeypatch, caplog):
+    con, path = scratch
+    writer = sqlite3.connect(path, isolation_level=None)
+
+    def write(seconds):
+        writer.execute("INSERT INTO t (data) VALUES (x'00')")  # restarts the stepped copy
+
+    monkeypatch.setattr(maintenance.time, 'sleep', write)
+    with caplog.at_level(logging.INFO, logger='maintenance'):
+        copy_path = maintenance.backup(con, str(tmp_path), 'scratch', step_pages=2, pause=0)
+    writer.close()
+    assert 'copying it in one step' in caplog.text
+    copy = sqlite3.connect(copy_path)
+    assert copy.execute("PRAGMA quick_check").fetchone()[0] == 'ok'
+    copy.close()
+
+
+def test_a_failed_backup_leaves_no_files(scratch, tmp_path, monkeypatch):
+    con, _ = scratch
+
+    def fail(*args):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    monkeypatch.setattr(maintenance, '_copy', fail)
+    with pytest.raises(sqlite3.OperationalError):
+        maintenance.backup(con, str(tmp_path / 'backups'), 'scratch')
+    assert os.listdir(tmp_path / 'backups') == []
+
+
+def test_claim_and_record(scratch):
+    con, _ = scratch
+    assert maintenance.claim(con, 'check', 3600)
+    assert not maintenance.claim(con, 'check', 3600)  # another worker already has it
+    assert maintenance.claim(con, 'check', 0)
+    maintenance.record(con, 'check', 'ok')
+    assert con.execute("SELECT result FROM maintenance_runs WHERE task = 'check'").fetchone()[0] == 'ok'
+
+
+def test_scheduler_runs_due_tasks_once_and_records_failures(scratch):
+    con, _ = scratch
+    ran = []
+
+    def run(con, task):
+        ran.append(task)
+        if task == 'vacuum':
+            raise RuntimeError('disk full')
+        return 'done'
+
+    scheduler = maintenance.Scheduler(lambda: con, run, {'backup': 60, 'vacuum': 60, 'check': 60, 'optimize': 0})
+    scheduler.run_due(con)
+    scheduler.run_due(con)
+    assert ran == ['check', 'vacuum', 'backup']
+    results = dict(con.execute("SELECT task, result FROM maintenance_runs").fetchall())
+    assert results == {'check': 'done', 'vacuum': 'failed: disk full', 'backup': 'done'}
+
+
+def test_db_maintenance_command(app, isolated_db, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'BACKUP_FOLDER', str(tmp_path / 'backups'))
+    con = helpdesk.connect()
+    archive.attach(con, app.config['ARCHIVE_DATABASE_URL'], create=True)
+    con.close()
+    output = app.test_cli_runner().invoke(args=['db-maintenance']).output
+    lines = output.splitlines()
+    assert [line.split(':')[0] for line in lines] == list(maintenance.TASKS)
+    assert lines[0].startswith('check: ok: ')
+    assert sorted(name.split('-')[0] for name in os.listdir(tmp_path / 'backups')) == ['copy', 'copy_archive']
+
+    output = app.test_cli_runner().invoke(args=['db-maintenance', 'vacuum']).output
+    assert output.startswith('vacuum: ')
+    assert app.test_cli_runner().invoke(args=['db-maintenance', 'defrag']).exit_code != 0
@@ -0,0 +1,23 @@
+def test_unchanged_ticket_page_is_not_modified(login):
+    client = login('admin', 'admin123')
+    client.get('/dashboard')  # shows the login flash, so the ticket page can carry a validator
+    first = client.get('/ticket/3')
+    etag = first.headers['ETag']
+    again = client.get('/ticket/3', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['Cache-Control'] == 'private, no-cache'
+
+    client.post('/ticket/3/update', data={'priority': 'Low'})
+    client.get('/dashboard')
+    changed = client.get('/ticket/3', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_ticket_page_varies_by_viewer(login):
+    client = login('admin', 'admin123')
+    client.get('/dashboard')
+    etag = client.get('/ticket/3').headers['ETag']
+    client = login('agent_rahul', 'agent123')
+    client.get('/dashboard')
+    assert client.get('/ticket/3', headers={'If-None-Match': etag}).status_code == 200
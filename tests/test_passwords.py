@@ -0,0 +1,87 @@
+import threading, time
+import pytest
+from werkzeug.security import generate_password_hash
+import passwords
+from conftest import helpdesk
+
+CHEAP = 'pbkdf2:sha256:1000'
+
+
+def test_hash_check_and_rehash():
+    hasher = passwords.PasswordHasher(CHEAP)
+    stored = hasher.hash('secret')
+    assert hasher.check(stored, 'secret') and not hasher.check(stored, 'guess')
+    assert not hasher.needs_rehash(stored)
+    assert hasher.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:2000'))
+    hasher.shutdown()
+
+
+def test_a_full_pool_sheds_work():
+    hasher = passwords.PasswordHasher(CHEAP, max_workers=1, max_queue=1)
+    release = threading.Event()
+    busy = [threading.Thread(target=hasher._run, args=(release.wait, 5)) for _ in range(2)]
+    for t in busy:
+        t.start()
+    deadline = time.monotonic() + 5
+    while hasher.in_flight < 2 and time.monotonic() < deadline:  # one running, one queued
+        time.sleep(0.01)
+    try:
+        with pytest.raises(passwords.Overloaded):
+            hasher.hash('secret')
+        assert hasher.rejected == 1 and hasher.in_flight == 2
+    finally:
+        release.set()
+        for t in busy:
+            t.join()
+    assert hasher.in_flight == 0
+    assert hasher.check(hasher.hash('secret'), 'secret')
+    hasher.shutdown()
+
+
+def overloaded(*args):
+    raise passwords.Overloaded()
+
+
+def test_login_answers_429_when_the_pool_is_full(client, monkeypatch):
+    monkeypatch.setattr(helpdesk.hasher, 'check', overloaded)
+    response = client.post('/login', data={'username': 'student_aarav', 'password': 'student123'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == str(helpdesk.app.config['PASSWORD_HASH_RETRY_AFTER'])
+    assert client.get('/dashboard').status_code == 302
+
+
+def test_register_answers_429_when_the_pool_is_full(client, monkeypatch, isolated_db):
+    monkeypatch.setattr(helpdesk.hasher, 'hash', overloaded)
+    response = client.post('/register', data={'username': 'new_student', 'password': 'pass1234', 'confirm_password': 'pass1234'})
+    assert response.status_code == 429
+    con = helpdesk.connect()
+    assert con.execute("SELECT COUNT(*) FROM users WHERE username = 'new_student'").fetchone()[0] == 0
+    con.close()
+
+
+def test_wrong_password(client):
+    response = client.post('/login', data={'username': 'student_aarav', 'password': 'nope'})
+    assert response.status_code == 200 and 'Invalid username or password.' in response.get_data(as_text=True)
+
+
+@pytest.fixture
+def old_hash(isolated_db):
+    """Give student_neha a hash made with other parameters than the configured ones."""
+    con = helpdesk.connect()
+    with con:
+        con.execute("UPDATE users SET password_hash = ? WHERE username = 'student_neha'",
+                    (generate_password_hash('student123', CHEAP),))
+    yield lambda: con.execute("SELECT password_hash FROM users WHERE username = 'student_neha'").fetchone()[0]
+    con.close()
+
+
+def test_old_hashes_are_upgraded_at_login(login, old_hash):
+    login('student_neha', 'student123')
+    assert not helpdesk.hasher.needs_rehash(old_hash())
+    assert helpdesk.hasher.check(old_hash(), 'student123')
+
+
+def test_a_busy_pool_skips_the_upgrade_but_not_the_login(login, old_hash, monkeypatch):
+    monkeypatch.setattr(helpdesk.hasher, 'hash', overloaded)
+    assert login('student_neha', 'student123').get('/dashboard').status_code == 200
+    assert old_hash().startswith(CHEAP + '$')
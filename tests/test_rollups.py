@@ -0,0 +1,88 @@
+from datetime import date, datetime, timezone
+import pytest
+import rollups
+from conftest import helpdesk
+
+TABLES = ('rollup_daily', 'rollup_latency', 'rollup_agent_daily')
+
+
+def snapshot(con):
+    return {table: sorted(tuple(r) for r in con.execute(f"SELECT * FROM {table}")) for table in TABLES}
+
+
+@pytest.fixture
+def rollup_con(isolated_db):
+    con = helpdesk.connect()
+    yield con
+    con.close()
+
+
+def test_triggers_agree_with_a_rebuild(login, rollup_con):
+    before = snapshot(rollup_con)
+    client = login('student_aarav', 'student123')
+    client.post('/ticket/new', data={'title': 'Projector in Hall 3 flickers', 'priority': 'High'})
+    new_id = rollup_con.execute("SELECT max(id) FROM tickets").fetchone()[0]
+    client.post(f'/ticket/{new_id}/comment', data={'content': 'Still flickering.'})  # the submitter: not a response
+
+    client = login('agent_priya', 'agent123')
+    client.post(f'/ticket/{new_id}/comment', data={'content': 'Looking into it.'})
+    client.post(f'/ticket/{new_id}/comment', data={'content': 'Bulb ordered.'})
+    client.post('/ticket/3/update', data={'assign_to': '2'})
+    client.post('/ticket/3/update', data={'assign_to': '2'})  # unchanged: not another assignment
+    client.post('/ticket/3/update', data={'assign_to': '3'})
+    client.post('/ticket/3/update', data={'status': 'closed'})
+    client.post('/ticket/3/update', data={'status': 'closed'})  # already closed
+    client.post('/ticket/5/update', data={'status': 'closed'})
+
+    with_triggers = snapshot(rollup_con)
+    assert all(with_triggers[table] != before[table] for table in TABLES)
+    with rollup_con:
+        rollups.rebuild(rollup_con)
+    assert snapshot(rollup_con) == with_triggers
+
+    today = datetime.now(timezone.utc).date()
+    workload = {r['username']: r for r in rollups.agent_workload(rollup_con, today, today)}
+    assert workload['agent_priya']['responses'] >= 2
+    assert workload['agent_rahul']['closed'] >= 1 and workload['agent_rahul']['assigned'] >= 1
+
+
+def test_backfill_command(app, rollup_con):
+    expected = snapshot(rollup_con)
+    with rollup_con:
+        rollup_con.execute("DELETE FROM rollup_daily")
+    result = app.test_cli_runner().invoke(args=['backfill-rollups'])
+    assert result.output.startswith('Rebuilt rollups for')
+    assert snapshot(rollup_con) == expected
+
+
+def test_trend_is_zero_filled_and_grouped_by_week(rollup_con):
+    with rollup_con:
+        rollup_con.execute("DELETE FROM rollup_daily")
+        rollup_con.executemany("INSERT INTO rollup_daily (day, category, opened, closed) VALUES (?, ?, ?, ?)",
+                               [('2026-03-02', 'Hostel', 2, 0), ('2026-03-04', 'IT Support', 1, 1), ('2026-03-09', 'Hostel', 0, 3)])
+    start, end = date(2026, 3, 1), date(2026, 3, 10)
+    daily = rollups.trend(rollup_con, start, end)
+    assert len(daily) == 10 and daily[1] == ('2026-03-02', 2, 0) and daily[2] == ('2026-03-03', 0, 0)
+    assert rollups.trend(rollup_con, start, end, 'week') == [('2026-02-23', 0, 0), ('2026-03-02', 3, 1), ('2026-03-09', 0, 3)]
+    assert rollups.trend(rollup_con, start, end, 'day', 'Hostel')[8] == ('2026-03-09', 0, 3)
+    assert [tuple(r) for r in rollups.by_category(rollup_con, start, end)] == [('Hostel', 2, 3), ('IT Support', 1, 1)]
+
+
+def test_percentiles_interpolate_inside_a_bucket():
+    bounds = {0: 60, 1: 120, 2: 240}
+    stats = rollups._stats({0: [2, 60], 1: [2, 360]}, bounds, (50, 75, 100))
+    assert stats['count'] == 4 and stats['mean'] == 105
+    assert stats['p50'] == 60 and stats['p75'] == 90 and stats['p100'] == 120
+    assert rollups._stats({}, bounds, (50,)) is None
+
+
+def test_parse_range():
+    assert rollups.parse_range({'from': '2026-03-10', 'to': '2026-03-01'}) == (date(2026, 3, 1), date(2026, 3, 10))
+    start, end = rollups.parse_range({'from': 'yesterday'}, default_days=7)
+    assert end == datetime.now(timezone.utc).date() and (end - start).days == 6
+
+
+def test_reports_page(login):
+    response = login('agent_priya', 'agent123').get('/reports?from=2026-01-01&to=2026-12-31&group=week')
+    assert response.status_code == 200
+    assert 'agent_priya' in response.get_data(as_text=True)
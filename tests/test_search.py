@@ -0,0 +1,36 @@
+def search(client, headers, q):
+    response = client.get('/api/v1/tickets', query_string={'q': q, 'limit': 100, 'fields': 'title'}, headers=headers)
+    assert response.status_code == 200, response.json
+    return sorted(t['id'] for t in response.json['data'])
+
+
+def test_substrings_of_descriptions_and_comments_match(client, api_token):
+    headers = api_token('admin')
+    assert search(client, headers, 'TXN2026') == [3]        # inside a word in the description
+    assert search(client, headers, 'oom 304') == [4]
+    assert search(client, headers, 'FAULTY ROUTER') == [2]  # a comment, matched without case
+    assert search(client, headers, 'router') == [1, 2]
+
+
+def test_queries_are_matched_as_one_phrase(client, api_token):
+    headers = api_token('admin')
+    assert search(client, headers, 'router faulty') == []
+    assert search(client, headers, 'say "hi" OR *') == []
+
+
+def test_short_queries_fall_back_to_titles(client, api_token):
+    headers = api_token('admin')
+    assert search(client, headers, 'Fe') == [3]
+    assert search(client, headers, 'ID') == []  # "student ID" is only in a comment
+
+
+def test_students_only_find_their_own_tickets(client, api_token):
+    assert search(client, api_token('student_aarav'), 'router') == [1]
+
+
+def test_new_comments_are_searchable(login, isolated_db):
+    client = login('agent_priya', 'agent123')
+    assert 'href="/ticket/8"' not in client.get('/dashboard?q=cartridge+was+ordered').get_data(as_text=True)
+    client.post('/ticket/8/comment', data={'content': 'A new toner cartridge was ordered.'})
+    text = client.get('/dashboard?q=cartridge+was+ordered').get_data(as_text=True)
+    assert 'href="/ticket/8"' in text
@@ -0,0 +1,60 @@
+import similar
+
+DRAFT = 'Wi-Fi not working in Library Block B: the campus wifi network cannot authenticate my laptop'
+
+
+def index(docs):
+    idx = similar.SimilarityIndex(lambda: iter(docs))
+    idx.reload()
+    return idx
+
+
+def test_terms_join_hyphens_and_drop_stopwords():
+    assert similar.terms('The Wi-Fi is down in e-mail') == ['wifi', 'down', 'email']
+
+
+def test_query_ranks_by_similarity_and_applies_keep():
+    idx = index([(('ticket', 1), 'Printer out of toner', 'Lab 2 printer shows an out of toner error', {'owner': 1}),
+                 (('ticket', 2), 'Printer jammed', 'The library printer is jammed', {'owner': 2}),
+                 (('kb', 1), 'Campus Wi-Fi', 'Connect to CampusNet', {})])
+    found = idx.query('printer out of toner in lab 2', min_score=0.01)
+    assert [doc_id for _, doc_id, _ in found['ticket']] == [1, 2]
+    assert found['ticket'][0][0] > 0.5
+    assert 'kb' not in found
+    found = idx.query('printer out of toner in lab 2', min_score=0.01, keep=lambda kind, _, info: info['owner'] == 2)
+    assert [doc_id for _, doc_id, _ in found['ticket']] == [2]
+
+
+def test_removed_documents_are_not_suggested():
+    idx = index([(('ticket', 1), 'Printer out of toner', '', {})])
+    idx.remove(('ticket', 1))
+    assert idx.query('printer toner') == {} and len(idx) == 0
+
+
+def test_owner_sees_their_duplicate(login):
+    data = login('student_aarav', 'student123').get('/ticket/suggest', query_string={'q': DRAFT}).json
+    assert data['articles'] and data['articles'][0]['title'] == 'How to Connect to Campus Wi-Fi'
+    top = data['tickets'][0]
+    assert top['id'] == 1 and top['duplicate'] is True
+    assert set(top) == {'id', 'title', 'status', 'score', 'duplicate', 'url'}
+
+
+def test_students_only_see_their_own_tickets(login):
+    data = login('student_neha', 'student123').get('/ticket/suggest', query_string={'q': DRAFT}).json
+    assert data['articles']
+    assert 1 not in [t['id'] for t in data['tickets']]
+
+
+def test_agents_see_every_open_ticket(login):
+    data = login('agent_priya', 'agent123').get('/ticket/suggest', query_string={'q': DRAFT}).json
+    assert data['tickets'][0]['id'] == 1
+
+
+def test_closed_tickets_are_not_suggested(login):
+    # Ticket 9, the closed elective enrollment ticket, is agent-visible but closed.
+    data = login('agent_priya', 'agent123').get('/ticket/suggest', query_string={'q': 'enroll in Machine Learning elective, course full'}).json
+    assert 9 not in [t['id'] for t in data['tickets']]
+
+
+def test_suggestions_need_a_login(client):
+    assert client.get('/ticket/suggest?q=wifi').status_code == 401
@@ -0,0 +1,85 @@
+import calendar, os, sqlite3, time
+import pytest
+import timestamps
+from conftest import helpdesk
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_schema.sql')
+
+
+def epoch(text):
+    return calendar.timegm(time.strptime(text, '%Y-%m-%d %H:%M:%S'))
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    """Path of a database created by the original schema, timestamps stored as text."""
+    path = str(tmp_path / 'baseline.db')
+    con = sqlite3.connect(path)
+    with open(BASELINE, encoding='utf-8') as f:
+        con.executescript(f.read())
+    con.executemany("INSERT INTO users (username, password_hash, role, created_at) VALUES (?, 'x', ?, ?)",
+                    [('student', 'student', '2024-01-01 08:00:00'), ('agent', 'agent', '2024-01-01 09:00:00')])
+    con.executemany("INSERT INTO tickets (user_id, title, status, category, assigned_to, created_at) VALUES (1, ?, ?, 'IT Support', ?, ?)",
+                    [(f'Ticket {i}', 'closed' if i % 3 == 0 else 'open', 2 if i % 2 else None, f'2024-02-{i:02d} 10:30:00')
+                     for i in range(1, 8)])
+    con.executemany("INSERT INTO comments (ticket_id, user_id, content, created_at) VALUES (?, 2, 'On it', ?)",
+                    [(i, f'2024-02-{i:02d} 12:00:00') for i in range(1, 8)])
+    con.executemany("INSERT INTO activity_log (ticket_id, user_id, action, detail, created_at) VALUES (?, 2, 'status_change', ?, ?)",
+                    [(i, 'Status changed to closed', f'2024-02-{i:02d} 18:00:00') for i in range(3, 8, 3)])
+    con.commit()
+    con.close()
+    return path
+
+
+def test_migrate_converts_every_row(baseline):
+    con = sqlite3.connect(baseline)
+    done = timestamps.migrate(con, batch_size=2)
+    assert set(done) == {'users', 'tickets', 'comments', 'kb_articles', 'attachments', 'notifications', 'activity_log'}
+    assert timestamps.pending(con) == []
+    rows = con.execute("SELECT id, created_at, typeof(created_at) FROM tickets ORDER BY id").fetchall()
+    assert [r[1] for r in rows] == [epoch(f'2024-02-{i:02d} 10:30:00') for i in range(1, 8)]
+    assert {r[2] for r in rows} == {'integer'}
+    indexes = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")}
+    assert {'idx_tickets_user', 'idx_tickets_status', 'idx_comments_ticket'} <= indexes
+    assert con.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+    con.close()
+
+
+def test_migrate_keeps_the_autoincrement_sequence(baseline):
+    con = sqlite3.connect(baseline)
+    con.execute("DELETE FROM comments WHERE id = 7")
+    con.commit()
+    timestamps.migrate(con)
+    con.execute("INSERT INTO comments (ticket_id, user_id, content) VALUES (1, 1, 'new')")
+    assert con.execute("SELECT max(id) FROM comments").fetchone()[0] == 8
+    con.close()
+
+
+def test_interrupted_migration_resumes(baseline):
+    con = sqlite3.connect(baseline)
+    assert not timestamps._step(con, 'main', 'tickets', 3)  # first batch only
+    assert con.execute(f"SELECT COUNT(*) FROM tickets{timestamps.SUFFIX}").fetchone()[0] == 3
+    timestamps.migrate(con, batch_size=3)
+    assert con.execute("SELECT COUNT(*), COUNT(DISTINCT id) FROM tickets").fetchone() == (7, 7)
+    assert con.execute("SELECT name FROM sqlite_master WHERE name LIKE ?", ('%' + timestamps.SUFFIX,)).fetchall() == []
+    con.close()
+
+
+def test_init_db_upgrades_a_baseline_database(baseline, monkeypatch):
+    monkeypatch.setitem(helpdesk.app.config, 'DATABASE_URL', baseline)
+    monkeypatch.setitem(helpdesk.app.config, 'ARCHIVE_DATABASE_URL', baseline[:-3] + '_archive.db')
+    helpdesk.init_db()
+    con = sqlite3.connect(baseline)
+    assert timestamps.pending(con) == []
+    assert timestamps.stale_triggers(con) == []
+    assert con.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+    # The compatibility views still show the original text.
+    assert con.execute("SELECT created_at FROM tickets_text WHERE id = 1").fetchone()[0] == '2024-02-01 10:30:00'
+    assert dict(con.execute("SELECT key, value FROM counters WHERE scope = 'status'").fetchall()) == {'open': 5, 'closed': 2}
+    assert con.execute("SELECT SUM(opened), SUM(closed) FROM rollup_daily").fetchone() == (7, 2)
+    # Triggers written for integer time work on the converted tables.
+    con.execute("INSERT INTO tickets (user_id, title, category) VALUES (1, 'After upgrade', 'IT Support')")
+    con.commit()
+    assert con.execute("SELECT typeof(created_at) FROM tickets ORDER BY id DESC LIMIT 1").fetchone()[0] == 'integer'
+    assert con.execute("SELECT SUM(opened) FROM rollup_daily").fetchone()[0] == 8
+    con.close()
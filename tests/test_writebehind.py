@@ -0,0 +1,86 @@
+import sqlite3, threading
+import pytest
+from writebehind import WriteBehindQueue
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / 'events.db')
+    con = sqlite3.connect(path)
+    con.executescript("""
+        CREATE TABLE activity_log (id INTEGER PRIMARY KEY, ticket_id INTEGER, user_id INTEGER, action TEXT, detail TEXT);
+        CREATE TABLE notifications (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, ticket_id INTEGER, message TEXT,
+                                    is_read INTEGER NOT NULL DEFAULT 0);
+    """)
+    con.close()
+    return path
+
+
+def count(path, table):
+    con = sqlite3.connect(path)
+    try:
+        return con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        con.close()
+
+
+def test_flush_writes_everything_queued_and_keeps_the_writer(database):
+    q = WriteBehindQueue(lambda: sqlite3.connect(database), flush_interval=5)
+    q.put_many([('activity', (1, 1, 'comment', 'Added a comment'))] * 100)
+    assert q.flush(5)
+    assert count(database, 'activity_log') == 100
+    q.put('notification', (1, 1, 'hello'))
+    assert q.flush(5)
+    assert count(database, 'notifications') == 1
+    q.close()
+
+
+def test_flush_without_a_writer_returns_at_once(database):
+    q = WriteBehindQueue(lambda: sqlite3.connect(database))
+    assert q.flush(0)
+
+
+def test_close_drains_the_queue(database):
+    q = WriteBehindQueue(lambda: sqlite3.connect(database), flush_interval=5)
+    q.put_many([('activity', (1, 1, 'comment', 'x'))] * 10)
+    q.close()
+    assert count(database, 'activity_log') == 10
+
+
+def test_bad_row_does_not_drop_the_batch(database):
+    q = WriteBehindQueue(lambda: sqlite3.connect(database))
+    q.put_many([('notification', (1, 1, 'a')), ('notification', (None, 1, 'b')), ('notification', (2, 1, 'c'))])
+    q.close()
+    assert count(database, 'notifications') == 2
+
+
+def test_unknown_kind_is_rejected(database):
+    q = WriteBehindQueue(lambda: sqlite3.connect(database))
+    with pytest.raises(ValueError):
+        q.put('nonsense', ())
+
+
+def test_events_queued_during_close_are_not_lost(database):
+    q = WriteBehindQueue(lambda: sqlite3.connect(database, timeout=10), flush_interval=0.01)
+
+    def producer():
+        for _ in range(500):
+            q.put('activity', (1, 1, 'comment', 'x'))
+
+    threads = [threading.Thread(target=producer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads):
+        q.close()
+    for t in threads:
+        t.join()
+    q.close()
+    assert count(database, 'activity_log') == 2000
+
+
+def test_sync_mode_writes_before_the_response(login, con):
+    owner = con.execute("SELECT user_id FROM tickets WHERE id = 4").fetchone()[0]
+    before = con.execute("SELECT COUNT(*) FROM notifications WHERE user_id = ? AND is_read = 0", (owner,)).fetchone()[0]
+    login('agent_rahul', 'agent123').post('/ticket/4/comment', data={'content': 'Plumber booked for today.'})
+    assert con.execute("SELECT action FROM activity_log WHERE ticket_id = 4 ORDER BY id DESC LIMIT 1").fetchone()[0] == 'comment'
+    assert con.execute("SELECT COUNT(*) FROM notifications WHERE user_id = ? AND is_read = 0", (owner,)).fetchone()[0] == before + 1
@@ -0,0 +1,130 @@
+"""
+Conversion of the created_at columns from CURRENT_TIMESTAMP text
+('YYYY-MM-DD HH:MM:SS', UTC) to integer Unix time.
+
+SQLite cannot change the type of a column, and a TEXT column would store
+the integers back as text, so each table is rebuilt: a copy with
+`created_at INTEGER` is filled from the old table batch_size rows per
+transaction, in primary-key order, and the last transaction copies the
+remainder, drops the old table, renames the copy into its place and
+recreates the old table's indexes and triggers. Rows are copied with their
+ids, so references to them stay valid. An interrupted migration resumes
+from the last batch it committed, and several processes starting at once
+share the work.
+
+Triggers that read created_at are written for one form or the other;
+stale_triggers() finds those still written for text, for init_db() to drop
+before schema.sql recreates them.
+"""
+import re, time
+
+TABLES = ('users', 'tickets', 'comments', 'kb_articles', 'blobs', 'attachments',
+          'notifications', 'activity_log', 'api_tokens')
+SUFFIX = '__epoch'
+
+# created_at as Unix time, whichever form it is stored in. Archive copies made
+# while only the main database was converted hold the integer as text.
+EPOCH = ("CASE WHEN typeof(created_at) = 'integer' THEN created_at"
+         " WHEN created_at GLOB '[0-9]*' AND created_at NOT GLOB '*[^0-9]*' THEN CAST(created_at AS INTEGER)"
+         " ELSE unixepoch(created_at) END")
+
+_TEXT_COLUMN = re.compile(r'\bcreated_at\s+TEXT(\s+DEFAULT\s+CURRENT_TIMESTAMP)?', re.IGNORECASE)
+_TABLE_NAME = re.compile(r'^CREATE\s+TABLE\s+("?)(\w+)\1\s*\(', re.IGNORECASE)
+_TEXT_TRIGGER = re.compile(r'\b(date|unixepoch)\((new|old)\.created_at\)', re.IGNORECASE)
+
+
+def pending(con, schema='main'):
+    """Tables of schema whose created_at column is still TEXT."""
+    out = []
+    for table in TABLES:
+        for row in con.execute(f"PRAGMA {schema}.table_info({table})"):
+            if row[1] == 'created_at' and row[2].upper() == 'TEXT':
+                out.append(table)
+    return out
+
+
+def stale_triggers(con):
+    """Names of triggers in the main schema that still treat created_at as text."""
+    return [name for name, sql in con.execute("SELECT name, sql FROM main.sqlite_master WHERE type = 'trigger'")
+            if _TEXT_TRIGGER.search(sql)]
+
+
+def _definition(sql, schema, name):
+    sql = _TEXT_COLUMN.sub(lambda m: 'created_at INTEGER' + (' DEFAULT (unixepoch())' if m.group(1) else ''), sql)
+    return _TABLE_NAME.sub(f'CREATE TABLE {schema}.{name} (', sql, count=1)
+
+
+def _step(con, schema, table, batch_size):
+    """Copy one batch into the new table, or finish the table. True once the table is converted."""
+    copy = table + SUFFIX
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        if table not in pending(con, schema):
+            con.rollback()  # another process finished it
+            return True
+        if not con.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (copy,)).fetchone():
+            sql = con.execute(f"SELECT sql FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+            con.execute(_definition(sql, schema, copy))
+        info = con.execute(f"PRAGMA {schema}.table_info({table})").fetchall()
+        key = next(row[1] for row in info if row[5] == 1)
+        columns = ', '.join(row[1] for row in info)
+        values = ', '.join(EPOCH if row[1] == 'created_at' else row[1] for row in info)
+        last = con.execute(f"SELECT max({key}) FROM {schema}.{copy}").fetchone()[0]
+        where, params = ('', []) if last is None else (f"WHERE {key} > ?", [last])
+        cur = con.execute(f"INSERT INTO {schema}.{copy} ({columns}) SELECT {values} FROM {schema}.{table}"
+                          f" {where} ORDER BY {key} LIMIT ?", params + [batch_size])
+        done = cur.rowcount < batch_size
+        if done:
+            _swap(con, schema, table, copy)
+        con.commit()
+        return done
+    except BaseException:
+        con.rollback()
+        raise
+
+
+def _swap(con, schema, table, copy):
+    dependents = [row[0] for row in con.execute(
+        f"SELECT sql FROM {schema}.sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (table,))]
+    has_sequence = con.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE name = 'sqlite_sequence'").fetchone()
+    sequence = has_sequence and con.execute(f"SELECT seq FROM {schema}.sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    con.execute(f"DROP TABLE {schema}.{table}")
+    # Without it, RENAME checks every trigger and view, and those referring to
+    # the dropped table would fail the check until the rename is done.
+    con.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        con.execute(f"ALTER TABLE {schema}.{copy} RENAME TO {table}")
+    finally:
+        con.execute("PRAGMA legacy_alter_table = OFF")
+    for sql in dependents:
+        # Stored without a schema name; index and trigger names are unique per database.
+        con.execute(re.sub(r'^CREATE\s+(UNIQUE\s+)?(INDEX|TRIGGER)\s+', lambda m: m.group(0) + f'{schema}.', sql, count=1,
+                           flags=re.IGNORECASE))
+    if sequence:
+        # AUTOINCREMENT must not hand out ids of rows deleted from the end of the old table.
+        con.execute(f"UPDATE {schema}.sqlite_sequence SET seq = max(seq, ?) WHERE name = ?", (sequence[0], table))
+
+
+def migrate(con, schema='main', batch_size=5000, pause=0.0, progress=None):
+    """Convert every pending table of schema, batch_size rows per transaction, sleeping `pause` between them.
+
+    progress(table) is called as each table is finished. Returns the tables
+    converted. Foreign keys are off while it runs: the old table is dropped
+    while other tables still refer to it.
+    """
+    tables = pending(con, schema)
+    if not tables:
+        return []
+    con.commit()
+    foreign_keys = con.execute("PRAGMA foreign_keys").fetchone()[0]
+    con.execute("PRAGMA foreign_keys = OFF")
+    try:
+        for table in tables:
+            while not _step(con, schema, table, batch_size):
+                time.sleep(pause)
+            if progress:
+                progress(table)
+    finally:
+        con.execute(f"PRAGMA foreign_keys = {int(foreign_keys)}")
+    return tables
@@ -0,0 +1,150 @@
+"""
+Write-behind queue for the helpdesk's append-only side tables.
+
+Events are queued in memory and drained by a single writer thread, which
+flushes each batch with executemany inside one transaction. The queue is
+flushed again at interpreter shutdown so nothing accepted is lost on a
+clean exit.
+"""
+import atexit, logging, os, queue, sqlite3, threading, time
+
+log = logging.getLogger(__name__)
+
+# Statement for every event kind the queue understands. Rows are the
+# positional parameters for that statement.
+STATEMENTS = {
+    'activity': "INSERT INTO activity_log (ticket_id, user_id, action, detail) VALUES (?, ?, ?, ?)",
+    'notification': "INSERT INTO notifications (user_id, ticket_id, message) VALUES (?, ?, ?)",
+    # Read receipt: a user's unread notifications for a ticket, up to the newest id they saw.
+    'read': "UPDATE notifications SET is_read = 1 WHERE user_id = ? AND ticket_id = ? AND id <= ? AND is_read = 0",
+}
+
+_STOP = object()
+
+
+class WriteBehindQueue:
+    """on_flush(events), if given, is called from the writer thread after each
+    batch has been written (or, for rows that failed, dropped)."""
+
+    def __init__(self, connect, flush_interval=0.5, batch_size=500, on_flush=None):
+        self._connect = connect
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    @property
+    def backlog(self):
+        """Events accepted but not yet handed to the writer thread."""
+        return self._queue.qsize()
+
+    def put(self, kind, row):
+        self.put_many([(kind, row)])
+
+    def put_many(self, events):
+        for kind, _ in events:
+            if kind not in STATEMENTS:
+                raise ValueError(f'Unknown event kind: {kind}')
+        # Under the lock, so nothing can be queued behind a close()'s stop marker.
+        with self._lock:
+            self._ensure_started()
+            for event in events:
+                self._queue.put(event)
+
+    def _ensure_started(self):
+        # Threads do not survive fork(), so a pre-forking server gets a
+        # fresh writer in each worker on its first event. Called with _lock held.
+        if self._thread is None or self._pid != os.getpid():
+            # Each writer drains its own queue; one still finishing after close() keeps the old one.
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(self._queue,), name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self, events):
+        con = self._connect()
+        try:
+            while True:
+                batch, marker = self._collect(events)
+                if batch:
+                    self._flush(con, batch)
+                    if self.on_flush:
+                        try:
+                            self.on_flush(batch)
+                        except Exception:
+                            log.exception('on_flush callback failed')
+                if marker is _STOP:
+                    return
+                if marker is not None:
+                    marker.set()  # a flush() waiting for everything before it
+        finally:
+            con.close()
+
+    def _collect(self, events):
+        """Block for the first event, then gather more until the batch is full or the interval ends.
+
+        Returns (batch, marker): marker is _STOP or a flush() Event that ended the batch, else None.
+        """
+        batch = []
+        first = events.get()
+        if first is _STOP or isinstance(first, threading.Event):
+            return batch, first
+        batch.append(first)
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                event = events.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if event is _STOP or isinstance(event, threading.Event):
+                return batch, event
+            batch.append(event)
+        return batch, None
+
+    def _flush(self, con, batch):
+        grouped = {}
+        for kind, row in batch:
+            grouped.setdefault(kind, []).append(row)
+        try:
+            with con:
+                for kind, rows in grouped.items():
+                    con.executemany(STATEMENTS[kind], rows)
+        except sqlite3.IntegrityError:
+            # One bad row should not take the rest of the batch with it.
+            for kind, row in batch:
+                try:
+                    with con:
+                        con.execute(STATEMENTS[kind], row)
+                except sqlite3.Error:
+                    log.exception('Dropping %s event %r', kind, row)
+        except sqlite3.Error:
+            log.exception('Failed to flush %d queued events', len(batch))
+
+    def close(self):
+        """Stop the writer thread after it has flushed everything queued so far."""
+        with self._lock:
+            thread = self._thread
+            if thread is None or self._pid != os.getpid():
+                return
+            self._queue.put(_STOP)
+            self._thread = None
+        thread.join()
+
+    def flush(self, timeout=None):
+        """Block until every event queued before this call has been written. The writer keeps running.
+
+        Returns False if timeout (seconds) passed first.
+        """
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                return True
+            done = threading.Event()
+            self._queue.put(done)
+        return done.wait(timeout)